@@ -0,0 +1,70 @@
+"""Compile a small filter list and check what it blocks.
+
+    python content_filter_check.py
+
+Covers site_of on multi-label public suffixes, and third-party rules
+between sites that share one (a.co.uk and b.co.uk are different sites).
+Exits non-zero on any failure.
+"""
+import os
+import shutil
+import sys
+import tempfile
+
+import main
+
+FILTER_LIST = """[Adblock Plus 2.0]
+||tracker.co.uk^$third-party
+/adframe.js$third-party
+||ads.example^
+@@||ads.example/allowed^
+"""
+
+SITES = [
+    ("www.bbc.co.uk", "bbc.co.uk"),
+    ("a.co.uk", "a.co.uk"),
+    ("example.com", "example.com"),
+    ("cdn.shop.example.com.au", "example.com.au"),
+    ("user.github.io", "user.github.io"),
+    ("co.uk", "co.uk"),
+    ("localhost", "localhost"),
+    ("192.168.1.1", "192.168.1.1"),
+]
+
+# (request URL, page URL, resource type, blocked)
+REQUESTS = [
+    ("https://tracker.co.uk/t.gif", "https://news.co.uk/", "image", True),
+    ("https://tracker.co.uk/t.gif", "https://www.tracker.co.uk/", "image", False),
+    ("https://a.co.uk/adframe.js", "https://b.co.uk/", "script", True),
+    ("https://static.a.co.uk/adframe.js", "https://www.a.co.uk/", "script", False),
+    ("https://user.github.io/adframe.js", "https://other.github.io/", "script", True),
+    ("https://ads.example/banner.png", "https://a.co.uk/", "image", True),
+    ("https://ads.example/allowed/x.png", "https://a.co.uk/", "image", False),
+]
+
+def run():
+    directory = tempfile.mkdtemp()
+    failures = []
+    try:
+        path = os.path.join(directory, "list.txt")
+        with open(path, 'w') as f:
+            f.write(FILTER_LIST)
+        matcher = main.FilterMatcher(main.ContentFilter().compile_lists([path]))
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+    
+    for host, site in SITES:
+        if main.site_of(host) != site:
+            failures.append(f"site_of({host!r}) is {main.site_of(host)!r}, not {site!r}")
+    for url, page, resource_type, blocked in REQUESTS:
+        if matcher.matches(url, page, resource_type) != blocked:
+            failures.append(f"{url} from {page} was {'not ' if blocked else ''}blocked")
+    
+    print(f"Content filter check: {len(SITES) + len(REQUESTS) - len(failures)} of "
+          f"{len(SITES) + len(REQUESTS)} passed")
+    for failure in failures:
+        print(f"FAIL: {failure}")
+    return 1 if failures else 0
+
+if __name__ == "__main__":
+    sys.exit(run())
@@ -0,0 +1,71 @@
+"""Upgrade a JSON history to SQLite and check nothing was lost.
+
+    python history_migration_check.py [entries]
+
+Writes a history.json, its stats and a journal the way the JSON store
+does, then opens a HistoryManager on them in a fresh directory. Fails if
+the SQLite store could not be opened (HistoryManager silently falls back
+to JSON), or if any entry, visit count or search result went missing.
+Exits non-zero on any failure.
+"""
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+import main
+
+def run(count=5000):
+    if main.sqlite3 is None:
+        print("History migration check: sqlite3 is unavailable, nothing to check")
+        return 0
+    directory = tempfile.mkdtemp()
+    cwd = os.getcwd()
+    os.chdir(directory)
+    failures = []
+    try:
+        json_store = main.JsonHistoryStore(compact_threshold=count * 10)
+        now = time.time()
+        entries = [main.HistoryEntry(f"Page {i}", f"https://site{i % 50}.example/page/{i}", now - count + i)
+                   for i in range(count)]
+        json_store.write_batch(entries)
+        # Some entries end up in the snapshot, later ones only in the journal.
+        json_store.compact()
+        json_store.write_batch([main.HistoryEntry("Page 0", entries[0].url, now)])
+        json_store.write_batch(entries[count // 2:])
+        # What a JSON store opened on these files holds is what should migrate.
+        json_store = main.JsonHistoryStore()
+        urls = {entry.url for entry in json_store.index.recent(None)}
+        expected = {url: stats[0] for url, stats in json_store.rollup.urls.items()}
+        
+        manager = main.HistoryManager()
+        manager.flush()
+        store = manager.store
+        if not isinstance(store, main.SqliteHistoryStore):
+            failures.append(f"opened {type(store).__name__} instead of SqliteHistoryStore")
+        else:
+            rows = store.connection().execute("SELECT count(*) FROM history").fetchone()[0]
+            if rows != len(urls):
+                failures.append(f"{rows} of {len(urls)} entries migrated")
+            wrong = [url for url, visits in expected.items()
+                     if (store.url_stats(url) or main.VisitStats(url, "", 0, 0, 0)).visit_count != visits]
+            if wrong:
+                failures.append(f"{len(wrong)} URLs have the wrong visit count, e.g. {wrong[0]}")
+            if not [entry for entry in manager.search("Page 0") if entry.url == entries[0].url]:
+                failures.append("search does not find a migrated entry")
+            manager.add_to_history("After", "https://after.example/", True)
+            manager.flush()
+            if not store.url_stats("https://after.example/"):
+                failures.append("new visits are not written after migrating")
+    finally:
+        os.chdir(cwd)
+        shutil.rmtree(directory, ignore_errors=True)
+    
+    print(f"History migration check: {count} entries written, {len(failures)} failures")
+    for failure in failures:
+        print(f"FAIL: {failure}")
+    return 1 if failures else 0
+
+if __name__ == "__main__":
+    sys.exit(run(int(sys.argv[1]) if len(sys.argv) > 1 else 5000))
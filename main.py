@@ -1,131 +1,2795 @@
 import sys
 import json
 import os
+import time
+
+# Taken before the Qt imports so --profile-startup can time them.
+IMPORT_STARTED = time.perf_counter()
+
+import base64
+import bisect
+import collections
+import datetime
+import email
+import functools
+import hashlib
+import heapq
+import html
+import itertools
+import lzma
+import marshal
+import math
+import queue
+import re
+import shutil
+import tempfile
+import threading
 from urllib.parse import urlparse
-from PyQt5 import QtCore, QtGui, QtWidgets, QtWebEngineWidgets, QtNetwork
+from PyQt5 import QtCore, QtGui, QtWidgets, QtWebEngineWidgets, QtWebEngineCore, QtNetwork
+
+try:
+    import sqlite3
+except ImportError:
+    sqlite3 = None
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+class FileLock:
+    """Re-entrant lock that also excludes other processes via flock.
+    
+    Where fcntl is unavailable it only guards threads in this process.
+    """
+    def __init__(self, path):
+        self.path = path
+        self.lock = threading.RLock()
+        self.depth = 0
+        self.file = None
+    
+    def __enter__(self):
+        self.lock.acquire()
+        self.depth += 1
+        if self.depth == 1 and fcntl is not None:
+            try:
+                self.file = open(self.path, 'a')
+                fcntl.flock(self.file.fileno(), fcntl.LOCK_EX)
+            except OSError as e:
+                print(f"Error locking {self.path}: {e}")
+        return self
+    
+    def __exit__(self, *exc_info):
+        self.depth -= 1
+        if self.depth == 0 and self.file is not None:
+            self.file.close()
+            self.file = None
+        self.lock.release()
+
+def file_signature(path):
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return (st.st_ino, st.st_mtime_ns, st.st_size)
+
+class JournalTail:
+    """Tracks how much of an append-only journal this process has seen.
+    
+    read_new() returns complete lines appended since the last call, or None
+    when the snapshot next to the journal was rewritten (the journal was
+    compacted), in which case the caller reloads everything.
+    """
+    def __init__(self, journal_file, snapshot_file):
+        self.journal_file = journal_file
+        self.snapshot_file = snapshot_file
+        self.mark()
+    
+    def mark(self):
+        self.offset = os.path.getsize(self.journal_file) if os.path.exists(self.journal_file) else 0
+        self.snapshot = file_signature(self.snapshot_file)
+    
+    def changed(self):
+        """Whether either file changed since this process last wrote or read it."""
+        size = os.path.getsize(self.journal_file) if os.path.exists(self.journal_file) else 0
+        return size != self.offset or file_signature(self.snapshot_file) != self.snapshot
+    
+    def read_new(self):
+        if file_signature(self.snapshot_file) != self.snapshot:
+            return None
+        try:
+            with open(self.journal_file, 'rb') as f:
+                f.seek(0, os.SEEK_END)
+                if f.tell() < self.offset:
+                    return None
+                f.seek(self.offset)
+                data = f.read()
+        except OSError:
+            return []
+        # A line another process is still writing is left for next time.
+        data = data[:data.rfind(b"\n") + 1]
+        self.offset += len(data)
+        return data.decode('utf-8', 'replace').splitlines()
 
 class BookmarkManager:
-    def __init__(self):
+    """Bookmarks indexed by URL, folder path and tag.
+    
+    Folders are "/"-separated paths with "" as the root. Every change is
+    appended to bookmarks.journal; the full bookmarks.json is only rewritten
+    when the journal grows long or on flush().
+    """
+    def __init__(self, compact_threshold=200):
         self.bookmarks_file = "bookmarks.json"
-        self.bookmarks = self.load_bookmarks()
+        self.journal_file = "bookmarks.journal"
+        self.compact_threshold = compact_threshold
+        self.file_lock = FileLock("bookmarks.lock")
+        self.listeners = []
+        with self.file_lock:
+            self.reset()
+            self.load_bookmarks()
+            self.tail = JournalTail(self.journal_file, self.bookmarks_file)
+    
+    def reset(self):
+        self.bookmarks = {}
+        self.folder_bookmarks = {"": {}}
+        self.subfolders = {"": {}}
+        self.tags = collections.defaultdict(dict)
+        self.journal_lines = 0
+    
+    def add_listener(self, callback):
+        self.listeners.append(callback)
+    
+    def notify(self, action, bookmark):
+        for callback in self.listeners:
+            callback(action, bookmark)
     
     def load_bookmarks(self):
         try:
             if os.path.exists(self.bookmarks_file):
                 with open(self.bookmarks_file, 'r') as f:
-                    return json.load(f)
+                    data = json.load(f)
+                # Older files are a bare list of bookmarks.
+                if isinstance(data, list):
+                    data = {"folders": [], "bookmarks": data}
+                for folder in data.get("folders", []):
+                    self.ensure_folder(folder)
+                for bookmark in data.get("bookmarks", []):
+                    self.index_bookmark(self.normalize(bookmark))
         except:
             pass
-        return []
-    
-    def save_bookmarks(self):
+        
         try:
-            with open(self.bookmarks_file, 'w') as f:
-                json.dump(self.bookmarks, f, indent=2)
+            if os.path.exists(self.journal_file):
+                with open(self.journal_file, 'r') as f:
+                    for line in f:
+                        try:
+                            self.apply(json.loads(line))
+                        except (ValueError, KeyError):
+                            continue
+                        self.journal_lines += 1
         except Exception as e:
-            print(f"Error saving bookmarks: {e}")
+            print(f"Error reading bookmarks journal: {e}")
+    
+    @staticmethod
+    def normalize(bookmark):
+        return {
+            "title": bookmark.get("title") or "",
+            "url": bookmark["url"],
+            "folder": bookmark.get("folder", "").strip("/"),
+            "tags": sorted(set(bookmark.get("tags", []))),
+        }
+    
+    def apply(self, op):
+        """Apply a journal op, returning the URLs it removed. Ops written by
+        another process may race with ours, so stale ones are tolerated."""
+        action = op["op"]
+        removed = []
+        if action in ("add", "update"):
+            bookmark = self.normalize(op["bookmark"])
+            old = self.bookmarks.get(op.get("url", bookmark["url"]))
+            if old is not None:
+                self.unindex_bookmark(old)
+            self.index_bookmark(bookmark)
+        elif action == "remove":
+            if op["url"] in self.bookmarks:
+                self.unindex_bookmark(self.bookmarks[op["url"]])
+                removed.append(op["url"])
+        elif action == "add_folder":
+            self.ensure_folder(op["folder"])
+        elif action == "remove_folder":
+            pending = [op["folder"]]
+            while pending:
+                folder = pending.pop()
+                pending.extend(self.subfolders.get(folder, ()))
+                removed.extend(self.folder_bookmarks.get(folder, ()))
+            self.drop_folder(op["folder"])
+        return removed
+    
+    def merge_changes(self):
+        """Pick up ops other processes appended to the journal since we last
+        looked; reload from scratch if the journal was compacted."""
+        with self.file_lock:
+            lines = self.tail.read_new()
+            if lines is None:
+                self.reset()
+                self.load_bookmarks()
+                self.tail.mark()
+                self.notify("reload", None)
+                return
+            for line in lines:
+                try:
+                    op = json.loads(line)
+                    removed = self.apply(op)
+                except (ValueError, KeyError):
+                    continue
+                self.journal_lines += 1
+                if op["op"] in ("add", "update"):
+                    self.notify(op["op"], self.bookmarks[op["bookmark"]["url"]])
+                for url in removed:
+                    self.notify("remove", {"url": url})
+    
+    def changed(self):
+        return self.tail.changed()
+    
+    def record(self, *ops):
+        with self.file_lock:
+            self.merge_changes()
+            for op in ops:
+                self.apply(op)
+            try:
+                with open(self.journal_file, 'a') as f:
+                    f.write("".join(json.dumps(op) + "\n" for op in ops))
+                self.journal_lines += len(ops)
+                self.tail.mark()
+            except Exception as e:
+                print(f"Error saving bookmarks: {e}")
+            # Compact in proportion to size so bulk imports stay linear.
+            if self.journal_lines >= max(self.compact_threshold, len(self.bookmarks) // 2):
+                self.save_bookmarks()
     
-    def add_bookmark(self, title, url):
-        bookmark = {"title": title, "url": url}
-        if bookmark not in self.bookmarks:
-            self.bookmarks.append(bookmark)
+    def save_bookmarks(self):
+        with self.file_lock:
+            self.merge_changes()
+            data = {
+                "folders": [folder for folder in self.subfolders if folder],
+                "bookmarks": list(self.bookmarks.values()),
+            }
+            try:
+                tmp_file = self.bookmarks_file + ".tmp"
+                with open(tmp_file, 'w') as f:
+                    json.dump(data, f, indent=2)
+                    f.flush()
+                    os.fsync(f.fileno())
+                os.replace(tmp_file, self.bookmarks_file)
+                open(self.journal_file, 'w').close()
+                self.journal_lines = 0
+                self.tail.mark()
+            except Exception as e:
+                print(f"Error saving bookmarks: {e}")
+    
+    def flush(self):
+        if self.journal_lines:
             self.save_bookmarks()
-            return True
-        return False
+    
+    def ensure_folder(self, folder):
+        folder = folder.strip("/")
+        while folder not in self.subfolders:
+            self.subfolders[folder] = {}
+            self.folder_bookmarks[folder] = {}
+            parent = folder.rpartition("/")[0]
+            self.ensure_folder(parent)
+            self.subfolders[parent][folder] = None
+        return folder
+    
+    def drop_folder(self, folder):
+        for child in list(self.subfolders.get(folder, ())):
+            self.drop_folder(child)
+        for bookmark in list(self.folder_bookmarks.get(folder, {}).values()):
+            self.unindex_bookmark(bookmark)
+        if folder:
+            del self.subfolders[folder]
+            del self.folder_bookmarks[folder]
+            self.subfolders[folder.rpartition("/")[0]].pop(folder, None)
+    
+    def index_bookmark(self, bookmark):
+        self.bookmarks[bookmark["url"]] = bookmark
+        self.folder_bookmarks[self.ensure_folder(bookmark["folder"])][bookmark["url"]] = bookmark
+        for tag in bookmark["tags"]:
+            self.tags[tag][bookmark["url"]] = bookmark
+    
+    def unindex_bookmark(self, bookmark):
+        url = bookmark["url"]
+        del self.bookmarks[url]
+        self.folder_bookmarks[bookmark["folder"]].pop(url, None)
+        for tag in bookmark["tags"]:
+            self.tags[tag].pop(url, None)
+            if not self.tags[tag]:
+                del self.tags[tag]
+    
+    def get(self, url):
+        return self.bookmarks.get(url)
+    
+    def is_bookmarked(self, url):
+        return url in self.bookmarks
+    
+    def folder_contents(self, folder):
+        return list(self.subfolders.get(folder, ())), list(self.folder_bookmarks.get(folder, {}).values())
+    
+    def folder_size(self, folder):
+        return len(self.subfolders.get(folder, ())) + len(self.folder_bookmarks.get(folder, ()))
+    
+    def tagged(self, tag):
+        return list(self.tags.get(tag, {}).values())
+    
+    def search(self, text):
+        """Yield bookmarks matching every word; "tag:name" words use the tag index."""
+        words = text.lower().split()
+        tag_words = [w[4:] for w in words if w.startswith("tag:")]
+        words = [w for w in words if not w.startswith("tag:")]
+        candidates = self.bookmarks.values()
+        if tag_words:
+            candidates = self.tags.get(tag_words[0], {}).values()
+        for bookmark in list(candidates):
+            if any(tag not in bookmark["tags"] for tag in tag_words[1:]):
+                continue
+            haystack = f"{bookmark['title']} {bookmark['url']} {' '.join(bookmark['tags'])}".lower()
+            if all(word in haystack for word in words):
+                yield bookmark
+    
+    def add_bookmark(self, title, url, folder="", tags=()):
+        if url in self.bookmarks:
+            return False
+        bookmark = self.normalize({"title": title, "url": url, "folder": folder, "tags": list(tags)})
+        self.record({"op": "add", "bookmark": bookmark})
+        self.notify("add", bookmark)
+        return True
+    
+    def import_bookmarks(self, bookmarks):
+        """Add a batch of bookmarks, skipping URLs that are already bookmarked."""
+        added = {}
+        for bookmark in bookmarks:
+            bookmark = self.normalize(bookmark)
+            if bookmark["url"] not in self.bookmarks and bookmark["url"] not in added:
+                added[bookmark["url"]] = bookmark
+        if added:
+            self.record(*({"op": "add", "bookmark": b} for b in added.values()))
+            self.notify("import", list(added.values()))
+        return len(added)
+    
+    def update_bookmark(self, url, **changes):
+        bookmark = dict(self.bookmarks[url], **changes)
+        bookmark = self.normalize(bookmark)
+        self.record({"op": "update", "url": url, "bookmark": bookmark})
+        self.notify("update", bookmark)
     
     def remove_bookmark(self, url):
-        self.bookmarks = [b for b in self.bookmarks if b["url"] != url]
-        self.save_bookmarks()
+        if url not in self.bookmarks:
+            return
+        self.record({"op": "remove", "url": url})
+        self.notify("remove", {"url": url})
+    
+    def add_folder(self, folder):
+        folder = folder.strip("/")
+        if folder and folder not in self.subfolders:
+            self.record({"op": "add_folder", "folder": folder})
+    
+    def remove_folder(self, folder):
+        removed = []
+        pending = [folder]
+        while pending:
+            current = pending.pop()
+            pending.extend(self.subfolders.get(current, ()))
+            removed.extend(self.folder_bookmarks.get(current, {}))
+        self.record({"op": "remove_folder", "folder": folder})
+        for url in removed:
+            self.notify("remove", {"url": url})
 
-class HistoryManager:
-    def __init__(self):
-        self.history_file = "history.json"
-        self.history = self.load_history()
+URL_HOST_RE = re.compile(r"^[A-Za-z][A-Za-z0-9+.-]*://(?:[^/?#@]*@)?(\[[^\]/]*\]|[^/?#:]*)")
+
+def url_host(url):
+    match = URL_HOST_RE.match(url)
+    return match.group(1).strip("[]").lower() if match else ""
+
+VISIT_HALF_LIFE = 14 * 24 * 3600
+
+def visit_rank(timestamp):
+    """Log-domain decay score of a single visit.
+    
+    Summing visits with logaddexp gives log(sum(2 ** (t_i / half_life))).
+    Its ordering does not change as time passes, so it can sit in an index;
+    the decayed score at time now is exp(rank - visit_rank(now)).
+    """
+    return timestamp * math.log(2) / VISIT_HALF_LIFE
+
+def logaddexp(a, b):
+    if a < b:
+        a, b = b, a
+    return a + math.log1p(math.exp(b - a))
+
+VisitStats = collections.namedtuple("VisitStats", "key title visit_count last_visit score")
+
+class HistoryEntry:
+    __slots__ = ("title", "url", "host", "timestamp", "visit")
+    
+    def __init__(self, title, url, timestamp, host=None, visit=True):
+        self.title = title
+        self.url = url
+        self.host = sys.intern(host if host is not None else url_host(url))
+        self.timestamp = timestamp
+        # False when the entry only updates the title of an ongoing visit.
+        self.visit = visit
+    
+    @classmethod
+    def from_dict(cls, data):
+        try:
+            timestamp = datetime.datetime.fromisoformat(data.get("timestamp", "")).timestamp()
+        except (TypeError, ValueError):
+            timestamp = 0.0
+        return cls(data.get("title") or "", data["url"], timestamp, visit=data.get("visit", False))
+    
+    def iso_timestamp(self):
+        return datetime.datetime.fromtimestamp(self.timestamp).isoformat()
+    
+    def date_str(self):
+        return datetime.datetime.fromtimestamp(self.timestamp).strftime("%Y-%m-%d %H:%M:%S")
+    
+    def to_dict(self):
+        return {"title": self.title, "url": self.url, "timestamp": self.iso_timestamp()}
+
+class HistoryIndex:
+    """History entries keyed by URL, kept in visit order (oldest first).
+    
+    Revisiting a URL moves it to the end in O(1). With max_entries set, the
+    least recently visited entries are evicted so memory stays bounded.
+    """
+    def __init__(self, entries=(), max_entries=None):
+        self.lock = threading.Lock()
+        self.entries = collections.OrderedDict()
+        self.max_entries = max_entries
+        for entry in entries:
+            self.add(entry)
+    
+    def __len__(self):
+        return len(self.entries)
+    
+    def __contains__(self, url):
+        return url in self.entries
+    
+    def get(self, url):
+        return self.entries.get(url)
+    
+    def add(self, entry):
+        with self.lock:
+            self.entries.pop(entry.url, None)
+            self.entries[entry.url] = entry
+            if self.max_entries and len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+    
+    def add_oldest(self, entry):
+        with self.lock:
+            self.entries[entry.url] = entry
+            self.entries.move_to_end(entry.url, last=False)
+    
+    def recent(self, limit=None, offset=0):
+        stop = offset + limit if limit is not None else None
+        with self.lock:
+            return list(itertools.islice(reversed(self.entries.values()), offset, stop))
+    
+    def pop_before(self, timestamp, limit=None):
+        popped = []
+        with self.lock:
+            while self.entries and (limit is None or len(popped) < limit):
+                url, entry = next(iter(self.entries.items()))
+                if entry.timestamp >= timestamp:
+                    break
+                del self.entries[url]
+                popped.append(entry)
+        return popped
+    
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+def month_key(timestamp):
+    return time.strftime("%Y-%m", time.localtime(timestamp))
+
+def month_start(timestamp, months_back=0):
+    date = datetime.date.fromtimestamp(timestamp)
+    month = date.year * 12 + date.month - 1 - months_back
+    return time.mktime((month // 12, month % 12 + 1, 1, 0, 0, 0, 0, 0, -1))
+
+class HistoryArchive:
+    """Monthly history shards, lzma-compressed and read only on demand.
+    
+    Each append adds another xz stream to the end of a shard instead of
+    rewriting it; lzma reads the concatenated streams back as one file.
+    """
+    shard_re = re.compile(r"^(\d{4}-\d{2})\.jsonl\.xz$")
+    
+    def __init__(self, directory="history_archive"):
+        self.directory = directory
+    
+    def shard_path(self, month):
+        return os.path.join(self.directory, f"{month}.jsonl.xz")
+    
+    def months(self):
+        try:
+            names = os.listdir(self.directory)
+        except OSError:
+            return []
+        return sorted((m.group(1) for m in map(self.shard_re.match, names) if m), reverse=True)
+    
+    def load(self, month):
+        entries = []
+        try:
+            with lzma.open(self.shard_path(month), 'rt') as f:
+                for line in f:
+                    try:
+                        entries.append(HistoryEntry.from_dict(json.loads(line)))
+                    except (ValueError, KeyError):
+                        continue
+        except (OSError, EOFError, lzma.LZMAError) as e:
+            if not isinstance(e, FileNotFoundError):
+                print(f"Error reading history shard {month}: {e}")
+        return entries
+    
+    def append(self, entries):
+        by_month = collections.defaultdict(list)
+        for entry in entries:
+            by_month[month_key(entry.timestamp)].append(entry)
+        os.makedirs(self.directory, exist_ok=True)
+        for month, month_entries in by_month.items():
+            data = "".join(json.dumps(entry.to_dict()) + "\n" for entry in month_entries)
+            with open(self.shard_path(month), 'ab') as f:
+                f.write(lzma.compress(data.encode('utf-8')))
+    
+    def size(self):
+        total = 0
+        for month in self.months():
+            try:
+                total += os.path.getsize(self.shard_path(month))
+            except OSError:
+                pass
+        return total
+    
+    def remove(self, month):
+        try:
+            os.remove(self.shard_path(month))
+        except OSError as e:
+            print(f"Error removing history shard {month}: {e}")
+    
+    def prune(self, max_age_days=0, max_bytes=0):
+        months = self.months()
+        if max_age_days:
+            oldest = month_key(time.time() - max_age_days * 86400)
+            for month in [m for m in months if m < oldest]:
+                self.remove(month)
+                months.remove(month)
+        if max_bytes:
+            total = self.size()
+            while months and total > max_bytes:
+                month = months.pop()
+                size = os.path.getsize(self.shard_path(month))
+                self.remove(month)
+                total -= size
+    
+    def clear(self):
+        for month in self.months():
+            self.remove(month)
+
+class HistoryWriter(threading.Thread):
+    """Writes history entries to the store in batches, off the GUI thread."""
+    def __init__(self, store, batch_interval=1.0):
+        super().__init__(name="HistoryWriter", daemon=True)
+        self.store = store
+        self.batch_interval = batch_interval
+        self.queue = queue.Queue()
+        self.start()
+    
+    def submit(self, entry):
+        self.queue.put(entry)
+    
+    def run_task(self, func):
+        self.queue.put(func)
+    
+    def flush(self, timeout=5.0):
+        done = threading.Event()
+        self.queue.put(done)
+        return done.wait(timeout)
+    
+    def run(self):
+        while True:
+            batch = [self.queue.get()]
+            deadline = time.monotonic() + self.batch_interval
+            while not isinstance(batch[-1], threading.Event):
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self.queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+            
+            # Entries are written in runs so tasks and flush markers see
+            # exactly the entries queued before them.
+            entries = []
+            for item in batch + [None]:
+                if isinstance(item, HistoryEntry):
+                    entries.append(item)
+                    continue
+                if entries:
+                    try:
+                        self.store.write_batch(entries)
+                    except Exception as e:
+                        print(f"Error writing history: {e}")
+                    entries = []
+                if isinstance(item, threading.Event):
+                    item.set()
+                elif callable(item):
+                    try:
+                        item()
+                    except Exception as e:
+                        print(f"Error in history task: {e}")
+
+class VisitRollup:
+    """Per-URL and per-host visit aggregates kept in memory.
+    
+    Used by the JSON store; top-N queries here are a heap over all keys.
+    """
+    def __init__(self, data=None):
+        data = data or {}
+        self.urls = data.get("urls", {})
+        self.hosts = data.get("hosts", {})
+    
+    def add(self, entry, count=1):
+        rank = visit_rank(entry.timestamp) + math.log(count)
+        for table, key in ((self.urls, entry.url), (self.hosts, entry.host)):
+            stats = table.get(key)
+            if stats is None:
+                table[key] = [count, entry.timestamp, rank]
+            else:
+                stats[0] += count
+                stats[1] = max(stats[1], entry.timestamp)
+                stats[2] = logaddexp(stats[2], rank)
+    
+    def expire(self, timestamp):
+        for table in (self.urls, self.hosts):
+            for key in [k for k, stats in table.items() if stats[1] < timestamp]:
+                del table[key]
+    
+    def top(self, table, limit):
+        return heapq.nlargest(limit, table.items(), key=lambda item: item[1][2])
+    
+    def to_dict(self):
+        return {"urls": self.urls, "hosts": self.hosts}
+
+class JsonHistoryStore:
+    """history.json snapshot plus an append-only journal of later entries.
+    
+    Used when sqlite3 is unavailable.
+    """
+    def __init__(self, history_file="history.json", journal_file="history.journal", compact_threshold=500):
+        self.history_file = history_file
+        self.journal_file = journal_file
+        self.stats_file = os.path.splitext(history_file)[0] + "_stats.json"
+        self.compact_threshold = compact_threshold
+        self.file_lock = FileLock(os.path.splitext(history_file)[0] + ".lock")
+        # Entries other processes journaled, waiting for changes(); None
+        # once a compaction elsewhere forced a reload.
+        self.foreign = []
+        with self.file_lock:
+            self.rollup = VisitRollup(self.load_stats())
+            self.index = HistoryIndex(self.load_history())
+            self.journal_lines = self.count_journal_lines()
+            self.tail = JournalTail(self.journal_file, self.history_file)
+    
+    def reload(self):
+        self.rollup = VisitRollup(self.load_stats())
+        entries = self.load_history()
+        self.index.clear()
+        for entry in entries:
+            self.index.add(entry)
+        self.journal_lines = self.count_journal_lines()
+        self.tail.mark()
+    
+    def read_journal(self):
+        """Merge entries other processes appended. Call with file_lock held."""
+        lines = self.tail.read_new()
+        if lines is None:
+            self.reload()
+            self.foreign = None
+            return
+        for line in lines:
+            try:
+                entry = HistoryEntry.from_dict(json.loads(line))
+            except (ValueError, KeyError):
+                continue
+            self.index.add(entry)
+            if entry.visit:
+                self.rollup.add(entry)
+            self.journal_lines += 1
+            if self.foreign is not None:
+                self.foreign.append(entry)
+    
+    def changes(self):
+        with self.file_lock:
+            self.read_journal()
+            foreign, self.foreign = self.foreign, []
+        return foreign
+    
+    def changed(self):
+        return self.tail.changed()
+    
+    def watched_files(self):
+        return [self.journal_file, self.history_file]
+    
+    def load_stats(self):
+        try:
+            if os.path.exists(self.stats_file):
+                with open(self.stats_file, 'r') as f:
+                    return json.load(f)
+        except Exception as e:
+            print(f"Error reading history stats: {e}")
+        return None
     
     def load_history(self):
+        history = []
         try:
             if os.path.exists(self.history_file):
                 with open(self.history_file, 'r') as f:
-                    return json.load(f)
+                    history = [HistoryEntry.from_dict(h) for h in json.load(f)]
         except:
             pass
-        return []
+        
+        # Replay entries that were journaled after the last compaction. A torn
+        # final line from a crash mid-write is skipped.
+        try:
+            if os.path.exists(self.journal_file):
+                with open(self.journal_file, 'r') as f:
+                    for line in f:
+                        try:
+                            entry = HistoryEntry.from_dict(json.loads(line))
+                        except (ValueError, KeyError):
+                            continue
+                        history.append(entry)
+                        if entry.visit:
+                            self.rollup.add(entry)
+        except Exception as e:
+            print(f"Error reading history journal: {e}")
+        return history
     
-    def save_history(self):
+    def count_journal_lines(self):
+        try:
+            with open(self.journal_file, 'rb') as f:
+                return sum(1 for _ in f)
+        except OSError:
+            return 0
+    
+    def load_index(self, limit=None, since=0):
+        return self.index
+    
+    def pop_before(self, timestamp, limit=50000):
+        popped = self.index.pop_before(timestamp, limit)
+        if popped:
+            self.compact()
+        return popped
+    
+    def write_batch(self, entries):
+        with self.file_lock:
+            self.read_journal()
+            with open(self.journal_file, 'a') as f:
+                f.write("".join(json.dumps(dict(e.to_dict(), visit=e.visit)) + "\n" for e in entries))
+                for entry in entries:
+                    if entry.visit:
+                        self.rollup.add(entry)
+                f.flush()
+                os.fsync(f.fileno())
+            self.journal_lines += len(entries)
+            self.tail.mark()
+        
+        if self.journal_lines >= self.compact_threshold:
+            self.compact()
+    
+    def import_batch(self, items):
+        """Add imported (entry, visit_count) pairs, newest first, behind the
+        existing history. URLs already known are skipped. The caller compacts
+        once the import is done."""
+        added = 0
+        with self.file_lock:
+            for entry, count in items:
+                if entry.url in self.index or entry.url in self.rollup.urls:
+                    continue
+                self.index.add_oldest(entry)
+                self.rollup.add(entry, count)
+                added += 1
+        return added
+    
+    def write_snapshot(self):
+        with self.file_lock:
+            self.read_journal()
+            history = [e.to_dict() for e in reversed(self.index.recent(1000))]
+            tmp_file = self.history_file + ".tmp"
+            with open(tmp_file, 'w') as f:
+                json.dump(history, f, indent=2)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_file, self.history_file)
+            with open(self.stats_file + ".tmp", 'w') as f:
+                json.dump(self.rollup.to_dict(), f)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(self.stats_file + ".tmp", self.stats_file)
+            # Only truncate the journal once the snapshot is in place; replaying
+            # a journal over a snapshot that already contains it is harmless.
+            open(self.journal_file, 'w').close()
+            self.journal_lines = 0
+            self.tail.mark()
+    
+    def compact(self):
         try:
-            with open(self.history_file, 'w') as f:
-                json.dump(self.history[-1000:], f, indent=2)
+            self.write_snapshot()
         except Exception as e:
-            print(f"Error saving history: {e}")
+            print(f"Error compacting history: {e}")
     
-    def add_to_history(self, title, url):
-        import datetime
-        entry = {
-            "title": title,
-            "url": url,
-            "timestamp": datetime.datetime.now().isoformat()
-        }
-        self.history = [h for h in self.history if h["url"] != url]
-        self.history.append(entry)
-        self.save_history()
+    def recent(self, limit=100, offset=0):
+        return self.index.recent(limit, offset)
+    
+    def search(self, text, limit=100, offset=0):
+        words = text.lower().split()
+        matches = (entry for entry in self.index.recent()
+                   if all(word in f"{entry.title} {entry.url}".lower() for word in words))
+        return list(itertools.islice(matches, offset, offset + limit))
+    
+    def migrate_stats(self):
+        pass
+    
+    def expire_stats(self, timestamp):
+        with self.file_lock:
+            self.rollup.expire(timestamp)
+    
+    def top_urls(self, limit=10):
+        with self.file_lock:
+            top = self.rollup.top(self.rollup.urls, limit)
+        results = []
+        for url, (count, last_visit, rank) in top:
+            entry = self.index.get(url)
+            results.append(VisitStats(url, entry.title if entry else "", count, last_visit, rank))
+        return results
+    
+    def top_hosts(self, limit=10):
+        with self.file_lock:
+            top = self.rollup.top(self.rollup.hosts, limit)
+        return [VisitStats(host, host, count, last_visit, rank) for host, (count, last_visit, rank) in top]
+    
+    def url_stats(self, url):
+        stats = self.rollup.urls.get(url)
+        if stats is None:
+            return None
+        entry = self.index.get(url)
+        return VisitStats(url, entry.title if entry else "", stats[0], stats[1], stats[2])
+    
+    def clear(self):
+        self.index.clear()
+        self.rollup = VisitRollup()
+        self.compact()
+
+class SqliteHistoryStore:
+    """SQLite history database with an FTS5 index over title and URL.
+    
+    Each URL has a single row; revisiting a URL deletes and re-inserts it so
+    rowid order is most-recently-visited order, which lets both the recent
+    list and full-text search walk an index backwards instead of sorting.
+    """
+    def __init__(self, db_file="history.db", json_store=None):
+        self.db_file = db_file
+        self.local = threading.local()
+        conn = self.connection()
+        self.has_fts = self.create_schema(conn)
+        # Rows this process inserted, so changes() only reports other
+        # processes' visits. Bulk rewrites (clear, import) bump the
+        # generation instead, telling other processes to reload.
+        self.own_ids = set()
+        self.own_lock = threading.Lock()
+        self.migrate_json(conn, json_store)
+        self.own_ids.clear()
+        self.last_seen_id = conn.execute("SELECT coalesce(max(id), 0) FROM history").fetchone()[0]
+        self.generation = self.read_generation(conn)
+    
+    def read_generation(self, conn):
+        row = conn.execute("SELECT value FROM meta WHERE key = 'generation'").fetchone()
+        return row[0] if row else None
+    
+    def bump_generation(self, conn):
+        self.generation = str(time.time_ns())
+        conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('generation', ?)", (self.generation,))
+    
+    def changes(self):
+        conn = self.connection()
+        generation = self.read_generation(conn)
+        if generation != self.generation:
+            self.generation = generation
+            self.last_seen_id = conn.execute("SELECT coalesce(max(id), 0) FROM history").fetchone()[0]
+            return None
+        rows = conn.execute("SELECT id, title, url, timestamp, visit FROM history WHERE id > ? ORDER BY id",
+                            (self.last_seen_id,)).fetchall()
+        if not rows:
+            return []
+        with self.own_lock:
+            self.last_seen_id = rows[-1][0]
+            foreign = [row[1:] for row in rows if row[0] not in self.own_ids]
+            self.own_ids = {i for i in self.own_ids if i > self.last_seen_id}
+        return [HistoryEntry.from_dict({"title": title, "url": url, "timestamp": timestamp, "visit": bool(visit)})
+                for title, url, timestamp, visit in foreign]
+    
+    def changed(self):
+        """Whether another process wrote since changes() last ran."""
+        conn = self.connection()
+        if self.read_generation(conn) != self.generation:
+            return True
+        with self.own_lock:
+            last_seen_id, own_ids = self.last_seen_id, set(self.own_ids)
+        rows = conn.execute("SELECT id FROM history WHERE id > ?", (last_seen_id,)).fetchall()
+        return any(row[0] not in own_ids for row in rows)
+    
+    def watched_files(self):
+        return [self.db_file + "-wal", self.db_file]
+    
+    def connection(self):
+        conn = getattr(self.local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_file, timeout=10)
+            conn.create_function("logaddexp", 2, logaddexp, deterministic=True)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("PRAGMA cache_size=-32768")
+            self.local.conn = conn
+        return conn
+    
+    def create_schema(self, conn):
+        with conn:
+            conn.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS history (
+                    id INTEGER PRIMARY KEY,
+                    url TEXT NOT NULL UNIQUE,
+                    title TEXT NOT NULL DEFAULT '',
+                    timestamp TEXT NOT NULL,
+                    visit INTEGER NOT NULL DEFAULT 1
+                )
+            """)
+            # visit tells other processes whether a row was a visit or only
+            # a title update; databases from before it count every row.
+            if "visit" not in [row[1] for row in conn.execute("PRAGMA table_info(history)")]:
+                conn.execute("ALTER TABLE history ADD COLUMN visit INTEGER NOT NULL DEFAULT 1")
+            conn.execute("CREATE INDEX IF NOT EXISTS history_timestamp ON history (timestamp)")
+            # Every visit is logged; url_stats and host_stats are rollups kept
+            # up to date as visits are written, with score in visit_rank form.
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS visits (
+                    id INTEGER PRIMARY KEY,
+                    url TEXT NOT NULL,
+                    timestamp REAL NOT NULL
+                )
+            """)
+            conn.execute("CREATE INDEX IF NOT EXISTS visits_url ON visits (url)")
+            conn.execute("CREATE INDEX IF NOT EXISTS visits_timestamp ON visits (timestamp)")
+            for table, key in (("url_stats", "url"), ("host_stats", "host")):
+                conn.execute(f"""
+                    CREATE TABLE IF NOT EXISTS {table} (
+                        {key} TEXT PRIMARY KEY,
+                        visit_count INTEGER NOT NULL,
+                        last_visit REAL NOT NULL,
+                        score REAL NOT NULL
+                    ) WITHOUT ROWID
+                """)
+                conn.execute(f"CREATE INDEX IF NOT EXISTS {table}_score ON {table} (score)")
+        try:
+            with conn:
+                conn.execute("""
+                    CREATE VIRTUAL TABLE IF NOT EXISTS history_fts USING fts5(
+                        title, url, content='history', content_rowid='id',
+                        tokenize='unicode61', prefix='2 3'
+                    )
+                """)
+                conn.execute("""
+                    CREATE TRIGGER IF NOT EXISTS history_ai AFTER INSERT ON history BEGIN
+                        INSERT INTO history_fts(rowid, title, url) VALUES (new.id, new.title, new.url);
+                    END
+                """)
+                conn.execute("""
+                    CREATE TRIGGER IF NOT EXISTS history_ad AFTER DELETE ON history BEGIN
+                        INSERT INTO history_fts(history_fts, rowid, title, url)
+                        VALUES ('delete', old.id, old.title, old.url);
+                    END
+                """)
+            return True
+        except sqlite3.OperationalError as e:
+            print(f"FTS5 unavailable, history search will be slower: {e}")
+            return False
+    
+    def migrate_json(self, conn, json_store):
+        if conn.execute("SELECT 1 FROM meta WHERE key = 'json_migrated'").fetchone():
+            return
+        if json_store is None:
+            json_store = JsonHistoryStore()
+        entries = list(reversed(json_store.index.recent()))
+        # The visits come over with the JSON rollups, not one per entry.
+        for entry in entries:
+            entry.visit = False
+        self.write_batch(entries)
+        rollup = json_store.rollup
+        with conn:
+            self.merge_stats(conn, "url_stats", "url", [(url, *stats) for url, stats in rollup.urls.items()])
+            self.merge_stats(conn, "host_stats", "host", [(host, *stats) for host, stats in rollup.hosts.items()])
+            if rollup.urls:
+                conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('stats_migrated', '1')")
+            conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('json_migrated', ?)",
+                         (str(len(entries)),))
+        if entries:
+            print(f"Migrated {len(entries)} history entries to {self.db_file}")
+    
+    def load_index(self, limit=None, since=0):
+        rows = self.connection().execute(
+            "SELECT title, url, timestamp FROM history WHERE timestamp >= ? ORDER BY id DESC LIMIT ?",
+            (datetime.datetime.fromtimestamp(since).isoformat(), limit or -1))
+        return HistoryIndex(reversed(self.rows_to_entries(rows)), max_entries=limit)
+    
+    def pop_before(self, timestamp, limit=50000):
+        conn = self.connection()
+        cutoff = datetime.datetime.fromtimestamp(timestamp).isoformat()
+        with conn:
+            rows = conn.execute(
+                "SELECT id, title, url, timestamp FROM history WHERE timestamp < ? ORDER BY id LIMIT ?",
+                (cutoff, limit)).fetchall()
+            if rows:
+                # One statement rather than a delete per id; the FTS delete
+                # trigger is much cheaper that way.
+                conn.execute("DELETE FROM history WHERE timestamp < ? AND id <= ?", (cutoff, rows[-1][0]))
+            # Old visits are already summarised in the rollups.
+            conn.execute("DELETE FROM visits WHERE timestamp < ?", (timestamp,))
+        return self.rows_to_entries(row[1:] for row in rows)
+    
+    def write_batch(self, entries):
+        conn = self.connection()
+        with conn:
+            for entry in entries:
+                conn.execute("DELETE FROM history WHERE url = ?", (entry.url,))
+                cursor = conn.execute("INSERT INTO history (url, title, timestamp, visit) VALUES (?, ?, ?, ?)",
+                                      (entry.url, entry.title, entry.iso_timestamp(), int(entry.visit)))
+                with self.own_lock:
+                    self.own_ids.add(cursor.lastrowid)
+                if entry.visit:
+                    self.record_visit(conn, entry.url, entry.host, entry.timestamp)
+    
+    def record_visit(self, conn, url, host, timestamp, count=1):
+        rank = visit_rank(timestamp)
+        conn.execute("INSERT INTO visits (url, timestamp) VALUES (?, ?)", (url, timestamp))
+        self.merge_stats(conn, "url_stats", "url", [(url, count, timestamp, rank)])
+        self.merge_stats(conn, "host_stats", "host", [(host, count, timestamp, rank)])
+    
+    def merge_stats(self, conn, table, key, rows):
+        conn.executemany(f"""
+            INSERT INTO {table} ({key}, visit_count, last_visit, score) VALUES (?, ?, ?, ?)
+            ON CONFLICT ({key}) DO UPDATE SET
+                visit_count = visit_count + excluded.visit_count,
+                last_visit = max(last_visit, excluded.last_visit),
+                score = logaddexp(score, excluded.score)
+        """, rows)
+    
+    def import_batch(self, items):
+        """Add imported (entry, visit_count) pairs, newest first.
+        
+        URLs already in the history or the rollups are skipped, so importing
+        the same profile twice is harmless. New rows get ids below every
+        existing row, keeping rowid order in line with recency. Only
+        aggregate counts are known, so they are scored as if every visit
+        happened at the last one.
+        """
+        conn = self.connection()
+        urls = [entry.url for entry, count in items]
+        known = set()
+        for i in range(0, len(urls), 500):
+            chunk = urls[i:i + 500]
+            marks = ",".join("?" * len(chunk))
+            for table in ("history", "url_stats"):
+                known.update(row[0] for row in conn.execute(
+                    f"SELECT url FROM {table} WHERE url IN ({marks})", chunk))
+        
+        new_items = []
+        hosts = {}
+        for entry, count in items:
+            if entry.url in known:
+                continue
+            known.add(entry.url)
+            rank = visit_rank(entry.timestamp) + math.log(count)
+            new_items.append((entry, count, rank))
+            stats = hosts.get(entry.host)
+            if stats is None:
+                hosts[entry.host] = [entry.host, count, entry.timestamp, rank]
+            else:
+                stats[1] += count
+                stats[2] = max(stats[2], entry.timestamp)
+                stats[3] = logaddexp(stats[3], rank)
+        if not new_items:
+            return 0
+        
+        with conn:
+            # Staging the batch and copying it over in one statement keeps
+            # the FTS trigger several times cheaper than row-by-row inserts.
+            conn.execute("""
+                CREATE TEMP TABLE IF NOT EXISTS import_staging (
+                    id INTEGER PRIMARY KEY, url TEXT, title TEXT, timestamp TEXT,
+                    visit_count INTEGER, last_visit REAL, score REAL
+                )
+            """)
+            # Imported rows go behind the oldest one, so ids may reach 0 and below.
+            first_id = min(conn.execute("SELECT coalesce(min(id), 1) FROM history").fetchone()[0], 1) - 1
+            conn.executemany("INSERT INTO import_staging VALUES (?, ?, ?, ?, ?, ?, ?)",
+                             [(first_id - i, entry.url, entry.title, entry.iso_timestamp(), count, entry.timestamp, rank)
+                              for i, (entry, count, rank) in enumerate(new_items)])
+            conn.execute("""
+                INSERT INTO history (id, url, title, timestamp)
+                SELECT id, url, title, timestamp FROM import_staging ORDER BY id
+            """)
+            # These URLs are new to url_stats too; inserting in key order
+            # keeps the b-tree appends local.
+            conn.execute("""
+                INSERT INTO url_stats (url, visit_count, last_visit, score)
+                SELECT url, visit_count, last_visit, score FROM import_staging ORDER BY url
+            """)
+            conn.execute("DELETE FROM import_staging")
+            self.merge_stats(conn, "host_stats", "host", hosts.values())
+            self.bump_generation(conn)
+        return len(new_items)
+    
+    def migrate_stats(self):
+        """Seed the rollups with one visit per existing history row, once."""
+        conn = self.connection()
+        if conn.execute("SELECT 1 FROM meta WHERE key = 'stats_migrated'").fetchone():
+            return
+        with conn:
+            for title, url, timestamp in conn.execute("SELECT title, url, timestamp FROM history").fetchall():
+                entry = HistoryEntry.from_dict({"title": title, "url": url, "timestamp": timestamp})
+                self.record_visit(conn, entry.url, entry.host, entry.timestamp)
+            conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('stats_migrated', '1')")
+    
+    def expire_stats(self, timestamp):
+        conn = self.connection()
+        with conn:
+            conn.execute("DELETE FROM url_stats WHERE last_visit < ?", (timestamp,))
+            conn.execute("DELETE FROM host_stats WHERE last_visit < ?", (timestamp,))
+    
+    def top_urls(self, limit=10):
+        rows = self.connection().execute("""
+            SELECT s.url, coalesce(h.title, ''), s.visit_count, s.last_visit, s.score
+            FROM url_stats s LEFT JOIN history h ON h.url = s.url
+            ORDER BY s.score DESC LIMIT ?
+        """, (limit,))
+        return [VisitStats(*row) for row in rows]
+    
+    def top_hosts(self, limit=10):
+        rows = self.connection().execute("""
+            SELECT host, host, visit_count, last_visit, score FROM host_stats
+            ORDER BY score DESC LIMIT ?
+        """, (limit,))
+        return [VisitStats(*row) for row in rows]
+    
+    def url_stats(self, url):
+        row = self.connection().execute("""
+            SELECT s.url, coalesce(h.title, ''), s.visit_count, s.last_visit, s.score
+            FROM url_stats s LEFT JOIN history h ON h.url = s.url WHERE s.url = ?
+        """, (url,)).fetchone()
+        return VisitStats(*row) if row else None
+    
+    def compact(self):
+        pass
+    
+    def rows_to_entries(self, rows):
+        return [HistoryEntry.from_dict({"title": title, "url": url, "timestamp": timestamp})
+                for title, url, timestamp in rows]
+    
+    def recent(self, limit=100, offset=0):
+        rows = self.connection().execute(
+            "SELECT title, url, timestamp FROM history ORDER BY id DESC LIMIT ? OFFSET ?", (limit, offset))
+        return self.rows_to_entries(rows)
+    
+    def search(self, text, limit=100, offset=0):
+        terms = re.findall(r"\w+", text.lower())
+        if not terms:
+            return self.recent(limit, offset)
+        
+        # Completed terms match whole tokens; the term still being typed is a
+        # prefix query.
+        if self.has_fts:
+            match_terms = [f'"{term}"' if i < len(terms) - 1 or not re.search(r"\w$", text) else f'"{term}"*'
+                           for i, term in enumerate(terms)]
+            sql = """
+                SELECT h.title, h.url, h.timestamp FROM history_fts
+                JOIN history h ON h.id = history_fts.rowid
+                WHERE history_fts MATCH ? ORDER BY history_fts.rowid DESC LIMIT ? OFFSET ?
+            """
+            params = [" ".join(match_terms)]
+        else:
+            conditions = []
+            params = []
+            for term in terms:
+                conditions.append("(instr(lower(h.title), ?) OR instr(lower(h.url), ?))")
+                params += [term, term]
+            sql = f"""
+                SELECT h.title, h.url, h.timestamp FROM history h
+                WHERE {" AND ".join(conditions)} ORDER BY h.id DESC LIMIT ? OFFSET ?
+            """
+        return self.rows_to_entries(self.connection().execute(sql, params + [limit, offset]))
+    
+    def clear(self):
+        conn = self.connection()
+        with conn:
+            conn.execute("DELETE FROM history")
+            conn.execute("DELETE FROM visits")
+            conn.execute("DELETE FROM url_stats")
+            conn.execute("DELETE FROM host_stats")
+            if self.has_fts:
+                conn.execute("INSERT INTO history_fts(history_fts) VALUES ('delete-all')")
+            self.bump_generation(conn)
+
+class HistoryManager:
+    def __init__(self, memory_limit=50000, hot_months=12, retention_days=0, archive_limit_mb=0):
+        self.memory_limit = memory_limit
+        self.hot_months = hot_months
+        self.retention_days = retention_days
+        self.archive_limit_mb = archive_limit_mb
+        self.store = self.open_store()
+        self.archive = HistoryArchive()
+        # Only the current month is loaded up front; older entries stay in the
+        # store or the archive until something asks for them.
+        self.current_month = month_key(time.time())
+        self.index = self.store.load_index(memory_limit, since=month_start(time.time()))
+        self.writer = HistoryWriter(self.store)
+        self.writer.run_task(self.maintain)
+        self.listeners = []
+    
+    def add_listener(self, callback):
+        self.listeners.append(callback)
+    
+    def notify(self, action, entry):
+        for callback in self.listeners:
+            callback(action, entry)
+    
+    def open_store(self):
+        if sqlite3 is not None:
+            try:
+                return SqliteHistoryStore()
+            except Exception as e:
+                print(f"Error opening history database, falling back to JSON: {e}")
+        return JsonHistoryStore()
+    
+    def flush(self, timeout=5.0):
+        return self.writer.flush(timeout)
+    
+    def import_history(self, items):
+        """Write a batch of imported (entry, visit_count) pairs and wait for it.
+        
+        Called from an importer thread; waiting keeps the importer from
+        reading ahead of the writer. Returns the number of new entries.
+        """
+        added = []
+        self.writer.run_task(lambda: added.append(self.store.import_batch(items)))
+        self.flush(timeout=None)
+        return added[0] if added else 0
+    
+    def merge_changes(self):
+        """Fold in history other processes wrote to the shared store."""
+        entries = self.store.changes()
+        if entries is None:
+            self.index = self.store.load_index(self.memory_limit, since=month_start(time.time()))
+            self.notify("reload", None)
+            return
+        for entry in entries:
+            self.index.add(entry)
+            self.notify("add", entry)
+    
+    def finish_import(self):
+        self.flush()
+        self.index = self.store.load_index(self.memory_limit, since=month_start(time.time()))
+        self.writer.run_task(self.store.compact)
+        self.writer.run_task(self.maintain)
+        self.notify("reload", None)
+    
+    def set_retention(self, retention_days, archive_limit_mb):
+        self.retention_days = retention_days
+        self.archive_limit_mb = archive_limit_mb
+        self.writer.run_task(self.maintain)
+    
+    def maintain(self):
+        """Move entries older than the hot window into monthly archive shards
+        and apply the retention policy. Runs on the writer thread."""
+        self.store.migrate_stats()
+        now = time.time()
+        cutoff = month_start(now, self.hot_months - 1)
+        expired_before = now - self.retention_days * 86400 if self.retention_days else 0
+        if expired_before > cutoff:
+            cutoff = expired_before
+        while True:
+            entries = self.store.pop_before(cutoff)
+            if not entries:
+                break
+            self.archive.append([e for e in entries if e.timestamp >= expired_before])
+        if expired_before:
+            self.store.expire_stats(expired_before)
+        self.archive.prune(self.retention_days, self.archive_limit_mb * 1024 * 1024)
+    
+    def decayed(self, stats):
+        return stats._replace(score=math.exp(stats.score - visit_rank(time.time())))
+    
+    def top_urls(self, limit=10):
+        """Most visited URLs by decayed visit score, read straight off an index."""
+        self.flush()
+        return [self.decayed(stats) for stats in self.store.top_urls(limit)]
+    
+    def request_top_urls(self, limit, callback):
+        """Call callback with top_urls(limit) from the writer thread, once
+        everything queued before is written, instead of waiting for it."""
+        self.writer.run_task(lambda: callback([self.decayed(stats) for stats in self.store.top_urls(limit)]))
+    
+    def top_hosts(self, limit=10):
+        self.flush()
+        return [self.decayed(stats) for stats in self.store.top_hosts(limit)]
+    
+    def url_stats(self, url):
+        self.flush()
+        stats = self.store.url_stats(url)
+        return self.decayed(stats) if stats else None
+    
+    def archived_months(self):
+        return self.archive.months()
+    
+    def archived(self, month, text=""):
+        words = text.lower().split()
+        return [entry for entry in reversed(self.archive.load(month))
+                if all(word in f"{entry.title} {entry.url}".lower() for word in words)]
+    
+    def recent(self, limit=100, offset=0):
+        if offset + limit <= len(self.index) or self.index.max_entries is None:
+            return self.index.recent(limit, offset)
+        self.flush()
+        return self.store.recent(limit, offset)
+    
+    def search(self, text, limit=100, offset=0):
+        self.flush()
+        return self.store.search(text, limit, offset)
+    
+    def clear_history(self):
+        self.flush()
+        self.store.clear()
+        self.archive.clear()
+        self.index.clear()
+        self.notify("clear", None)
+    
+    def add_to_history(self, title, url, new_visit=True):
+        entry = HistoryEntry(title, url, time.time(), visit=new_visit)
+        self.index.add(entry)
+        self.writer.submit(entry)
+        if month_key(entry.timestamp) != self.current_month:
+            self.current_month = month_key(entry.timestamp)
+            self.writer.run_task(self.maintain)
+        self.notify("add", entry)
+
+class OmniboxItem:
+    __slots__ = ("title", "url", "visit_count", "last_visit", "bookmarked", "keys")
+    
+    def __init__(self, title, url):
+        self.title = title
+        self.url = url
+        self.visit_count = 0
+        self.last_visit = 0.0
+        self.bookmarked = False
+        self.keys = ()
 
-class DownloadItemWidget(QtWidgets.QWidget):
-    def __init__(self, download_item, parent=None):
+class OmniboxIndex(QtCore.QObject):
+    """Prefix index over history and bookmarks for url_bar suggestions.
+    
+    URLs (without scheme and "www.") and the first few title words are kept
+    as (key, url) tuples in two sorted lists, so a lookup is a bisect plus a
+    scan of the matching run. The index is built once and then kept current
+    through manager listeners. Visit counts come from the store's rollups,
+    read on the history writer thread so the GUI thread never waits for it.
+    
+    Short prefixes match long runs, so the best top_k matches of any run
+    longer than cache_threshold are cached until an item in it changes.
+    Decay scales every item's frecency alike, so only the bookmark bonus
+    shifts the order as time passes; entries are also dropped after
+    cache_lifetime seconds.
+    """
+    half_life = 14 * 24 * 3600
+    max_title_words = 6
+    cache_threshold = 1000
+    top_k = 50
+    cache_lifetime = 600
+    rollups_loaded = QtCore.pyqtSignal(int, object)
+    
+    def __init__(self, history_manager, bookmark_manager, parent=None):
         super().__init__(parent)
-        self.download_item = download_item
-        self.filename = download_item.path().split('/')[-1]
-        self.url = download_item.url().toString()
+        self.history_manager = history_manager
+        self.bookmark_manager = bookmark_manager
+        # Bumped by each rebuild, so rollups read for an older one are dropped.
+        self.generation = 0
+        # Visits logged while the rollups are being read; None otherwise.
+        self.pending_visits = None
+        self.rollups_loaded.connect(self.on_rollups_loaded)
+        self.rebuild()
         
-        layout = QtWidgets.QVBoxLayout()
+        history_manager.add_listener(self.on_history_changed)
+        bookmark_manager.add_listener(self.on_bookmarks_changed)
+    
+    def rebuild(self):
+        self.items = {}
+        # Prefix -> (time, [(url, boost)]) for prefixes with long runs.
+        self.top_cache = {}
+        self.url_keys = []
+        self.title_keys = []
+        for entry in reversed(self.history_manager.index.recent()):
+            item = self.get_item(entry.url, entry.title)
+            item.title = entry.title or item.title
+            item.last_visit = max(item.last_visit, entry.timestamp)
+        for bookmark in self.bookmark_manager.bookmarks.values():
+            item = self.get_item(bookmark["url"], bookmark["title"])
+            item.bookmarked = True
+        self.add_keys(self.items.values())
+        
+        # Visit counts come from the per-URL rollups, which cover all of
+        # history; the in-memory index only holds the current month, but has
+        # the freshest titles.
+        self.generation += 1
+        self.pending_visits = []
+        generation = self.generation
+        self.history_manager.request_top_urls(self.history_manager.memory_limit,
+                                              lambda top: self.rollups_loaded.emit(generation, top))
+    
+    def on_rollups_loaded(self, generation, top):
+        if generation != self.generation:
+            return
+        visits, self.pending_visits = self.pending_visits, None
+        for stats in top:
+            item = self.get_item(stats.key, stats.title)
+            item.visit_count = stats.visit_count
+            item.last_visit = max(item.last_visit, stats.last_visit)
+        # The rollups were read before these visits were written.
+        for entry in visits:
+            item = self.items.get(entry.url)
+            if item is not None:
+                item.visit_count += 1
+        self.url_keys = []
+        self.title_keys = []
+        self.add_keys(self.items.values())
+    
+    def add_keys(self, items):
+        # Bulk path: append and re-sort once rather than insort per key.
+        self.top_cache.clear()
+        for item in items:
+            item.keys = self.make_keys(item)
+            self.url_keys.append((item.keys[0], item.url))
+            self.title_keys.extend((key, item.url) for key in item.keys[1:])
+        self.url_keys.sort()
+        self.title_keys.sort()
+    
+    @staticmethod
+    def normalize(text):
+        text = text.strip().lower()
+        for prefix in ("https://", "http://", "www."):
+            if text.startswith(prefix):
+                text = text[len(prefix):]
+        return text
+    
+    def make_keys(self, item):
+        # The URL key always comes first, followed by the title words.
+        url_key = self.normalize(item.url)
+        words = dict.fromkeys(re.findall(r"\w+", item.title.lower())[:self.max_title_words])
+        return (url_key,) + tuple(words)
+    
+    def get_item(self, url, title=""):
+        item = self.items.get(url)
+        if item is None:
+            item = self.items[url] = OmniboxItem(title, url)
+        return item
+    
+    def invalidate(self, keys):
+        for prefix in [p for p in self.top_cache if any(key.startswith(p) for key in keys)]:
+            del self.top_cache[prefix]
+    
+    def remove_keys(self, item):
+        self.invalidate(item.keys)
+        for i, key in enumerate(item.keys):
+            keys = self.title_keys if i else self.url_keys
+            pos = bisect.bisect_left(keys, (key, item.url))
+            if pos < len(keys) and keys[pos] == (key, item.url):
+                del keys[pos]
+        item.keys = ()
+    
+    def reindex(self, item):
+        keys = self.make_keys(item)
+        # Its frecency may have changed even if its keys have not.
+        self.invalidate(item.keys + keys)
+        if keys == item.keys:
+            return
+        self.remove_keys(item)
+        bisect.insort(self.url_keys, (keys[0], item.url))
+        for key in keys[1:]:
+            bisect.insort(self.title_keys, (key, item.url))
+        item.keys = keys
+    
+    def remove_item(self, item):
+        self.remove_keys(item)
+        del self.items[item.url]
+    
+    def on_history_changed(self, action, entry):
+        if action == "add":
+            item = self.get_item(entry.url)
+            item.title = entry.title or item.title
+            # Title updates are logged too, but only visits count, as in
+            # the rollups.
+            if entry.visit:
+                item.visit_count += 1
+                item.last_visit = entry.timestamp
+                if self.pending_visits is not None:
+                    self.pending_visits.append(entry)
+            self.reindex(item)
+        elif action == "reload":
+            self.rebuild()
+        elif action == "clear":
+            # Rollups still being read predate the clear.
+            self.generation += 1
+            self.pending_visits = None
+            self.top_cache.clear()
+            for item in list(self.items.values()):
+                item.visit_count = 0
+                item.last_visit = 0.0
+                if not item.bookmarked:
+                    self.remove_item(item)
+    
+    def on_bookmarks_changed(self, action, bookmark):
+        if action in ("add", "update"):
+            item = self.get_item(bookmark["url"])
+            item.title = item.title or bookmark["title"]
+            item.bookmarked = True
+            self.reindex(item)
+        elif action == "reload":
+            self.rebuild()
+        elif action == "import":
+            new_items = []
+            for b in bookmark:
+                item = self.items.get(b["url"])
+                if item is None:
+                    item = self.get_item(b["url"], b["title"])
+                    new_items.append(item)
+                item.bookmarked = True
+            self.add_keys(new_items)
+        elif action == "remove":
+            item = self.items.get(bookmark["url"])
+            if item is not None:
+                item.bookmarked = False
+                self.invalidate(item.keys)
+                if not item.visit_count:
+                    self.remove_item(item)
+    
+    def frecency(self, item, now):
+        score = item.visit_count * 0.5 ** ((now - item.last_visit) / self.half_life)
+        if item.bookmarked:
+            score += 2.0
+        return score
+    
+    def query(self, text, limit=8):
+        words = self.normalize(text).split()
+        if not words:
+            return []
+        prefix, rest = words[0], words[1:]
+        now = time.time()
+        if not rest:
+            cached = self.top_cache.get(prefix)
+            if cached is not None and now - cached[0] < self.cache_lifetime:
+                return self.rank(cached[1], now, limit)
         
-        self.label = QtWidgets.QLabel(f"{self.filename} - {self.url}")
-        self.label.setFont(QtGui.QFont("Arial", 10))
-        layout.addWidget(self.label)
+        # URL matches outrank title-word matches; they are collected first so
+        # their boost wins when an item matches both ways.
+        boosts = {}
+        for keys, boost in ((self.url_keys, 2.0), (self.title_keys, 1.0)):
+            lo = bisect.bisect_left(keys, (prefix,))
+            hi = bisect.bisect_left(keys, (prefix + "\U0010ffff",), lo)
+            for key, url in keys[lo:hi]:
+                boosts.setdefault(url, boost)
         
-        self.progress_bar = QtWidgets.QProgressBar()
-        self.progress_bar.setMaximum(100)
-        self.progress_bar.setValue(0)
-        layout.addWidget(self.progress_bar)
+        candidates = boosts.items()
+        if rest:
+            candidates = [(url, boost) for url, boost in candidates
+                          if all(word in f"{self.items[url].title} {url}".lower() for word in rest)]
+        elif len(boosts) > self.cache_threshold:
+            top = self.rank(candidates, now, self.top_k)
+            self.top_cache[prefix] = (now, [(item.url, boosts[item.url]) for item in top])
+            return top[:limit]
+        return self.rank(candidates, now, limit)
+    
+    def rank(self, candidates, now, limit):
+        results = ((self.frecency(self.items[url], now) * boost, url) for url, boost in candidates)
+        return [self.items[url] for score, url in heapq.nlargest(limit, results)]
+    
+    def inline_completion(self, text, items):
+        """Return (completion, url) for the first item whose URL starts with
+        what was typed, completing to the host before the full URL."""
+        typed = self.normalize(text)
+        if not typed or " " in typed:
+            return None
+        for item in items:
+            stripped = item.keys[0]
+            if not stripped.startswith(typed):
+                continue
+            host = stripped.split("/", 1)[0] + "/"
+            if host.startswith(typed) and len(typed) < len(host):
+                return host, item.url.split("//", 1)[0] + "//" + url_host(item.url) + "/"
+            return stripped, item.url
+        return None
+
+class SharedStorage(QtCore.QObject):
+    """Bookmarks, history and the omnibox index shared by every window.
+    
+    One instance per process. Other processes using the same files are
+    noticed through a QFileSystemWatcher on the store files; their changes
+    are merged from the journals / database incrementally rather than by
+    re-reading everything. Changes this process made itself are ignored.
+    """
+    instance = None
+    merge_delay = 200
+    
+    @classmethod
+    def shared(cls):
+        if cls.instance is None:
+            cls.instance = cls()
+        return cls.instance
+    
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.bookmark_manager = BookmarkManager()
+        settings = read_settings_file()
+        self.history_manager = HistoryManager(retention_days=settings.get("history_retention_days", 0),
+                                              archive_limit_mb=settings.get("history_archive_limit_mb", 0))
+        self.omnibox_index = OmniboxIndex(self.history_manager, self.bookmark_manager, self)
+        
+        # Writes arrive in bursts; merge once they settle.
+        self.merge_timer = QtCore.QTimer(self)
+        self.merge_timer.setSingleShot(True)
+        self.merge_timer.setInterval(self.merge_delay)
+        self.merge_timer.timeout.connect(self.merge_changes)
+        
+        self.watcher = QtCore.QFileSystemWatcher(self)
+        self.watcher.fileChanged.connect(self.files_changed)
+        self.watcher.directoryChanged.connect(self.files_changed)
+        self.watch_files()
+    
+    def watch_files(self):
+        # Files replaced with os.replace drop out of the watcher; re-add them.
+        files = [self.bookmark_manager.journal_file, self.bookmark_manager.bookmarks_file]
+        files += self.history_manager.store.watched_files()
+        missing = [path for path in files if os.path.exists(path) and path not in self.watcher.files()]
+        if missing:
+            self.watcher.addPaths(missing)
+        # A file another process creates for the first time only shows up
+        # in its directory, which is watched until every file exists.
+        directories = {os.path.dirname(os.path.abspath(path)) for path in files if not os.path.exists(path)}
+        stale = [path for path in self.watcher.directories() if path not in directories]
+        if stale:
+            self.watcher.removePaths(stale)
+        missing = [path for path in directories if path not in self.watcher.directories()]
+        if missing:
+            self.watcher.addPaths(missing)
+    
+    def files_changed(self):
+        self.watch_files()
+        if self.bookmark_manager.changed() or self.history_manager.store.changed():
+            self.merge_timer.start()
+    
+    def merge_changes(self):
+        self.watch_files()
+        self.bookmark_manager.merge_changes()
+        self.history_manager.merge_changes()
+    
+    def flush(self):
+        self.history_manager.flush()
+        self.bookmark_manager.flush()
+
+class SessionManager(QtCore.QObject):
+    """Keeps the open windows and tabs on disk so they survive a restart.
+    
+    Every few seconds, only what changed since the last pass is appended to
+    session.journal: a "tab" record for each tab whose page changed and a
+    "window" record when a window's tab order, current tab or geometry
+    moved. The journal is folded into session.json once it grows, so a
+    crash loses at most one interval.
+    """
+    instance = None
+    save_interval = 10000
+    compact_threshold = 500
+    
+    @classmethod
+    def shared(cls):
+        if cls.instance is None:
+            cls.instance = cls()
+        return cls.instance
+    
+    def __init__(self, session_file="session.json", journal_file="session.journal", parent=None):
+        super().__init__(parent)
+        self.session_file = session_file
+        self.journal_file = journal_file
+        self.windows = []
+        self.load_session()
+        self.next_id = 1 + max([w["id"] for w in self.state.values()] +
+                               [t for w in self.state.values() for t in w["tabs"]], default=0)
+        
+        self.save_timer = QtCore.QTimer(self)
+        self.save_timer.setInterval(self.save_interval)
+        self.save_timer.timeout.connect(self.save_session)
+        self.save_timer.start()
+    
+    def load_session(self):
+        self.state = {}
+        self.journal_lines = 0
+        try:
+            if os.path.exists(self.session_file):
+                with open(self.session_file, 'r') as f:
+                    for window in json.load(f).get("windows", []):
+                        tabs = collections.OrderedDict((tab["tab"], tab) for tab in window.pop("tabs", []))
+                        self.state[window["id"]] = dict(window, tabs=tabs)
+        except Exception as e:
+            print(f"Error reading session: {e}")
+        
+        try:
+            if os.path.exists(self.journal_file):
+                with open(self.journal_file, 'r') as f:
+                    for line in f:
+                        try:
+                            self.apply(json.loads(line))
+                        except (ValueError, KeyError):
+                            continue
+                        self.journal_lines += 1
+        except Exception as e:
+            print(f"Error reading session journal: {e}")
+    
+    def apply(self, op):
+        action = op["op"]
+        if action == "close_window":
+            self.state.pop(op["window"], None)
+            return
+        window = self.state.setdefault(op["window"], {"id": op["window"], "tabs": collections.OrderedDict()})
+        if action == "tab":
+            window["tabs"][op["tab"]] = {k: op[k] for k in ("tab", "url", "title", "history")}
+        elif action == "window":
+            tabs = window["tabs"]
+            window["tabs"] = collections.OrderedDict((t, tabs[t]) for t in op["tabs"] if t in tabs)
+            window["current"] = op.get("current")
+            window["geometry"] = op.get("geometry")
+    
+    def new_id(self):
+        self.next_id += 1
+        return self.next_id - 1
+    
+    def saved_windows(self):
+        """Saved windows with their tabs in order, ready for MainWindow."""
+        return [dict(window, tabs=list(window["tabs"].values()))
+                for window in self.state.values() if window["tabs"]]
+    
+    def register(self, window):
+        self.windows.append(window)
+    
+    def unregister(self, window):
+        if window in self.windows:
+            self.windows.remove(window)
+    
+    def close_window(self, window):
+        """Forget a window the user closed while others stay open."""
+        self.unregister(window)
+        self.write([{"op": "close_window", "window": window.session_id}])
+    
+    def changes(self):
+        ops = []
+        for window in self.windows:
+            tab_ids = []
+            for i in range(window.tabs.count()):
+                tab = window.tabs.widget(i)
+                tab_ids.append(tab.tab_id)
+                if tab.dirty or tab.tab_id not in self.state.get(window.session_id, {}).get("tabs", {}):
+                    tab.dirty = False
+                    ops.append(dict(tab.session_record(), op="tab", window=window.session_id))
+            current = window.tabs.currentWidget()
+            record = {
+                "op": "window",
+                "window": window.session_id,
+                "tabs": tab_ids,
+                "current": current.tab_id if current else None,
+                "geometry": bytes(window.saveGeometry().toBase64()).decode(),
+            }
+            saved = self.state.get(window.session_id, {})
+            if (list(saved.get("tabs", ())), saved.get("current"), saved.get("geometry")) != \
+                    (tab_ids, record["current"], record["geometry"]):
+                ops.append(record)
+        return ops
+    
+    def save_session(self):
+        self.write(self.changes())
+    
+    def write(self, ops):
+        if not ops:
+            return
+        for op in ops:
+            self.apply(op)
+        try:
+            with open(self.journal_file, 'a') as f:
+                f.write("".join(json.dumps(op) + "\n" for op in ops))
+            self.journal_lines += len(ops)
+        except Exception as e:
+            print(f"Error saving session: {e}")
+        if self.journal_lines >= self.compact_threshold:
+            self.compact()
+    
+    def compact(self):
+        data = {"windows": [dict(window, tabs=list(window["tabs"].values())) for window in self.state.values()]}
+        try:
+            tmp_file = self.session_file + ".tmp"
+            with open(tmp_file, 'w') as f:
+                json.dump(data, f)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_file, self.session_file)
+            open(self.journal_file, 'w').close()
+            self.journal_lines = 0
+        except Exception as e:
+            print(f"Error saving session: {e}")
+    
+    def flush(self):
+        self.save_session()
+        self.compact()
+
+class BrowserImporter(QtCore.QObject):
+    """Streams history and bookmarks out of another browser's profile.
+    
+    Reads Firefox places.sqlite and Chromium History/Bookmarks files on a
+    worker thread in fixed-size batches. History batches are written through
+    the history writer before the next batch is read, so memory stays bounded
+    by the batch size; bookmark batches are handed to the GUI thread.
+    """
+    progress = QtCore.pyqtSignal(int, int)
+    bookmarks_found = QtCore.pyqtSignal(list)
+    finished = QtCore.pyqtSignal(int)
+    failed = QtCore.pyqtSignal(str)
+    
+    history_batch_size = 20000
+    bookmark_batch_size = 5000
+    url_schemes = ("http:", "https:", "file:", "ftp:")
+    # Chromium stores times as microseconds since 1601-01-01.
+    chromium_epoch_offset = 11644473600
+    firefox_roots = {
+        "menu________": "Bookmarks Menu",
+        "toolbar_____": "Bookmarks Toolbar",
+        "unfiled_____": "Other Bookmarks",
+        "mobile______": "Mobile Bookmarks",
+    }
+    
+    def __init__(self, path, history_manager, parent=None):
+        super().__init__(parent)
+        self.path = path
+        self.history_manager = history_manager
+        self.cancelled = False
+    
+    def start(self):
+        threading.Thread(target=self.run, name="BrowserImporter", daemon=True).start()
+    
+    def cancel(self):
+        self.cancelled = True
+    
+    def sources(self):
+        """Work out what to import from the chosen file and its profile directory."""
+        directory, name = os.path.split(self.path)
+        if name == "places.sqlite":
+            return [("firefox", self.path)]
+        sources = []
+        history = os.path.join(directory, "History")
+        bookmarks = os.path.join(directory, "Bookmarks")
+        if name in ("History", "Bookmarks"):
+            if os.path.exists(history):
+                sources.append(("chromium_history", history))
+            if os.path.exists(bookmarks):
+                sources.append(("chromium_bookmarks", bookmarks))
+        return sources
+    
+    def run(self):
+        imported = 0
+        try:
+            sources = self.sources()
+            if not sources:
+                raise ValueError(f"{os.path.basename(self.path)} is not a Firefox or Chromium profile file")
+            with tempfile.TemporaryDirectory() as tmp_dir:
+                for kind, path in sources:
+                    if kind == "chromium_bookmarks":
+                        self.import_chromium_bookmarks(path)
+                        continue
+                    conn = self.open_copy(path, tmp_dir)
+                    try:
+                        if kind == "firefox":
+                            imported += self.import_history(conn, """
+                                SELECT url, title, visit_count, last_visit_date / 1000000.0 FROM moz_places
+                                WHERE last_visit_date IS NOT NULL AND hidden = 0
+                                ORDER BY last_visit_date DESC
+                            """)
+                            self.import_firefox_bookmarks(conn)
+                        else:
+                            imported += self.import_history(conn, f"""
+                                SELECT url, title, visit_count, last_visit_time / 1000000.0 - {self.chromium_epoch_offset}
+                                FROM urls WHERE last_visit_time > 0 AND hidden = 0
+                                ORDER BY last_visit_time DESC
+                            """)
+                    finally:
+                        conn.close()
+        except Exception as e:
+            self.failed.emit(f"Error importing browser data: {e}")
+        self.finished.emit(imported)
+    
+    def open_copy(self, path, tmp_dir):
+        # The source browser may hold a lock on its database; read a copy,
+        # together with its write-ahead log so recent visits are included.
+        if sqlite3 is None:
+            raise RuntimeError("sqlite3 is not available")
+        copy = os.path.join(tmp_dir, os.path.basename(path))
+        for suffix in ("", "-wal"):
+            if os.path.exists(path + suffix):
+                shutil.copyfile(path + suffix, copy + suffix)
+        return sqlite3.connect(copy)
+    
+    def import_history(self, conn, sql):
+        total = conn.execute(f"SELECT count(*) FROM ({sql})").fetchone()[0]
+        cursor = conn.execute(sql)
+        done = imported = 0
+        while not self.cancelled:
+            rows = cursor.fetchmany(self.history_batch_size)
+            if not rows:
+                break
+            batch = [(HistoryEntry(title or "", url, timestamp), max(count or 1, 1))
+                     for url, title, count, timestamp in rows if url.startswith(self.url_schemes)]
+            imported += self.history_manager.import_history(batch)
+            done += len(rows)
+            self.progress.emit(done, total)
+        return imported
+    
+    def emit_bookmarks(self, bookmarks):
+        batch = []
+        for bookmark in bookmarks:
+            if self.cancelled:
+                return
+            if bookmark["url"].startswith(self.url_schemes):
+                batch.append(bookmark)
+            if len(batch) >= self.bookmark_batch_size:
+                self.bookmarks_found.emit(batch)
+                batch = []
+        if batch:
+            self.bookmarks_found.emit(batch)
+    
+    @staticmethod
+    def folder_name(title):
+        return (title or "Untitled").replace("/", "-")
+    
+    def import_firefox_bookmarks(self, conn):
+        folders = {}
+        for folder_id, parent, title, guid in conn.execute(
+                "SELECT id, parent, title, guid FROM moz_bookmarks WHERE type = 2"):
+            folders[folder_id] = (parent, self.firefox_roots.get(guid, title), guid)
+        
+        # Tags are folders under the tags root holding one bookmark per URL.
+        tags_root = next((i for i, (_, _, guid) in folders.items() if guid == "tags________"), None)
+        tag_names = {i: title for i, (parent, title, _) in folders.items() if parent == tags_root}
+        tags = collections.defaultdict(list)
+        if tag_names:
+            marks = ",".join("?" * len(tag_names))
+            for parent, url in conn.execute(f"""
+                    SELECT b.parent, p.url FROM moz_bookmarks b JOIN moz_places p ON p.id = b.fk
+                    WHERE b.type = 1 AND b.parent IN ({marks})""", list(tag_names)):
+                tags[url].append(tag_names[parent].lower())
+        
+        paths = {}
+        def folder_path(folder_id):
+            if folder_id not in paths:
+                parent, title, guid = folders.get(folder_id, (None, None, "root________"))
+                if guid == "root________" or parent is None:
+                    paths[folder_id] = "Imported from Firefox"
+                else:
+                    paths[folder_id] = f"{folder_path(parent)}/{self.folder_name(title)}"
+            return paths[folder_id]
+        
+        rows = conn.execute("""
+            SELECT b.parent, b.title, p.url FROM moz_bookmarks b JOIN moz_places p ON p.id = b.fk
+            WHERE b.type = 1 ORDER BY b.parent, b.position
+        """)
+        self.emit_bookmarks(
+            {"title": title or "", "url": url, "folder": folder_path(parent), "tags": tags.get(url, [])}
+            for parent, title, url in rows
+            if parent not in tag_names)
+    
+    def import_chromium_bookmarks(self, path):
+        with open(path, 'r', encoding='utf-8') as f:
+            roots = json.load(f).get("roots", {})
+        
+        def walk(node, folder):
+            for child in node.get("children", []):
+                if child.get("type") == "url":
+                    yield {"title": child.get("name", ""), "url": child.get("url", ""), "folder": folder}
+                elif child.get("type") == "folder":
+                    yield from walk(child, f"{folder}/{self.folder_name(child.get('name'))}")
+        
+        self.emit_bookmarks(
+            bookmark
+            for root in roots.values() if isinstance(root, dict)
+            for bookmark in walk(root, f"Imported from Chromium/{self.folder_name(root.get('name'))}"))
+
+PENDING_DOWNLOADS_FILE = "downloads.json"
+
+def read_pending_downloads():
+    try:
+        if os.path.exists(PENDING_DOWNLOADS_FILE):
+            with open(PENDING_DOWNLOADS_FILE, 'r') as f:
+                return json.load(f)
+    except Exception as e:
+        print(f"Error loading downloads: {e}")
+    return {}
+
+def save_pending_download(path, state):
+    """Record a download's progress under its path, or forget it if state is None."""
+    pending = read_pending_downloads()
+    if state is None:
+        if path not in pending:
+            return
+        del pending[path]
+    else:
+        pending[path] = state
+    try:
+        tmp_file = PENDING_DOWNLOADS_FILE + ".tmp"
+        with open(tmp_file, 'w') as f:
+            json.dump(pending, f)
+        os.replace(tmp_file, PENDING_DOWNLOADS_FILE)
+    except Exception as e:
+        print(f"Error saving downloads: {e}")
+
+class TokenBucket:
+    """Allows rate bytes a second on average, in bursts of up to burst
+    seconds' worth. A rate of 0 means no limit."""
+    burst = 0.25
+    
+    def __init__(self, rate=0):
+        self.rate = rate
+        self.tokens = 0.0
+        self.updated = time.monotonic()
+    
+    def set_rate(self, rate):
+        self.rate = rate
+        self.tokens = min(self.tokens, rate * self.burst)
+    
+    def available(self):
+        now = time.monotonic()
+        self.tokens = min(self.rate * self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        return int(self.tokens)
+    
+    def consume(self, size):
+        # May go negative; the debt is paid off before anything else is read.
+        self.tokens -= size
+
+class DownloadScheduler(QtCore.QObject):
+    """Runs at most max_active downloads at once.
+    
+    The rest wait in a queue, highest priority first and then in the order
+    they were added, and the next one starts as soon as a download finishes
+    or is paused. The engine starts its own downloads as soon as they are
+    accepted, so one of those that has to wait is paused until its turn.
+    Speed limits are token buckets, one shared by all downloads and one per
+    download; while any applies, a timer drains the limited
+    SegmentedDownloads' buffers as the buckets refill. The engine has no
+    way to throttle a download, so the limits leave its downloads alone.
+    """
+    changed = QtCore.pyqtSignal()
+    instance = None
+    tick_interval = 50
+    
+    @classmethod
+    def shared(cls):
+        if cls.instance is None:
+            cls.instance = cls()
+        return cls.instance
+    
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.max_active = 3
+        self.bucket = TokenBucket()
+        self.queue = []
+        self.active = []
+        self.order = itertools.count()
+        self.drain_timer = QtCore.QTimer(self)
+        self.drain_timer.setInterval(self.tick_interval)
+        self.drain_timer.timeout.connect(self.drain)
+    
+    def add(self, download, priority=0):
+        download.priority = priority
+        download.queued_order = next(self.order)
+        download.finished.connect(lambda: self.download_finished(download))
+        # A download restored paused waits for resume().
+        if download.isPaused():
+            self.changed.emit()
+            return
+        self.queue.append(download)
+        self.schedule()
+        if download in self.queue and not isinstance(download, SegmentedDownload):
+            download.pause()
+    
+    def waiting(self, download):
+        return download in self.queue
+    
+    def schedule(self):
+        self.queue.sort(key=lambda download: (-download.priority, download.queued_order))
+        while self.queue and len(self.active) < self.max_active:
+            download = self.queue.pop(0)
+            self.active.append(download)
+            if isinstance(download, SegmentedDownload):
+                download.set_buckets(self.buckets(download))
+                download.start()
+            else:
+                download.resume()
+        self.update_drain_timer()
+        self.changed.emit()
+    
+    def download_finished(self, download):
+        if download in self.active:
+            self.active.remove(download)
+        if download in self.queue:
+            self.queue.remove(download)
+        self.schedule()
+    
+    def pause(self, download):
+        if download in self.queue:
+            self.queue.remove(download)
+        if download in self.active:
+            self.active.remove(download)
+        download.pause()
+        self.schedule()
+    
+    def resume(self, download):
+        if not download.isPaused() or download in self.queue or download in self.active:
+            return
+        if isinstance(download, SegmentedDownload):
+            download.queue()
+        self.queue.append(download)
+        self.schedule()
+    
+    def download_next(self, download):
+        download.priority = max(other.priority for other in self.queue + self.active + [download]) + 1
+        self.schedule()
+    
+    def buckets(self, download):
+        return [bucket for bucket in (download.bucket, self.bucket) if bucket.rate]
+    
+    def set_limits(self, max_active, rate):
+        self.max_active = max(1, max_active)
+        self.bucket.set_rate(rate)
+        for download in self.active:
+            if isinstance(download, SegmentedDownload):
+                download.set_buckets(self.buckets(download))
+        self.schedule()
+    
+    def set_download_limit(self, download, rate):
+        download.bucket.set_rate(rate)
+        if download in self.active:
+            download.set_buckets(self.buckets(download))
+        self.update_drain_timer()
+    
+    def update_drain_timer(self):
+        if any(isinstance(download, SegmentedDownload) and download.buckets for download in self.active):
+            if not self.drain_timer.isActive():
+                self.drain_timer.start()
+        else:
+            self.drain_timer.stop()
+    
+    def drain(self):
+        for download in self.active:
+            if isinstance(download, SegmentedDownload) and download.buckets:
+                download.drain()
+
+class SegmentedDownload(QtCore.QObject):
+    """Downloads a URL to a file over several HTTP Range requests at once.
+    
+    A HEAD request finds the size and whether the server takes ranges.
+    Large files are split into up to max_connections segments, each written
+    in place into path + ".part", which is preallocated to the full size;
+    anything else comes down as one stream. The segments' progress is saved
+    in PENDING_DOWNLOADS_FILE, so an interrupted download carries on where
+    it stopped, after a restart too. Resumed requests send If-Range, and a
+    file that changed on the server is fetched again from the start.
+    
+    Offers the parts of QWebEngineDownloadItem the download list uses. It
+    stays in DownloadRequested until DownloadScheduler starts it.
+    """
+    downloadProgress = QtCore.pyqtSignal('qint64', 'qint64')
+    finished = QtCore.pyqtSignal()
+    stateChanged = QtCore.pyqtSignal(int)
+    isPausedChanged = QtCore.pyqtSignal(bool)
+    max_connections = 4
+    min_segment_size = 1024 * 1024
+    max_retries = 3
+    save_interval = 1000
+    # Replies buffer at most this much while a speed limit applies, so the
+    # connection slows down instead of filling memory.
+    throttled_buffer_size = 64 * 1024
+    
+    def __init__(self, network_manager, url, path, state=None, parent=None):
+        super().__init__(parent)
+        self.network_manager = network_manager
+        self.download_url = QtCore.QUrl(url)
+        self.download_path = path
+        self.part_path = path + ".part"
+        state = state or {}
+        self.total = state.get("total", -1)
+        self.ranged = state.get("ranged", False)
+        self.validator = state.get("validator")
+        # Sent with every request, e.g. the page's Referer and User-Agent.
+        self.headers = state.get("headers", {})
+        # [start, end, bytes done]; an end of -1 runs to the end of the stream.
+        self.segments = [list(segment) for segment in state.get("segments", [])]
+        self.replies = {}
+        self.probe_reply = None
+        self.retries = 0
+        self.file = None
+        self.download_state = QtWebEngineWidgets.QWebEngineDownloadItem.DownloadRequested
+        self.paused = state.get("paused", False)
+        self.priority = 0
+        # This download's own speed limit; DownloadScheduler hands it the
+        # buckets that apply, the global one included.
+        self.bucket = TokenBucket()
+        self.buckets = []
+        self.save_timer = QtCore.QTimer(self)
+        self.save_timer.setInterval(self.save_interval)
+        self.save_timer.timeout.connect(self.save_state)
+    
+    def url(self):
+        return self.download_url
+    
+    def path(self):
+        return self.download_path
+    
+    def state(self):
+        return self.download_state
+    
+    def isPaused(self):
+        return self.paused
+    
+    def received(self):
+        return sum(segment[2] for segment in self.segments)
+    
+    def start(self):
+        self.download_state = QtWebEngineWidgets.QWebEngineDownloadItem.DownloadInProgress
+        self.stateChanged.emit(self.download_state)
+        if self.segments and os.path.exists(self.part_path):
+            self.open_file()
+            self.start_segments()
+        else:
+            self.probe()
+    
+    def request(self, start=None, end=-1):
+        request = QtNetwork.QNetworkRequest(self.download_url)
+        request.setAttribute(QtNetwork.QNetworkRequest.FollowRedirectsAttribute, True)
+        for name, value in self.headers.items():
+            request.setRawHeader(name.encode('latin-1'), value.encode('latin-1'))
+        if start is not None:
+            request.setRawHeader(b"Range", f"bytes={start}-{end if end >= 0 else ''}".encode())
+            if self.validator:
+                request.setRawHeader(b"If-Range", self.validator.encode('latin-1'))
+        return request
+    
+    def probe(self):
+        self.segments = []
+        # Held until it finishes, or the garbage collector can take the
+        # reply along with the lambda connected to it.
+        self.probe_reply = self.network_manager.head(self.request())
+        reply = self.probe_reply
+        reply.finished.connect(lambda: self.probed(reply))
+    
+    def probed(self, reply):
+        self.probe_reply = None
+        reply.deleteLater()
+        if self.paused or self.download_state != QtWebEngineWidgets.QWebEngineDownloadItem.DownloadInProgress:
+            return
+        total = -1
+        ranged = False
+        self.validator = None
+        status = reply.attribute(QtNetwork.QNetworkRequest.HttpStatusCodeAttribute)
+        # Servers that refuse HEAD still get a plain download.
+        if reply.error() == QtNetwork.QNetworkReply.NoError and status and status < 400:
+            self.download_url = reply.url()
+            length = reply.header(QtNetwork.QNetworkRequest.ContentLengthHeader)
+            total = int(length) if length is not None else -1
+            ranged = total > 0 and bytes(reply.rawHeader(b"Accept-Ranges")).strip().lower() == b"bytes"
+            validator = bytes(reply.rawHeader(b"ETag")) or bytes(reply.rawHeader(b"Last-Modified"))
+            self.validator = validator.decode('latin-1') or None
+        self.plan(total, ranged)
+        self.open_file()
+        self.start_segments()
+    
+    def plan(self, total, ranged):
+        self.total = total
+        self.ranged = ranged
+        count = max(1, min(self.max_connections, total // self.min_segment_size)) if ranged else 1
+        if total > 0:
+            size = total // count
+            self.segments = [[i * size, (i + 1) * size - 1 if i < count - 1 else total - 1, 0] for i in range(count)]
+        else:
+            self.segments = [[0, -1, 0]]
+    
+    def open_file(self):
+        try:
+            self.file = open(self.part_path, 'r+b' if os.path.exists(self.part_path) else 'w+b')
+            if self.total > 0:
+                self.file.truncate(self.total)
+                if hasattr(os, "posix_fallocate"):
+                    os.posix_fallocate(self.file.fileno(), 0, self.total)
+        except Exception as e:
+            print(f"Error preparing download file: {e}")
+    
+    def start_segments(self):
+        for segment in self.segments:
+            if not self.segment_done(segment):
+                self.start_segment(segment)
+        self.save_timer.start()
+        self.downloadProgress.emit(self.received(), self.total)
+        if not self.replies:
+            self.finish_download()
+    
+    def segment_done(self, segment):
+        start, end, done = segment
+        return end >= 0 and start + done > end
+    
+    def start_segment(self, segment):
+        if self.ranged:
+            request = self.request(segment[0] + segment[2], segment[1])
+        else:
+            # A plain stream can only start over.
+            segment[2] = 0
+            request = self.request()
+        reply = self.network_manager.get(request)
+        if self.buckets:
+            reply.setReadBufferSize(self.throttled_buffer_size)
+        self.replies[reply] = segment
+        reply.readyRead.connect(lambda: self.read_segment(reply))
+        reply.finished.connect(lambda: self.segment_finished(reply))
+    
+    def read_segment(self, reply, throttle=True):
+        segment = self.replies.get(reply)
+        if segment is None:
+            return
+        status = reply.attribute(QtNetwork.QNetworkRequest.HttpStatusCodeAttribute)
+        if self.ranged and status == 200:
+            # The whole file instead of a range: the server ignored the
+            # range or, through If-Range, said the file has changed.
+            self.restart()
+            return
+        if status and status >= 400:
+            # An error page; segment_finished retries.
+            return
+        size = reply.bytesAvailable()
+        if throttle:
+            for bucket in self.buckets:
+                size = min(size, bucket.available())
+            if size <= 0:
+                # drain() reads the rest once the buckets refill.
+                return
+        data = bytes(reply.read(size))
+        for bucket in self.buckets:
+            bucket.consume(len(data))
+        start, end, done = segment
+        if end >= 0:
+            data = data[:end - start - done + 1]
+        if not data or self.file is None:
+            return
+        self.file.seek(start + done)
+        self.file.write(data)
+        segment[2] += len(data)
+        self.downloadProgress.emit(self.received(), self.total)
+    
+    def drain(self):
+        for reply in list(self.replies):
+            if reply.bytesAvailable():
+                self.read_segment(reply)
+    
+    def set_buckets(self, buckets):
+        self.buckets = buckets
+        for reply in self.replies:
+            reply.setReadBufferSize(self.throttled_buffer_size if buckets else 0)
+        if not buckets:
+            self.drain()
+    
+    def segment_finished(self, reply):
+        if reply in self.replies and reply.bytesAvailable():
+            # What is left in the buffer is read at once; the buckets go
+            # into debt for it.
+            self.read_segment(reply, throttle=False)
+        segment = self.replies.pop(reply, None)
+        reply.deleteLater()
+        if segment is None:
+            return
+        if reply.error() == QtNetwork.QNetworkReply.NoError and segment[1] < 0:
+            # A stream of unknown length is done when it ends.
+            segment[1] = segment[0] + segment[2] - 1
+            self.total = self.received()
+        if not self.segment_done(segment):
+            self.retries += 1
+            if self.retries > self.max_retries:
+                print(f"Error downloading {self.download_url.toString()}: {reply.errorString()}")
+                self.stop(QtWebEngineWidgets.QWebEngineDownloadItem.DownloadInterrupted)
+            else:
+                self.start_segment(segment)
+            return
+        if not self.replies:
+            self.finish_download()
+    
+    def abort_replies(self):
+        replies = list(self.replies)
+        self.replies.clear()
+        for reply in replies:
+            reply.abort()
+    
+    def close_file(self):
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+    
+    def restart(self):
+        self.abort_replies()
+        self.close_file()
+        self.retries += 1
+        if self.retries > self.max_retries:
+            self.stop(QtWebEngineWidgets.QWebEngineDownloadItem.DownloadInterrupted)
+        else:
+            self.probe()
+    
+    def stop(self, state, keep_part=False):
+        self.download_state = state
+        self.paused = False
+        self.save_timer.stop()
+        self.abort_replies()
+        self.close_file()
+        # Cancelled and failed downloads are both forgotten; otherwise a
+        # failed one would be retried on every launch.
+        try:
+            if not keep_part and os.path.exists(self.part_path):
+                os.remove(self.part_path)
+        except OSError as e:
+            print(f"Error removing partial download: {e}")
+        save_pending_download(self.download_path, None)
+        self.stateChanged.emit(state)
+        self.finished.emit()
+    
+    def cancel(self):
+        if self.download_state in (QtWebEngineWidgets.QWebEngineDownloadItem.DownloadRequested,
+                                   QtWebEngineWidgets.QWebEngineDownloadItem.DownloadInProgress):
+            self.stop(QtWebEngineWidgets.QWebEngineDownloadItem.DownloadCancelled)
+    
+    def pause(self):
+        if self.paused or self.download_state not in (QtWebEngineWidgets.QWebEngineDownloadItem.DownloadRequested,
+                                                      QtWebEngineWidgets.QWebEngineDownloadItem.DownloadInProgress):
+            return
+        self.paused = True
+        self.save_timer.stop()
+        self.abort_replies()
+        self.close_file()
+        if self.segments:
+            self.save_state()
+        self.isPausedChanged.emit(True)
+    
+    def resume(self):
+        if self.paused:
+            self.paused = False
+            self.isPausedChanged.emit(False)
+            self.start()
+    
+    def queue(self):
+        """Wait for DownloadScheduler again, after a pause."""
+        self.paused = False
+        if self.segments:
+            self.save_state()
+        self.download_state = QtWebEngineWidgets.QWebEngineDownloadItem.DownloadRequested
+        self.isPausedChanged.emit(False)
+        self.stateChanged.emit(self.download_state)
+    
+    def finish_download(self):
+        self.save_timer.stop()
+        self.close_file()
+        try:
+            os.replace(self.part_path, self.download_path)
+        except OSError as e:
+            # The data is all there; leave it where the user can find it.
+            print(f"Error saving download, it is kept as {self.part_path}: {e}")
+            self.stop(QtWebEngineWidgets.QWebEngineDownloadItem.DownloadInterrupted, keep_part=True)
+            return
+        save_pending_download(self.download_path, None)
+        self.download_state = QtWebEngineWidgets.QWebEngineDownloadItem.DownloadCompleted
+        self.downloadProgress.emit(self.received(), self.total)
+        self.stateChanged.emit(self.download_state)
+        self.finished.emit()
+    
+    def save_state(self):
+        save_pending_download(self.download_path, {
+            "url": self.download_url.toString(),
+            "total": self.total,
+            "ranged": self.ranged,
+            "validator": self.validator,
+            "headers": self.headers,
+            "segments": self.segments,
+            "paused": self.paused,
+        })
+
+def format_size(size):
+    for unit in ("B", "KB", "MB", "GB"):
+        if size < 1024 or unit == "GB":
+            return f"{size:.0f} {unit}" if unit == "B" else f"{size:.1f} {unit}"
+        size /= 1024
+
+def format_eta(seconds):
+    if seconds < 60:
+        return f"{seconds:.0f} s left"
+    if seconds < 3600:
+        return f"{seconds / 60:.0f} min left"
+    return f"{seconds / 3600:.1f} h left"
+
+class DownloadEntry:
+    def __init__(self, item):
+        self.item = item
+        self.filename = os.path.basename(item.path())
+        self.url = item.url().toString()
+        self.received = 0
+        self.total = 0
+        self.state = self.item_state()
+        # Bytes per second, smoothed over the samples taken so far.
+        self.speed = 0.0
+        self.sampled_received = 0
+        self.sampled_at = time.monotonic()
+    
+    def sample(self, now):
+        elapsed = now - self.sampled_at
+        if elapsed <= 0:
+            return
+        rate = (self.received - self.sampled_received) / elapsed
+        self.speed = rate if not self.speed else 0.7 * self.speed + 0.3 * rate
+        self.sampled_received = self.received
+        self.sampled_at = now
+    
+    def item_state(self):
+        state = self.item.state()
+        if state == QtWebEngineWidgets.QWebEngineDownloadItem.DownloadCompleted:
+            return "completed"
+        if state == QtWebEngineWidgets.QWebEngineDownloadItem.DownloadCancelled:
+            return "cancelled"
+        if state == QtWebEngineWidgets.QWebEngineDownloadItem.DownloadInterrupted:
+            return "interrupted"
+        if self.item.isPaused():
+            # Engine downloads wait for their turn paused.
+            return "queued" if DownloadScheduler.shared().waiting(self.item) else "paused"
+        if state == QtWebEngineWidgets.QWebEngineDownloadItem.DownloadRequested:
+            return "queued"
+        return "downloading"
+    
+    def finished(self):
+        return self.state in ("completed", "cancelled", "interrupted")
+    
+    def progress(self):
+        if self.state == "completed":
+            return 100
+        if self.finished():
+            return 0
+        return int(self.received * 100 / self.total) if self.total > 0 else 0
+    
+    def status_text(self):
+        if self.state == "completed":
+            return f"Completed - {format_size(self.received)}"
+        if self.state == "cancelled":
+            return "Cancelled"
+        if self.state == "interrupted":
+            return "Failed"
+        if self.state == "queued" and not self.received:
+            return "Queued"
+        text = format_size(self.received)
+        if self.total > 0:
+            text += f" of {format_size(self.total)}"
+        if self.state != "downloading":
+            return f"{self.state.capitalize()} - {text}"
+        if self.speed > 0:
+            text += f" - {format_size(self.speed)}/s"
+            if self.total > self.received:
+                text += f", {format_eta((self.total - self.received) / self.speed)}"
+        return text
+
+class DownloadListModel(QtCore.QAbstractListModel):
+    """The downloads shown in the downloads dialog.
+    
+    Progress signals only record the byte counts. Views hear about changes
+    from sample(), which runs every sample_interval ms while anything is
+    unfinished, works out speeds and ETAs and emits a single dataChanged
+    for all the rows that moved.
+    """
+    EntryRole = QtCore.Qt.UserRole
+    sample_interval = 500
+    
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.entries = []
+        self.active = 0
+        # Changed state since the last sample.
+        self.changed = set()
+        self.sample_timer = QtCore.QTimer(self)
+        self.sample_timer.setInterval(self.sample_interval)
+        self.sample_timer.timeout.connect(self.sample)
+    
+    def rowCount(self, parent=QtCore.QModelIndex()):
+        return 0 if parent.isValid() else len(self.entries)
+    
+    def data(self, index, role=QtCore.Qt.DisplayRole):
+        if not index.isValid():
+            return None
+        entry = self.entries[index.row()]
+        if role == QtCore.Qt.DisplayRole:
+            return entry.filename
+        if role == QtCore.Qt.ToolTipRole:
+            return entry.url
+        if role == self.EntryRole:
+            return entry
+        return None
+    
+    def entry(self, row):
+        return self.entries[row]
+    
+    def add(self, item):
+        entry = DownloadEntry(item)
+        row = len(self.entries)
+        self.beginInsertRows(QtCore.QModelIndex(), row, row)
+        self.entries.append(entry)
+        self.endInsertRows()
+        if not entry.finished():
+            self.active += 1
+        item.downloadProgress.connect(lambda received, total: self.record_progress(entry, received, total))
+        item.stateChanged.connect(lambda state: self.update_state(entry))
+        item.isPausedChanged.connect(lambda paused: self.update_state(entry))
+        item.finished.connect(lambda: self.update_state(entry))
+        if not self.sample_timer.isActive():
+            self.sample_timer.start()
+        return entry
+    
+    def record_progress(self, entry, received, total):
+        entry.received = received
+        entry.total = total
+    
+    def update_state(self, entry):
+        was_finished = entry.finished()
+        state = entry.item_state()
+        if state == entry.state:
+            return
+        entry.state = state
+        if state != "downloading":
+            entry.speed = 0.0
+        if entry.finished() and not was_finished:
+            self.active -= 1
+        self.changed.add(entry)
+        if not self.sample_timer.isActive():
+            self.sample_timer.start()
+    
+    def cancel(self, row):
+        entry = self.entries[row]
+        if not entry.finished():
+            entry.item.cancel()
+    
+    def sample(self):
+        now = time.monotonic()
+        first = last = None
+        for row, entry in enumerate(self.entries):
+            if entry.state == "downloading":
+                if entry.received == entry.sampled_received and not entry.speed:
+                    entry.sampled_at = now
+                    continue
+                entry.sample(now)
+            elif entry not in self.changed:
+                continue
+            if first is None:
+                first = row
+            last = row
+        self.changed.clear()
+        if first is not None:
+            self.dataChanged.emit(self.index(first), self.index(last))
+        if not self.active:
+            self.sample_timer.stop()
+    
+    def clear_finished(self):
+        self.beginResetModel()
+        for entry in self.entries:
+            if entry.finished() and entry.item.parent() is self:
+                entry.item.deleteLater()
+        self.entries = [entry for entry in self.entries if not entry.finished()]
+        self.changed.clear()
+        self.endResetModel()
+
+class DownloadDelegate(QtWidgets.QStyledItemDelegate):
+    """Paints a download's name, progress bar, status line and buttons, so
+    rows cost no widgets however many there are."""
+    button_clicked = QtCore.pyqtSignal(QtCore.QModelIndex, str)
+    row_height = 72
+    button_width = 70
+    button_height = 28
+    status_color = QtGui.QColor("#868e96")
+    
+    def sizeHint(self, option, index):
+        return QtCore.QSize(option.rect.width(), self.row_height)
+    
+    def button_rect(self, rect, position):
+        # Numbered from the right.
+        return QtCore.QRect(rect.right() - (self.button_width + 8) * (position + 1),
+                            rect.center().y() - self.button_height // 2, self.button_width, self.button_height)
+    
+    def buttons(self, entry):
+        if entry.state in ("downloading", "queued"):
+            return ["Pause", "Cancel"]
+        if entry.state == "paused":
+            return ["Resume", "Cancel"]
+        if entry.state == "completed":
+            return ["Open"]
+        return []
+    
+    def button_at(self, entry, rect, pos):
+        buttons = self.buttons(entry)
+        for position, text in enumerate(reversed(buttons)):
+            if self.button_rect(rect, position).contains(pos):
+                return text
+        return None
+    
+    def paint(self, painter, option, index):
+        entry = index.data(DownloadListModel.EntryRole)
+        widget = option.widget
+        style = widget.style() if widget else QtWidgets.QApplication.style()
+        painter.save()
+        style.drawPrimitive(QtWidgets.QStyle.PE_PanelItemViewItem, option, painter, widget)
         
-        button_layout = QtWidgets.QHBoxLayout()
-        self.cancel_btn = QtWidgets.QPushButton("Cancel")
-        self.cancel_btn.clicked.connect(self.cancel_download)
-        button_layout.addWidget(self.cancel_btn)
+        rect = option.rect.adjusted(8, 6, -(self.button_width + 8) * 2 - 16, -6)
+        name_font = QtGui.QFont(option.font)
+        name_font.setBold(True)
+        painter.setFont(name_font)
+        painter.setPen(option.palette.color(QtGui.QPalette.Text))
+        name = QtGui.QFontMetrics(name_font).elidedText(entry.filename, QtCore.Qt.ElideMiddle, rect.width())
+        painter.drawText(QtCore.QRect(rect.left(), rect.top(), rect.width(), 20),
+                         QtCore.Qt.AlignLeft | QtCore.Qt.AlignVCenter, name)
         
-        self.open_btn = QtWidgets.QPushButton("Open")
-        self.open_btn.setEnabled(False)
-        self.open_btn.clicked.connect(self.open_file)
-        button_layout.addWidget(self.open_btn)
+        bar = QtWidgets.QStyleOptionProgressBar()
+        bar.rect = QtCore.QRect(rect.left(), rect.top() + 24, rect.width(), 10)
+        bar.minimum = 0
+        bar.maximum = 100
+        bar.progress = entry.progress()
+        bar.textVisible = False
+        bar.state = QtWidgets.QStyle.State_Enabled
+        style.drawControl(QtWidgets.QStyle.CE_ProgressBar, bar, painter, widget)
         
-        layout.addLayout(button_layout)
-        self.setLayout(layout)
+        painter.setFont(option.font)
+        painter.setPen(self.status_color)
+        painter.drawText(QtCore.QRect(rect.left(), rect.top() + 38, rect.width(), 20),
+                         QtCore.Qt.AlignLeft | QtCore.Qt.AlignVCenter, entry.status_text())
         
-        self.download_item.downloadProgress.connect(self.update_progress)
-        self.download_item.finished.connect(self.download_finished)
+        for position, text in enumerate(reversed(self.buttons(entry))):
+            button = QtWidgets.QStyleOptionButton()
+            button.rect = self.button_rect(option.rect, position)
+            button.text = text
+            button.state = QtWidgets.QStyle.State_Enabled | QtWidgets.QStyle.State_Raised
+            style.drawControl(QtWidgets.QStyle.CE_PushButton, button, painter, widget)
+        painter.restore()
     
-    def update_progress(self, bytes_received, bytes_total):
-        if bytes_total > 0:
-            progress = int((bytes_received / bytes_total) * 100)
-            self.progress_bar.setValue(progress)
-            self.label.setText(f"{self.filename} - {progress}%")
-    
-    def download_finished(self):
-        self.progress_bar.setValue(100)
-        self.label.setText(f"{self.filename} - Completed")
-        self.cancel_btn.setEnabled(False)
-        self.open_btn.setEnabled(True)
-    
-    def cancel_download(self):
-        self.download_item.cancel()
-        self.label.setText(f"{self.filename} - Cancelled")
-        self.progress_bar.setValue(0)
-        self.cancel_btn.setEnabled(False)
-        self.open_btn.setEnabled(False)
-    
-    def open_file(self):
-        import os
-        path = QtCore.QDir.toNativeSeparators(self.download_item.path())
-        os.startfile(path) if sys.platform == 'win32' else os.system(f"open {path}")
+    def editorEvent(self, event, model, option, index):
+        if event.type() == QtCore.QEvent.MouseButtonRelease:
+            text = self.button_at(index.data(DownloadListModel.EntryRole), option.rect, event.pos())
+            if text:
+                self.button_clicked.emit(index, text)
+                return True
+        return False
 
 class DownloadManager(QtWidgets.QDialog):
     kitchensink = True
@@ -133,30 +2797,6 @@ class DownloadManager(QtWidgets.QDialog):
         super().__init__(parent)
         self.setWindowTitle("Download Manager")
         self.setGeometry(200, 200, 600, 400)
-        self.setStyleSheet("""
-            QDialog {
-                background-color: #f5f7fa;
-                border-radius: 8px;
-            }
-            QPushButton {
-                padding: 8px 16px;
-                border-radius: 4px;
-                background-color: #007bff;
-                color: white;
-            }
-            QPushButton:hover {
-                background-color: #0056b3;
-            }
-            QProgressBar {
-                border: 1px solid #dee2e6;
-                border-radius: 4px;
-                text-align: center;
-            }
-            QProgressBar::chunk {
-                background-color: #007bff;
-                border-radius: 3px;
-            }
-        """)
         
         layout = QtWidgets.QVBoxLayout()
         layout.setSpacing(10)
@@ -166,8 +2806,21 @@ class DownloadManager(QtWidgets.QDialog):
         title.setFont(QtGui.QFont("Arial", 14, QtGui.QFont.Bold))
         layout.addWidget(title)
         
-        self.download_list = QtWidgets.QListWidget()
-        self.download_list.setSpacing(5)
+        self.summary_label = QtWidgets.QLabel()
+        layout.addWidget(self.summary_label)
+        self.scheduler = DownloadScheduler.shared()
+        
+        self.model = DownloadListModel(self)
+        self.scheduler.changed.connect(self.update_summary)
+        self.delegate = DownloadDelegate(self)
+        self.delegate.button_clicked.connect(self.row_button_clicked)
+        self.download_list = QtWidgets.QListView()
+        self.download_list.setModel(self.model)
+        self.download_list.setItemDelegate(self.delegate)
+        self.download_list.setUniformItemSizes(True)
+        self.download_list.doubleClicked.connect(self.open_file)
+        self.download_list.setContextMenuPolicy(QtCore.Qt.CustomContextMenu)
+        self.download_list.customContextMenuRequested.connect(self.show_download_menu)
         layout.addWidget(self.download_list)
         
         button_layout = QtWidgets.QHBoxLayout()
@@ -181,50 +2834,363 @@ class DownloadManager(QtWidgets.QDialog):
         
         layout.addLayout(button_layout)
         self.setLayout(layout)
-        self.downloads = []
+        self.update_summary()
     
     def add_download(self, download_item):
-        item_widget = DownloadItemWidget(download_item, self)
-        list_item = QtWidgets.QListWidgetItem(self.download_list)
-        list_item.setSizeHint(item_widget.sizeHint())
-        self.download_list.setItemWidget(list_item, item_widget)
-        self.downloads.append({"item": list_item, "widget": item_widget})
+        self.model.add(download_item)
     
     def clear_completed(self):
-        i = 0
-        while i < len(self.downloads):
-            widget = self.downloads[i]["widget"]
-            if widget.progress_bar.value() == 100 or not widget.cancel_btn.isEnabled():
-                self.download_list.takeItem(self.download_list.row(self.downloads[i]["item"]))
-                self.downloads.pop(i)
-            else:
-                i += 1
+        self.model.clear_finished()
+    
+    def update_summary(self):
+        # Queueing or resuming a paused engine download changes its row
+        # without the item saying so.
+        for entry in self.model.entries:
+            if not entry.finished():
+                self.model.update_state(entry)
+        self.summary_label.setText(f"{len(self.scheduler.active)} active, {len(self.scheduler.queue)} queued")
+    
+    def row_button_clicked(self, index, text):
+        entry = self.model.entry(index.row())
+        if text == "Cancel":
+            self.model.cancel(index.row())
+        elif text == "Pause":
+            self.scheduler.pause(entry.item)
+        elif text == "Resume":
+            self.scheduler.resume(entry.item)
+        elif text == "Open":
+            self.open_file(index)
+    
+    def show_download_menu(self, pos):
+        index = self.download_list.indexAt(pos)
+        if not index.isValid():
+            return
+        entry = self.model.entry(index.row())
+        if entry.finished():
+            return
+        menu = QtWidgets.QMenu(self)
+        next_action = menu.addAction("Download Next")
+        # Only SegmentedDownload can be throttled.
+        limit_action = menu.addAction("Limit Speed...") if isinstance(entry.item, SegmentedDownload) else None
+        action = menu.exec_(self.download_list.viewport().mapToGlobal(pos))
+        if action == next_action:
+            self.scheduler.download_next(entry.item)
+        elif limit_action is not None and action == limit_action:
+            limit, ok = QtWidgets.QInputDialog.getInt(
+                self, "Limit Speed", "KB/s (0 for no limit):", entry.item.bucket.rate // 1024, 0, 1000000)
+            if ok:
+                self.scheduler.set_download_limit(entry.item, limit * 1024)
+    
+    def open_file(self, index):
+        entry = self.model.entry(index.row())
+        if entry.state == "completed":
+            QtGui.QDesktopServices.openUrl(QtCore.QUrl.fromLocalFile(entry.item.path()))
+
+ARCHIVE_DIR = "archive"
+
+class PageArchive(QtCore.QObject):
+    """Content-addressed store for pages archived from open tabs.
+    
+    QtWebEngine saves each page as MHTML to a file in ARCHIVE_DIR/incoming,
+    all tabs at once. A single worker thread then splits every file into its
+    MIME parts and stores each body under ARCHIVE_DIR/objects by its
+    SHA-256, so a script, stylesheet or image shared by many pages is kept
+    once. A page itself is a JSON manifest in ARCHIVE_DIR/pages with its
+    headers and the hash of each part; export() rebuilds the MHTML.
+    """
+    page_archived = QtCore.pyqtSignal(int, int)
+    finished = QtCore.pyqtSignal(int, int, int)
+    # A page whose save hasn't started after this long is skipped.
+    save_timeout = 30000
+    instance = None
+    
+    @classmethod
+    def shared(cls):
+        if cls.instance is None:
+            cls.instance = cls()
+        return cls.instance
+    
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.incoming_dir = os.path.join(ARCHIVE_DIR, "incoming")
+        self.objects_dir = os.path.join(ARCHIVE_DIR, "objects")
+        self.pages_dir = os.path.join(ARCHIVE_DIR, "pages")
+        # Save path -> (url, title) for pages QtWebEngine hasn't started
+        # saving, and for those it is saving.
+        self.pending = {}
+        self.saving = {}
+        # Saves that timed out, to cancel if they start after all.
+        self.expired = set()
+        self.order = itertools.count()
+        self.queue = queue.Queue()
+        self.worker = None
+        # Pages left in the current batch, and what the batch has written.
+        self.remaining = 0
+        self.archived = 0
+        self.page_bytes = 0
+        self.written_bytes = 0
+        self.page_archived.connect(self.record_page)
+    
+    def archive(self, views):
+        try:
+            os.makedirs(self.incoming_dir, exist_ok=True)
+        except OSError as e:
+            print(f"Error creating archive folder: {e}")
+            return 0
+        if not self.remaining:
+            self.archived = self.page_bytes = self.written_bytes = 0
+        for view in views:
+            path = os.path.abspath(os.path.join(self.incoming_dir, f"{next(self.order)}.mhtml"))
+            self.pending[path] = (view.url().toString(), view.title())
+            self.remaining += 1
+            view.page().save(path, QtWebEngineWidgets.QWebEngineDownloadItem.MimeHtmlSaveFormat)
+            QtCore.QTimer.singleShot(self.save_timeout, lambda path=path: self.save_timed_out(path))
+        return len(views)
+    
+    def claim(self, download_item):
+        """Take over a download started by archive(); False if it is not one."""
+        path = os.path.abspath(download_item.path())
+        if path in self.expired:
+            self.expired.discard(path)
+            download_item.cancel()
+            return True
+        if path not in self.pending:
+            return False
+        self.saving[path] = self.pending.pop(path)
+        download_item.finished.connect(lambda: self.page_saved(download_item, path))
+        download_item.accept()
+        return True
+    
+    def save_timed_out(self, path):
+        # The page never asked to save, e.g. it was closed or is not
+        # something QtWebEngine can save as MHTML.
+        if path not in self.pending:
+            return
+        url, title = self.pending.pop(path)
+        self.expired.add(path)
+        print(f"Error archiving {url}: the page did not start saving")
+        self.record_page(0, 0)
+    
+    def page_saved(self, download_item, path):
+        url, title = self.saving.pop(path)
+        if download_item.state() != QtWebEngineWidgets.QWebEngineDownloadItem.DownloadCompleted:
+            print(f"Error archiving {url}: {download_item.interruptReasonString()}")
+            self.record_page(0, 0)
+            return
+        self.queue.put((path, url, title))
+        if self.worker is None:
+            self.worker = threading.Thread(target=self.run, name="PageArchive", daemon=True)
+            self.worker.start()
+    
+    def record_page(self, page_bytes, written_bytes):
+        self.remaining -= 1
+        if page_bytes:
+            self.archived += 1
+            self.page_bytes += page_bytes
+            self.written_bytes += written_bytes
+        if not self.remaining:
+            self.finished.emit(self.archived, self.page_bytes, self.written_bytes)
+    
+    def run(self):
+        while True:
+            path, url, title = self.queue.get()
+            try:
+                page_bytes, written_bytes = self.store(path, url, title)
+            except Exception as e:
+                print(f"Error archiving {url}: {e}")
+                page_bytes = written_bytes = 0
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+            # Emitted from this thread, so record_page runs on the GUI thread.
+            self.page_archived.emit(page_bytes, written_bytes)
+    
+    def store(self, path, url, title):
+        with open(path, 'rb') as f:
+            message = email.message_from_binary_file(f)
+        parts = message.get_payload() if message.is_multipart() else [message]
+        page_bytes = written_bytes = 0
+        manifest_parts = []
+        for part in parts:
+            body = part.get_payload(decode=True) or b""
+            digest = hashlib.sha256(body).hexdigest()
+            page_bytes += len(body)
+            written_bytes += self.write_object(digest, body)
+            manifest_parts.append({
+                "headers": [[key, value] for key, value in part.items()
+                            if key.lower() != "content-transfer-encoding"],
+                "object": digest,
+            })
+        manifest = {
+            "url": url,
+            "title": title,
+            "saved": time.time(),
+            "headers": [[key, value] for key, value in message.items() if key.lower() != "content-type"],
+            "type": message.get_param("type") or "text/html",
+            "parts": manifest_parts,
+        }
+        os.makedirs(self.pages_dir, exist_ok=True)
+        name = os.path.splitext(os.path.basename(path))[0]
+        manifest_file = os.path.join(self.pages_dir, f"{int(manifest['saved'])}-{name}.json")
+        with open(manifest_file, 'w') as f:
+            json.dump(manifest, f)
+        return page_bytes, written_bytes
+    
+    def object_path(self, digest):
+        return os.path.join(self.objects_dir, digest[:2], digest[2:])
+    
+    def write_object(self, digest, body):
+        """Store body unless it already is; return the bytes written."""
+        object_file = self.object_path(digest)
+        if os.path.exists(object_file):
+            return 0
+        os.makedirs(os.path.dirname(object_file), exist_ok=True)
+        tmp_file = object_file + ".tmp"
+        with open(tmp_file, 'wb') as f:
+            f.write(body)
+        os.replace(tmp_file, object_file)
+        return len(body)
+    
+    def export(self, manifest_file, path):
+        """Write the page in manifest_file back out as an MHTML file."""
+        with open(manifest_file, 'r') as f:
+            manifest = json.load(f)
+        boundary = "----MultipartBoundary--" + os.urandom(16).hex()
+        with open(path, 'wb') as out:
+            lines = [f"{key}: {value}" for key, value in manifest["headers"]]
+            lines.append(f'Content-Type: multipart/related;\r\n\ttype="{manifest["type"]}";\r\n\tboundary="{boundary}"')
+            out.write(("\r\n".join(lines) + "\r\n\r\n").encode('utf-8'))
+            for part in manifest["parts"]:
+                with open(self.object_path(part["object"]), 'rb') as f:
+                    body = f.read()
+                lines = [f"--{boundary}"] + [f"{key}: {value}" for key, value in part["headers"]]
+                lines.append("Content-Transfer-Encoding: base64")
+                out.write(("\r\n".join(lines) + "\r\n\r\n").encode('utf-8'))
+                out.write(base64.encodebytes(body).replace(b"\n", b"\r\n") + b"\r\n")
+            out.write(f"--{boundary}--\r\n".encode('utf-8'))
+
+class BookmarkNode:
+    __slots__ = ("parent", "folder", "bookmark", "children", "row")
+    
+    def __init__(self, parent, row, folder=None, bookmark=None):
+        self.parent = parent
+        self.row = row
+        self.folder = folder
+        self.bookmark = bookmark
+        self.children = []
+
+class BookmarkTreeModel(QtCore.QAbstractItemModel):
+    """Folder tree over BookmarkManager whose children are created lazily.
+    
+    Folder nodes only materialise their children, a page at a time, when the
+    view expands them. With a filter set, the root instead lists matching
+    bookmarks flat, also paged in as the view scrolls.
+    """
+    headers = ["Title", "URL", "Tags"]
+    page_size = 1000
+    
+    def __init__(self, bookmark_manager, parent=None):
+        super().__init__(parent)
+        self.bookmark_manager = bookmark_manager
+        self.filter_text = ""
+        self.reset_root()
+    
+    def reset_root(self):
+        self.root = BookmarkNode(None, 0, folder="")
+        self.matches = iter(self.bookmark_manager.search(self.filter_text)) if self.filter_text else None
+        self.matches_done = self.matches is None
+    
+    def set_filter(self, text):
+        self.beginResetModel()
+        self.filter_text = text.strip()
+        self.reset_root()
+        self.endResetModel()
+    
+    def reload(self):
+        self.set_filter(self.filter_text)
+    
+    def node(self, index):
+        return index.internalPointer() if index.isValid() else self.root
+    
+    def index(self, row, column, parent=QtCore.QModelIndex()):
+        node = self.node(parent)
+        if row < 0 or row >= len(node.children) or column < 0 or column >= len(self.headers):
+            return QtCore.QModelIndex()
+        return self.createIndex(row, column, node.children[row])
+    
+    def parent(self, index):
+        if not index.isValid():
+            return QtCore.QModelIndex()
+        parent = index.internalPointer().parent
+        if parent is None or parent is self.root:
+            return QtCore.QModelIndex()
+        return self.createIndex(parent.row, 0, parent)
+    
+    def rowCount(self, parent=QtCore.QModelIndex()):
+        if parent.column() > 0:
+            return 0
+        return len(self.node(parent).children)
+    
+    def columnCount(self, parent=QtCore.QModelIndex()):
+        return len(self.headers)
+    
+    def hasChildren(self, parent=QtCore.QModelIndex()):
+        node = self.node(parent)
+        if node is self.root:
+            return True
+        return node.folder is not None and (bool(node.children) or self.bookmark_manager.folder_size(node.folder) > 0)
+    
+    def canFetchMore(self, parent=QtCore.QModelIndex()):
+        node = self.node(parent)
+        if node is self.root and self.filter_text:
+            return not self.matches_done
+        return node.folder is not None and len(node.children) < self.bookmark_manager.folder_size(node.folder)
+    
+    def fetchMore(self, parent=QtCore.QModelIndex()):
+        node = self.node(parent)
+        start = len(node.children)
+        if node is self.root and self.filter_text:
+            page = list(itertools.islice(self.matches, self.page_size))
+            self.matches_done = len(page) < self.page_size
+            new_nodes = [BookmarkNode(node, start + i, bookmark=b) for i, b in enumerate(page)]
+        else:
+            folders, bookmarks = self.bookmark_manager.folder_contents(node.folder)
+            items = [(f, None) for f in folders] + [(None, b) for b in bookmarks]
+            new_nodes = [BookmarkNode(node, start + i, folder=f, bookmark=b)
+                         for i, (f, b) in enumerate(items[start:start + self.page_size])]
+        if new_nodes:
+            self.beginInsertRows(parent, start, start + len(new_nodes) - 1)
+            node.children.extend(new_nodes)
+            self.endInsertRows()
+    
+    def headerData(self, section, orientation, role=QtCore.Qt.DisplayRole):
+        if orientation == QtCore.Qt.Horizontal and role == QtCore.Qt.DisplayRole:
+            return self.headers[section]
+        return None
+    
+    def data(self, index, role=QtCore.Qt.DisplayRole):
+        if not index.isValid():
+            return None
+        node = index.internalPointer()
+        column = index.column()
+        if role == QtCore.Qt.DisplayRole:
+            if node.bookmark is None:
+                return "📁 " + node.folder.rpartition("/")[2] if column == 0 else ""
+            if column == 0:
+                return node.bookmark["title"]
+            if column == 1:
+                return node.bookmark["url"]
+            return ", ".join(node.bookmark["tags"])
+        if role == QtCore.Qt.ToolTipRole and node.bookmark is not None:
+            return node.bookmark["url"]
+        return None
 
 class BookmarkDialog(QtWidgets.QDialog):
     def __init__(self, parent=None):
         super().__init__(parent)
         self.setWindowTitle("Bookmarks")
-        self.setGeometry(200, 200, 500, 400)
-        self.setStyleSheet("""
-            QDialog {
-                background-color: #f5f7fa;
-                border-radius: 8px;
-            }
-            QPushButton {
-                padding: 8px 16px;
-                border-radius: 4px;
-                background-color: #007bff;
-                color: white;
-            }
-            QPushButton:hover {
-                background-color: #0056b3;
-            }
-            QTreeWidget {
-                background-color: white;
-                border: 1px solid #dee2e6;
-                border-radius: 4px;
-            }
-        """)
+        self.setGeometry(200, 200, 600, 450)
         
         layout = QtWidgets.QVBoxLayout()
         layout.setSpacing(10)
@@ -234,12 +3200,40 @@ class BookmarkDialog(QtWidgets.QDialog):
         title.setFont(QtGui.QFont("Arial", 14, QtGui.QFont.Bold))
         layout.addWidget(title)
         
-        self.bookmark_tree = QtWidgets.QTreeWidget()
-        self.bookmark_tree.setHeaderLabels(["Title", "URL"])
-        self.bookmark_tree.itemDoubleClicked.connect(self.open_bookmark)
+        self.search_edit = QtWidgets.QLineEdit()
+        self.search_edit.setPlaceholderText("Search bookmarks (tag:name to filter by tag)...")
+        layout.addWidget(self.search_edit)
+        
+        self.search_timer = QtCore.QTimer(self)
+        self.search_timer.setSingleShot(True)
+        self.search_timer.setInterval(150)
+        self.search_timer.timeout.connect(self.load_bookmarks)
+        self.search_edit.textChanged.connect(self.search_timer.start)
+        
+        self.parent_window = parent
+        self.model = BookmarkTreeModel(parent.bookmark_manager, self)
+        
+        self.bookmark_tree = QtWidgets.QTreeView()
+        self.bookmark_tree.setModel(self.model)
+        self.bookmark_tree.setUniformRowHeights(True)
+        self.bookmark_tree.header().resizeSection(0, 220)
+        self.bookmark_tree.header().resizeSection(1, 220)
+        self.bookmark_tree.doubleClicked.connect(self.open_bookmark)
         layout.addWidget(self.bookmark_tree)
         
         button_layout = QtWidgets.QHBoxLayout()
+        new_folder_btn = QtWidgets.QPushButton("New Folder")
+        new_folder_btn.clicked.connect(self.new_folder)
+        button_layout.addWidget(new_folder_btn)
+        
+        move_btn = QtWidgets.QPushButton("Move...")
+        move_btn.clicked.connect(self.move_bookmark)
+        button_layout.addWidget(move_btn)
+        
+        tags_btn = QtWidgets.QPushButton("Edit Tags...")
+        tags_btn.clicked.connect(self.edit_tags)
+        button_layout.addWidget(tags_btn)
+        
         delete_btn = QtWidgets.QPushButton("Delete Selected")
         delete_btn.clicked.connect(self.delete_bookmark)
         button_layout.addWidget(delete_btn)
@@ -251,54 +3245,211 @@ class BookmarkDialog(QtWidgets.QDialog):
         layout.addLayout(button_layout)
         self.setLayout(layout)
         
-        self.parent_window = parent
         self.load_bookmarks()
     
     def load_bookmarks(self):
-        self.bookmark_tree.clear()
-        if hasattr(self.parent_window, 'bookmark_manager'):
-            for bookmark in self.parent_window.bookmark_manager.bookmarks:
-                item = QtWidgets.QTreeWidgetItem([bookmark["title"], bookmark["url"]])
-                self.bookmark_tree.addTopLevelItem(item)
-    
-    def open_bookmark(self, item):
-        url = item.text(1)
+        self.model.set_filter(self.search_edit.text())
+    
+    def current_node(self):
+        index = self.bookmark_tree.currentIndex()
+        return index.internalPointer() if index.isValid() else None
+    
+    def current_folder(self):
+        node = self.current_node()
+        if node is None:
+            return ""
+        return node.folder if node.bookmark is None else node.bookmark["folder"]
+    
+    def open_bookmark(self, index):
+        node = index.internalPointer()
+        if node.bookmark is None:
+            return
         if self.parent_window:
-            self.parent_window.navigate_to_url(url)
+            self.parent_window.navigate_to_url(node.bookmark["url"])
         self.close()
     
+    def new_folder(self):
+        parent_folder = self.current_folder()
+        name, ok = QtWidgets.QInputDialog.getText(self, "New Folder", "Folder name:")
+        if ok and name.strip():
+            path = f"{parent_folder}/{name.strip()}" if parent_folder else name.strip()
+            self.parent_window.bookmark_manager.add_folder(path)
+            self.load_bookmarks()
+    
+    def move_bookmark(self):
+        node = self.current_node()
+        if node is None or node.bookmark is None:
+            return
+        manager = self.parent_window.bookmark_manager
+        folders = sorted(manager.subfolders)
+        current = folders.index(node.bookmark["folder"]) if node.bookmark["folder"] in folders else 0
+        folder, ok = QtWidgets.QInputDialog.getItem(
+            self, "Move Bookmark", "Folder:", [f or "/" for f in folders], current, True)
+        if ok:
+            folder = folder.strip("/")
+            manager.add_folder(folder)
+            manager.update_bookmark(node.bookmark["url"], folder=folder)
+            self.load_bookmarks()
+    
+    def edit_tags(self):
+        node = self.current_node()
+        if node is None or node.bookmark is None:
+            return
+        text, ok = QtWidgets.QInputDialog.getText(
+            self, "Edit Tags", "Tags (comma separated):", text=", ".join(node.bookmark["tags"]))
+        if ok:
+            tags = [t.strip().lower() for t in text.split(",") if t.strip()]
+            self.parent_window.bookmark_manager.update_bookmark(node.bookmark["url"], tags=tags)
+            self.load_bookmarks()
+    
     def delete_bookmark(self):
-        current_item = self.bookmark_tree.currentItem()
-        if current_item and self.parent_window:
-            url = current_item.text(1)
-            self.parent_window.bookmark_manager.remove_bookmark(url)
+        node = self.current_node()
+        if node and self.parent_window:
+            if node.bookmark is not None:
+                self.parent_window.bookmark_manager.remove_bookmark(node.bookmark["url"])
+            else:
+                self.parent_window.bookmark_manager.remove_folder(node.folder)
             self.load_bookmarks()
 
+class HistoryTableModel(QtCore.QAbstractTableModel):
+    """History rows fetched page by page as the view scrolls.
+    
+    Past the live store, archived months are read on a background thread,
+    one at a time and newest first, and handed out a page at a time.
+    """
+    headers = ["Title", "URL", "Date"]
+    page_size = 500
+    archive_loaded = QtCore.pyqtSignal(int, object)
+    
+    def __init__(self, history_manager, parent=None):
+        super().__init__(parent)
+        self.history_manager = history_manager
+        self.entries = []
+        self.query = ""
+        self.store_exhausted = False
+        self.archive_months = None
+        # Entries of the last archived month read but not yet shown.
+        self.archive_buffer = []
+        self.loading = False
+        # Bumped on each new query so stale archive reads are dropped.
+        self.generation = 0
+        self.exhausted = False
+        self.archive_loaded.connect(self.on_archive_loaded)
+    
+    def set_query(self, text):
+        self.beginResetModel()
+        self.entries = []
+        self.query = text
+        self.store_exhausted = False
+        self.archive_months = None
+        self.archive_buffer = []
+        self.loading = False
+        self.generation += 1
+        self.exhausted = False
+        self.endResetModel()
+    
+    def rowCount(self, parent=QtCore.QModelIndex()):
+        return 0 if parent.isValid() else len(self.entries)
+    
+    def columnCount(self, parent=QtCore.QModelIndex()):
+        return 0 if parent.isValid() else len(self.headers)
+    
+    def headerData(self, section, orientation, role=QtCore.Qt.DisplayRole):
+        if orientation == QtCore.Qt.Horizontal and role == QtCore.Qt.DisplayRole:
+            return self.headers[section]
+        return None
+    
+    def data(self, index, role=QtCore.Qt.DisplayRole):
+        if not index.isValid():
+            return None
+        entry = self.entries[index.row()]
+        if role in (QtCore.Qt.DisplayRole, QtCore.Qt.ToolTipRole):
+            column = index.column()
+            if column == 0:
+                return entry.title
+            if column == 1:
+                return entry.url
+            return entry.date_str()
+        return None
+    
+    def canFetchMore(self, parent=QtCore.QModelIndex()):
+        return not parent.isValid() and not self.exhausted
+    
+    def fetchMore(self, parent=QtCore.QModelIndex()):
+        if parent.isValid() or self.exhausted:
+            return
+        if not self.store_exhausted:
+            offset = len(self.entries)
+            if self.query:
+                page = self.history_manager.search(self.query, self.page_size, offset)
+            else:
+                page = self.history_manager.recent(self.page_size, offset)
+            if len(page) < self.page_size:
+                self.store_exhausted = True
+                self.archive_months = self.history_manager.archived_months()
+                self.load_archive_month()
+        else:
+            page = self.archive_buffer[:self.page_size]
+            del self.archive_buffer[:self.page_size]
+            if not self.archive_buffer:
+                self.load_archive_month()
+        self.update_exhausted()
+        if page:
+            offset = len(self.entries)
+            self.beginInsertRows(QtCore.QModelIndex(), offset, offset + len(page) - 1)
+            self.entries.extend(page)
+            self.endInsertRows()
+    
+    def update_exhausted(self):
+        self.exhausted = (self.store_exhausted and not self.archive_months
+                          and not self.archive_buffer and not self.loading)
+    
+    def load_archive_month(self):
+        if self.loading or not self.archive_months:
+            return
+        self.loading = True
+        month = self.archive_months.pop(0)
+        generation, query = self.generation, self.query
+        # Emitted from the thread, so on_archive_loaded runs on the GUI thread.
+        threading.Thread(target=lambda: self.archive_loaded.emit(
+            generation, self.history_manager.archived(month, query)), daemon=True).start()
+    
+    def on_archive_loaded(self, generation, entries):
+        if generation != self.generation:
+            return
+        self.loading = False
+        self.archive_buffer.extend(entries)
+        if self.archive_buffer:
+            self.fetchMore()
+        else:
+            self.load_archive_month()
+            self.update_exhausted()
+    
+    def entry(self, row):
+        return self.entries[row]
+
+class HistoryFilterProxyModel(QtCore.QSortFilterProxyModel):
+    """Filters the rows already loaded while the source model re-queries."""
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.words = []
+    
+    def set_filter_text(self, text):
+        self.words = text.lower().split()
+        self.invalidateFilter()
+    
+    def filterAcceptsRow(self, source_row, source_parent):
+        if not self.words:
+            return True
+        entry = self.sourceModel().entry(source_row)
+        haystack = f"{entry.title} {entry.url}".lower()
+        return all(word in haystack for word in self.words)
+
 class HistoryDialog(QtWidgets.QDialog):
     def __init__(self, parent=None):
         super().__init__(parent)
         self.setWindowTitle("History")
         self.setGeometry(200, 200, 600, 400)
-        self.setStyleSheet("""
-            QDialog {
-                background-color: #f5f7fa;
-                border-radius: 8px;
-            }
-            QPushButton {
-                padding: 8px 16px;
-                border-radius: 4px;
-                background-color: #007bff;
-                color: white;
-            }
-            QPushButton:hover {
-                background-color: #0056b3;
-            }
-            QTreeWidget {
-                background-color: white;
-                border: 1px solid #dee2e6;
-                border-radius: 4px;
-            }
-        """)
         
         layout = QtWidgets.QVBoxLayout()
         layout.setSpacing(10)
@@ -308,9 +3459,31 @@ class HistoryDialog(QtWidgets.QDialog):
         title.setFont(QtGui.QFont("Arial", 14, QtGui.QFont.Bold))
         layout.addWidget(title)
         
-        self.history_tree = QtWidgets.QTreeWidget()
-        self.history_tree.setHeaderLabels(["Title", "URL", "Date"])
-        self.history_tree.itemDoubleClicked.connect(self.open_history_item)
+        self.search_edit = QtWidgets.QLineEdit()
+        self.search_edit.setPlaceholderText("Search history...")
+        self.search_edit.textChanged.connect(self.filter_history)
+        layout.addWidget(self.search_edit)
+        
+        self.parent_window = parent
+        self.model = HistoryTableModel(parent.history_manager, self)
+        self.proxy_model = HistoryFilterProxyModel(self)
+        self.proxy_model.setSourceModel(self.model)
+        
+        # The proxy hides non-matching loaded rows immediately; the source
+        # model is re-queried once typing pauses so older matches appear too.
+        self.search_timer = QtCore.QTimer(self)
+        self.search_timer.setSingleShot(True)
+        self.search_timer.setInterval(150)
+        self.search_timer.timeout.connect(self.load_history)
+        
+        self.history_tree = QtWidgets.QTreeView()
+        self.history_tree.setModel(self.proxy_model)
+        self.history_tree.setRootIsDecorated(False)
+        self.history_tree.setUniformRowHeights(True)
+        self.history_tree.setAlternatingRowColors(True)
+        self.history_tree.header().resizeSection(0, 220)
+        self.history_tree.header().resizeSection(1, 220)
+        self.history_tree.doubleClicked.connect(self.open_history_item)
         layout.addWidget(self.history_tree)
         
         button_layout = QtWidgets.QHBoxLayout()
@@ -325,59 +3498,98 @@ class HistoryDialog(QtWidgets.QDialog):
         layout.addLayout(button_layout)
         self.setLayout(layout)
         
-        self.parent_window = parent
         self.load_history()
     
+    def filter_history(self, text):
+        self.proxy_model.set_filter_text(text)
+        self.search_timer.start()
+    
     def load_history(self):
-        self.history_tree.clear()
-        if hasattr(self.parent_window, 'history_manager'):
-            for entry in reversed(self.parent_window.history_manager.history[-100:]):
-                date_str = entry.get("timestamp", "")[:19].replace("T", " ")
-                item = QtWidgets.QTreeWidgetItem([entry["title"], entry["url"], date_str])
-                self.history_tree.addTopLevelItem(item)
-    
-    def open_history_item(self, item):
-        url = item.text(1)
+        self.model.set_query(self.search_edit.text().strip())
+        self.model.fetchMore()
+    
+    def open_history_item(self, index):
+        url = self.model.entry(self.proxy_model.mapToSource(index).row()).url
         if self.parent_window:
             self.parent_window.navigate_to_url(url)
         self.close()
     
     def clear_history(self):
         if self.parent_window:
-            self.parent_window.history_manager.history = []
-            self.parent_window.history_manager.save_history()
+            self.parent_window.history_manager.clear_history()
             self.load_history()
 
+SETTINGS_FILE = "settings.json"
+# MainWindow attributes the settings dialog saves in SETTINGS_FILE.
+SAVED_SETTINGS = (
+    "history_retention_days", "history_archive_limit_mb", "tab_freeze_minutes", "tab_discard_minutes",
+    "private_cache_mb", "view_pool_size", "prerender_enabled", "content_blocking_enabled",
+    "max_active_downloads", "download_limit_kb",
+)
+
+# Chromium switches for each performance preset, passed through
+# QTWEBENGINE_CHROMIUM_FLAGS. That variable is split on spaces, so each
+# --js-flags carries a single V8 flag.
+PERFORMANCE_PRESETS = collections.OrderedDict([
+    ("Low Memory", [
+        "--renderer-process-limit=2",
+        "--process-per-site",
+        "--enable-low-end-device-mode",
+        "--js-flags=--max-old-space-size=256",
+        "--disable-background-networking",
+    ]),
+    ("Balanced", [
+        "--renderer-process-limit=8",
+        "--process-per-site",
+        "--js-flags=--max-old-space-size=1024",
+        "--disable-background-networking",
+    ]),
+    ("Max Throughput", [
+        "--enable-gpu-rasterization",
+        "--enable-zero-copy",
+        "--num-raster-threads=4",
+        "--js-flags=--max-old-space-size=4096",
+        "--disable-background-networking",
+    ]),
+])
+DEFAULT_PERFORMANCE_PRESET = "Balanced"
+
+def read_settings_file():
+    try:
+        if os.path.exists(SETTINGS_FILE):
+            with open(SETTINGS_FILE, 'r') as f:
+                return json.load(f)
+    except Exception as e:
+        print(f"Error loading settings: {e}")
+    return {}
+
+def write_settings_file(**changes):
+    settings = read_settings_file()
+    settings.update(changes)
+    try:
+        tmp_file = SETTINGS_FILE + ".tmp"
+        with open(tmp_file, 'w') as f:
+            json.dump(settings, f, indent=2)
+        os.replace(tmp_file, SETTINGS_FILE)
+    except Exception as e:
+        print(f"Error saving settings: {e}")
+
+def apply_performance_preset(name):
+    """Put the preset's switches in front of any flags set by the user.
+    
+    Chromium reads the flags once, when QtWebEngine starts, so this must
+    run before the QApplication is created.
+    """
+    flags = PERFORMANCE_PRESETS.get(name, PERFORMANCE_PRESETS[DEFAULT_PERFORMANCE_PRESET])
+    user_flags = os.environ.get("QTWEBENGINE_CHROMIUM_FLAGS", "")
+    os.environ["QTWEBENGINE_CHROMIUM_FLAGS"] = " ".join(flags + [user_flags]).strip()
+
 class SettingsDialog(QtWidgets.QDialog):
     def __init__(self, parent=None):
         super().__init__(parent)
         self.setWindowTitle("Settings")
-        self.setGeometry(200, 200, 400, 350)
+        self.setGeometry(200, 200, 400, 800)
         self.parent_window = parent
-        self.setStyleSheet("""
-            QDialog {
-                background-color: #f5f7fa;
-                border-radius: 8px;
-            }
-            QGroupBox {
-                font-weight: bold;
-                margin-top: 10px;
-            }
-            QPushButton {
-                padding: 8px 16px;
-                border-radius: 4px;
-                background-color: #007bff;
-                color: white;
-            }
-            QPushButton:hover {
-                background-color: #0056b3;
-            }
-            QLineEdit, QSpinBox, QComboBox {
-                padding: 5px;
-                border: 1px solid #dee2e6;
-                border-radius: 4px;
-            }
-        """)
         
         layout = QtWidgets.QVBoxLayout()
         layout.setSpacing(10)
@@ -415,9 +3627,106 @@ class SettingsDialog(QtWidgets.QDialog):
         self.images_check.setChecked(getattr(parent, 'images_enabled', True))
         privacy_layout.addWidget(self.images_check)
         
+        self.prerender_check = QtWidgets.QCheckBox("Preload the page I'm likely typing")
+        self.prerender_check.setChecked(getattr(parent, 'prerender_enabled', False))
+        privacy_layout.addWidget(self.prerender_check)
+        
+        self.blocking_check = QtWidgets.QCheckBox("Block ads and trackers")
+        self.blocking_check.setChecked(getattr(parent, 'content_blocking_enabled', True))
+        privacy_layout.addWidget(self.blocking_check)
+        
         privacy_group.setLayout(privacy_layout)
         layout.addWidget(privacy_group)
         
+        history_group = QtWidgets.QGroupBox("History")
+        history_layout = QtWidgets.QFormLayout()
+        
+        self.retention_spin = QtWidgets.QSpinBox()
+        self.retention_spin.setRange(0, 3650)
+        self.retention_spin.setSpecialValueText("Forever")
+        self.retention_spin.setSuffix(" days")
+        self.retention_spin.setValue(getattr(parent, 'history_retention_days', 0))
+        history_layout.addRow("Keep history for:", self.retention_spin)
+        
+        self.archive_limit_spin = QtWidgets.QSpinBox()
+        self.archive_limit_spin.setRange(0, 100000)
+        self.archive_limit_spin.setSpecialValueText("Unlimited")
+        self.archive_limit_spin.setSuffix(" MB")
+        self.archive_limit_spin.setValue(getattr(parent, 'history_archive_limit_mb', 0))
+        history_layout.addRow("Archive size limit:", self.archive_limit_spin)
+        
+        history_group.setLayout(history_layout)
+        layout.addWidget(history_group)
+        
+        tabs_group = QtWidgets.QGroupBox("Background Tabs")
+        tabs_layout = QtWidgets.QFormLayout()
+        
+        self.freeze_spin = QtWidgets.QSpinBox()
+        self.freeze_spin.setRange(0, 1440)
+        self.freeze_spin.setSpecialValueText("Never")
+        self.freeze_spin.setSuffix(" min")
+        self.freeze_spin.setValue(getattr(parent, 'tab_freeze_minutes', 5))
+        tabs_layout.addRow("Freeze after:", self.freeze_spin)
+        
+        self.discard_spin = QtWidgets.QSpinBox()
+        self.discard_spin.setRange(0, 1440)
+        self.discard_spin.setSpecialValueText("Never")
+        self.discard_spin.setSuffix(" min")
+        self.discard_spin.setValue(getattr(parent, 'tab_discard_minutes', 30))
+        tabs_layout.addRow("Discard after:", self.discard_spin)
+        
+        tabs_group.setLayout(tabs_layout)
+        layout.addWidget(tabs_group)
+        
+        cache_group = QtWidgets.QGroupBox("Cache")
+        cache_layout = QtWidgets.QFormLayout()
+        
+        self.cache_spin = QtWidgets.QSpinBox()
+        self.cache_spin.setRange(0, 4096)
+        self.cache_spin.setSpecialValueText("Automatic")
+        self.cache_spin.setSuffix(" MB")
+        self.cache_spin.setValue(getattr(parent, 'private_cache_mb', 64))
+        cache_layout.addRow("Memory cache size:", self.cache_spin)
+        
+        cache_group.setLayout(cache_layout)
+        layout.addWidget(cache_group)
+        
+        downloads_group = QtWidgets.QGroupBox("Downloads")
+        downloads_layout = QtWidgets.QFormLayout()
+        
+        self.active_downloads_spin = QtWidgets.QSpinBox()
+        self.active_downloads_spin.setRange(1, 10)
+        self.active_downloads_spin.setValue(getattr(parent, 'max_active_downloads', 3))
+        downloads_layout.addRow("Simultaneous downloads:", self.active_downloads_spin)
+        
+        self.download_limit_spin = QtWidgets.QSpinBox()
+        self.download_limit_spin.setRange(0, 1000000)
+        self.download_limit_spin.setSingleStep(100)
+        self.download_limit_spin.setSpecialValueText("Unlimited")
+        self.download_limit_spin.setSuffix(" KB/s")
+        self.download_limit_spin.setValue(getattr(parent, 'download_limit_kb', 0))
+        downloads_layout.addRow("Speed limit:", self.download_limit_spin)
+        
+        downloads_group.setLayout(downloads_layout)
+        layout.addWidget(downloads_group)
+        
+        performance_group = QtWidgets.QGroupBox("Performance")
+        performance_layout = QtWidgets.QFormLayout()
+        
+        self.preset_combo = QtWidgets.QComboBox()
+        self.preset_combo.addItems(list(PERFORMANCE_PRESETS))
+        self.preset_combo.setCurrentText(read_settings_file().get("performance_preset", DEFAULT_PERFORMANCE_PRESET))
+        performance_layout.addRow("Preset:", self.preset_combo)
+        performance_layout.addRow(QtWidgets.QLabel("The preset takes effect after a restart."))
+        
+        self.pool_spin = QtWidgets.QSpinBox()
+        self.pool_spin.setRange(0, 8)
+        self.pool_spin.setValue(getattr(parent, 'view_pool_size', 2))
+        performance_layout.addRow("Tabs kept ready:", self.pool_spin)
+        
+        performance_group.setLayout(performance_layout)
+        layout.addWidget(performance_group)
+        
         button_layout = QtWidgets.QHBoxLayout()
         save_btn = QtWidgets.QPushButton("Save")
         save_btn.clicked.connect(self.save_settings)
@@ -427,68 +3736,1335 @@ class SettingsDialog(QtWidgets.QDialog):
         cancel_btn.clicked.connect(self.close)
         button_layout.addWidget(cancel_btn)
         
-        layout.addLayout(button_layout)
-        self.setLayout(layout)
+        layout.addLayout(button_layout)
+        self.setLayout(layout)
+    
+    def save_settings(self):
+        if self.parent_window:
+            self.parent_window.homepage = self.homepage_edit.text()
+            self.parent_window.zoom_level = self.zoom_spin.value()
+            self.parent_window.javascript_enabled = self.javascript_check.isChecked()
+            self.parent_window.images_enabled = self.images_check.isChecked()
+            self.parent_window.prerender_enabled = self.prerender_check.isChecked()
+            self.parent_window.content_blocking_enabled = self.blocking_check.isChecked()
+            self.parent_window.max_active_downloads = self.active_downloads_spin.value()
+            self.parent_window.download_limit_kb = self.download_limit_spin.value()
+            self.parent_window.theme = self.theme_combo.currentText()
+            self.parent_window.history_retention_days = self.retention_spin.value()
+            self.parent_window.history_archive_limit_mb = self.archive_limit_spin.value()
+            self.parent_window.tab_freeze_minutes = self.freeze_spin.value()
+            self.parent_window.tab_discard_minutes = self.discard_spin.value()
+            self.parent_window.private_cache_mb = self.cache_spin.value()
+            self.parent_window.view_pool_size = self.pool_spin.value()
+            self.parent_window.apply_settings()
+            saved = {name: getattr(self.parent_window, name) for name in SAVED_SETTINGS}
+        else:
+            saved = {}
+        write_settings_file(performance_preset=self.preset_combo.currentText(), **saved)
+        self.close()
+
+class OmniboxModel(QtCore.QAbstractListModel):
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.items = []
+    
+    def set_items(self, items):
+        self.beginResetModel()
+        self.items = items
+        self.endResetModel()
+    
+    def rowCount(self, parent=QtCore.QModelIndex()):
+        return 0 if parent.isValid() else len(self.items)
+    
+    def data(self, index, role=QtCore.Qt.DisplayRole):
+        if not index.isValid():
+            return None
+        item = self.items[index.row()]
+        if role == QtCore.Qt.DisplayRole:
+            prefix = "⭐ " if item.bookmarked else ""
+            return f"{prefix}{item.title} — {item.url}" if item.title else f"{prefix}{item.url}"
+        if role in (QtCore.Qt.EditRole, QtCore.Qt.ToolTipRole):
+            return item.url
+        return None
+
+class Omnibox(QtCore.QObject):
+    """Drives the suggestion popup and inline completion of the url_bar."""
+    url_selected = QtCore.pyqtSignal(str)
+    # Typed text, suggested URLs best first, and the URL inline completion
+    # settled on ("" if none).
+    predictions_changed = QtCore.pyqtSignal(str, list, str)
+    
+    def __init__(self, line_edit, parent=None):
+        super().__init__(parent)
+        self.line_edit = line_edit
+        self.previous_text = ""
+        self.inline_text = None
+        self.inline_url = None
+        
+        self.model = OmniboxModel(self)
+        self.completer = QtWidgets.QCompleter(self.model, self)
+        self.completer.setWidget(line_edit)
+        self.completer.setCompletionMode(QtWidgets.QCompleter.UnfilteredPopupCompletion)
+        self.completer.setCompletionRole(QtCore.Qt.EditRole)
+        self.completer.setMaxVisibleItems(8)
+        self.completer.activated[QtCore.QModelIndex].connect(self.on_activated)
+        
+        line_edit.textEdited.connect(self.on_text_edited)
+    
+    @property
+    def index(self):
+        # History and bookmarks are loaded on first use, not at startup.
+        return SharedStorage.shared().omnibox_index
+    
+    def on_text_edited(self, text):
+        grew = len(text) > len(self.previous_text) and text.startswith(self.previous_text)
+        self.previous_text = text
+        self.inline_text = self.inline_url = None
+        
+        items = self.index.query(text)
+        self.model.set_items(items)
+        if not items:
+            self.completer.popup().hide()
+            self.predictions_changed.emit(text, [], "")
+            return
+        self.completer.complete()
+        
+        if grew and self.line_edit.cursorPosition() == len(text):
+            completion = self.index.inline_completion(text, items)
+            if completion:
+                completed, url = completion
+                remainder = completed[len(self.index.normalize(text)):]
+                if remainder:
+                    self.inline_text = text + remainder
+                    self.inline_url = url
+                    self.line_edit.setText(self.inline_text)
+                    self.line_edit.setSelection(len(text), len(remainder))
+        self.predictions_changed.emit(text, [item.url for item in items], self.inline_url or "")
+    
+    def on_activated(self, index):
+        url = index.data(QtCore.Qt.EditRole)
+        if url:
+            self.line_edit.setText(url)
+            self.url_selected.emit(url)
+    
+    def resolve(self, text):
+        """URL the inline completion stands for, if text is still that completion."""
+        if self.inline_text is not None and text == self.inline_text:
+            return self.inline_url
+        return None
+
+class SpeculativeLoader(QtCore.QObject):
+    """Warms up the network for where the url_bar is heading.
+    
+    QtWebEngine has no preconnect call, so a hidden page in the window's
+    profile is given <link rel=preconnect> / dns-prefetch hints for the
+    predicted origins; Chromium then opens the connections in the same
+    socket pool the tabs use. Optionally, the URL inline completion settled
+    on is loaded in a second hidden page to fill the profile's cache.
+    
+    At most one hint page and one prerender run at a time; a newer
+    prediction replaces the one in flight.
+    """
+    delay = 150
+    dns_prefetch_count = 3
+    # Chromium keeps idle sockets around for about this long.
+    reconnect_after = 30
+    
+    def __init__(self, profile, parent=None):
+        super().__init__(parent)
+        self.profile = profile
+        self.prerender_enabled = False
+        self.hint_page = None
+        self.prerender_page = None
+        self.prerender_url = None
+        self.connected = {}
+        self.urls = []
+        self.likely_url = ""
+        
+        self.timer = QtCore.QTimer(self)
+        self.timer.setSingleShot(True)
+        self.timer.setInterval(self.delay)
+        self.timer.timeout.connect(self.run)
+    
+    def predict(self, urls, likely_url=""):
+        self.urls = urls
+        self.likely_url = likely_url
+        self.timer.start()
+    
+    def origins(self):
+        origins = []
+        for url in self.urls:
+            parsed = urlparse(url)
+            if parsed.scheme in ('http', 'https') and parsed.netloc:
+                origin = f"{parsed.scheme}://{parsed.netloc}"
+                if origin not in origins:
+                    origins.append(origin)
+                    if len(origins) == self.dns_prefetch_count:
+                        break
+        return origins
+    
+    def run(self):
+        now = time.monotonic()
+        origins = [o for o in self.origins() if now - self.connected.get(o, -self.reconnect_after) >= self.reconnect_after]
+        if origins:
+            # Only the top origin is worth a full connection; the rest get
+            # a DNS lookup.
+            hints = [f'<link rel="preconnect" href="{html.escape(origins[0])}" crossorigin>']
+            hints += [f'<link rel="dns-prefetch" href="{html.escape(o)}">' for o in origins]
+            if self.hint_page is None:
+                self.hint_page = QtWebEngineWidgets.QWebEnginePage(self.profile, self)
+                ProfileManager.shared().intercept(self.hint_page)
+            self.hint_page.setHtml("".join(hints))
+            self.connected[origins[0]] = now
+        
+        if self.prerender_enabled and self.likely_url and self.likely_url != self.prerender_url:
+            if self.prerender_page is None:
+                self.prerender_page = QtWebEngineWidgets.QWebEnginePage(self.profile, self)
+                self.prerender_page.setAudioMuted(True)
+                ProfileManager.shared().intercept(self.prerender_page)
+            self.prerender_url = self.likely_url
+            self.prerender_page.setUrl(QtCore.QUrl(self.prerender_url))
+    
+    def cancel(self):
+        self.timer.stop()
+        self.urls = []
+        self.likely_url = ""
+        if self.prerender_url is not None:
+            self.prerender_url = None
+            self.prerender_page.setUrl(QtCore.QUrl("about:blank"))
+    
+    def navigated(self, url):
+        """The user went somewhere; stop guessing. A prerender of that very
+        URL is left to finish, since the tab is loading the same resources."""
+        self.timer.stop()
+        if self.prerender_url is not None and self.prerender_url != url:
+            self.cancel()
+    
+    def set_prerender_enabled(self, enabled):
+        self.prerender_enabled = enabled
+        if not enabled:
+            self.cancel()
+
+FILTER_LISTS_DIR = "filter_lists"
+FILTER_CACHE_FILE = "filter_cache.bin"
+FILTER_CACHE_VERSION = 1
+FILTER_TOKEN_RE = re.compile(r"[a-z0-9%]{3,}")
+HOSTS_ADDRESSES = {"0.0.0.0", "127.0.0.1", "::", "::1"}
+# Request types filter options can name, and the QtWebEngine resource types
+# they cover. Anything else counts as "other".
+FILTER_RESOURCE_TYPES = {
+    "script": ("ResourceTypeScript",),
+    "image": ("ResourceTypeImage", "ResourceTypeFavicon"),
+    "stylesheet": ("ResourceTypeStylesheet",),
+    "font": ("ResourceTypeFontResource",),
+    "media": ("ResourceTypeMedia",),
+    "object": ("ResourceTypeObject", "ResourceTypePluginResource"),
+    "subdocument": ("ResourceTypeSubFrame",),
+    "xmlhttprequest": ("ResourceTypeXhr",),
+    "ping": ("ResourceTypePing", "ResourceTypeCspReport"),
+    "other": (),
+}
+
+@functools.lru_cache(maxsize=4096)
+def site_of(host):
+    """host's registrable domain, e.g. "bbc.co.uk" for "www.bbc.co.uk".
+    
+    The public suffix comes from the copy of the Public Suffix List built
+    into Qt; hosts without one (IP addresses, localhost) are their own site.
+    """
+    suffix = QtCore.QUrl("http://" + host).topLevelDomain()
+    if not suffix or len(suffix) > len(host):
+        return host
+    return host[:-len(suffix)].rsplit(".", 1)[-1] + suffix
+
+def domain_match(host, domains):
+    while host:
+        if host in domains:
+            return True
+        dot = host.find(".")
+        if dot < 0:
+            return False
+        host = host[dot + 1:]
+    return False
+
+def filter_regex(pattern):
+    """Turn an Adblock Plus URL pattern into a regular expression."""
+    start = end = ""
+    if pattern.startswith("||"):
+        start = r"^[a-z][a-z0-9+.-]*://(?:[^/?#]*\.)?"
+        pattern = pattern[2:]
+    elif pattern.startswith("|"):
+        start = "^"
+        pattern = pattern[1:]
+    if pattern.endswith("|"):
+        end = "$"
+        pattern = pattern[:-1]
+    body = re.escape(pattern.strip("*")).replace(r"\*", ".*").replace(r"\^", r"(?:[^\w.%-]|$)")
+    return start + body + end
+
+def filter_tokens(pattern):
+    """Tokens of pattern that every URL it matches contains whole."""
+    anchored_start = pattern.startswith("|")
+    anchored_end = pattern.endswith(("|", "^"))
+    tokens = []
+    for match in re.finditer(r"[a-z0-9%]+", pattern):
+        token = match.group()
+        before = pattern[match.start() - 1] if match.start() else ""
+        after = pattern[match.end()] if match.end() < len(pattern) else ""
+        if len(token) < 3 or before == "*" or after == "*":
+            continue
+        if (not before and not anchored_start) or (not after and not anchored_end):
+            continue
+        tokens.append(token)
+    return tokens
+
+def parse_filter_rules(text):
+    rules = []
+    for line in text.split("\n"):
+        regex, party, types, excluded_types, domains, excluded_domains = line.split("\t")
+        rules.append((re.compile(regex), None if not party else party == "1",
+                      frozenset(filter(None, types.split(","))), frozenset(filter(None, excluded_types.split(","))),
+                      frozenset(filter(None, domains.split("|"))), frozenset(filter(None, excluded_domains.split("|")))))
+    return rules
+
+class FilterMatcher:
+    """Blocking rules compiled for per-request lookups.
+    
+    Plain domain rules (hosts files, ||domain^) live in hashed sets and are
+    matched by walking the host's suffixes. URL patterns are indexed by one
+    token each, so a request only tests the rules sharing a token with its
+    URL. Each token's rules are kept as one string, one rule per line, and
+    parsed the first time a URL has that token: loading a list then costs
+    a few large strings instead of hundreds of thousands of small objects.
+    """
+    def __init__(self, data):
+        self.blocked_domains = data["blocked_domains"]
+        self.third_party_domains = data["third_party_domains"]
+        self.allowed_domains = data["allowed_domains"]
+        self.indexes = {"block": data["block_index"], "allow": data["allow_index"]}
+        self.parsed = {}
+    
+    def __len__(self):
+        return (len(self.blocked_domains) + len(self.third_party_domains) + len(self.allowed_domains)
+                + sum(rules.count("\n") + 1 for index in self.indexes.values() for rules in index.values()))
+    
+    def matches(self, url, first_party_url, resource_type="other"):
+        url = url.lower()
+        host = url_host(url)
+        if domain_match(host, self.allowed_domains):
+            return False
+        first_party_host = url_host(first_party_url)
+        third_party = site_of(host) != site_of(first_party_host)
+        request = (url, FILTER_TOKEN_RE.findall(url), third_party, resource_type, first_party_host)
+        blocked = (domain_match(host, self.blocked_domains)
+                   or (third_party and domain_match(host, self.third_party_domains))
+                   or self.rules_match("block", request))
+        return blocked and not self.rules_match("allow", request)
+    
+    def rules(self, kind, token):
+        rules = self.parsed.get((kind, token))
+        if rules is None:
+            text = self.indexes[kind].get(token)
+            rules = self.parsed[kind, token] = parse_filter_rules(text) if text else []
+        return rules
+    
+    def rules_match(self, kind, request):
+        url, tokens, third_party, resource_type, first_party_host = request
+        for token in itertools.chain(tokens, ("",)):
+            for regex, party, types, excluded_types, domains, excluded_domains in self.rules(kind, token):
+                if party is not None and party != third_party:
+                    continue
+                if (types and resource_type not in types) or resource_type in excluded_types:
+                    continue
+                if domains and not domain_match(first_party_host, domains):
+                    continue
+                if excluded_domains and domain_match(first_party_host, excluded_domains):
+                    continue
+                if regex.search(url):
+                    return True
+        return False
+
+class ContentFilter(QtCore.QObject):
+    """Loads the filter lists in FILTER_LISTS_DIR into one FilterMatcher.
+    
+    Both EasyList-style lists and hosts files (or plain lists of domains)
+    are read. Element hiding and regex rules, and rules with options other
+    than third-party, request types and domain=, are skipped. The compiled
+    rules are cached in FILTER_CACHE_FILE with marshal and rebuilt only when
+    a list changes.
+    """
+    instance = None
+    
+    @classmethod
+    def shared(cls):
+        if cls.instance is None:
+            cls.instance = cls()
+        return cls.instance
+    
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        # Replaced whole once loaded, so requests never see a partial set.
+        self.matcher = None
+    
+    def list_files(self):
+        try:
+            names = sorted(os.listdir(FILTER_LISTS_DIR))
+        except OSError:
+            return []
+        return [os.path.join(FILTER_LISTS_DIR, name) for name in names
+                if os.path.isfile(os.path.join(FILTER_LISTS_DIR, name))]
+    
+    def load_in_background(self):
+        threading.Thread(target=self.load, daemon=True).start()
+    
+    def load(self):
+        paths = self.list_files()
+        sources = [(path, file_signature(path)) for path in paths]
+        data = None
+        try:
+            if os.path.exists(FILTER_CACHE_FILE):
+                with open(FILTER_CACHE_FILE, 'rb') as f:
+                    cached = marshal.load(f)
+                if cached.get("version") == FILTER_CACHE_VERSION and cached.get("sources") == sources:
+                    data = cached
+        except Exception as e:
+            print(f"Error loading filter cache: {e}")
+        if data is None:
+            data = self.compile_lists(paths)
+            data["version"] = FILTER_CACHE_VERSION
+            data["sources"] = sources
+            try:
+                tmp_file = FILTER_CACHE_FILE + ".tmp"
+                with open(tmp_file, 'wb') as f:
+                    marshal.dump(data, f)
+                os.replace(tmp_file, FILTER_CACHE_FILE)
+            except Exception as e:
+                print(f"Error saving filter cache: {e}")
+        self.matcher = FilterMatcher(data)
+        return self.matcher
+    
+    def compile_lists(self, paths):
+        data = {"blocked_domains": set(), "third_party_domains": set(), "allowed_domains": set()}
+        block_rules = []
+        allow_rules = []
+        for path in paths:
+            try:
+                with open(path, 'r', encoding='utf-8', errors='replace') as f:
+                    lines = f.read().splitlines()
+            except Exception as e:
+                print(f"Error reading filter list {path}: {e}")
+                continue
+            adblock = any(line.startswith(("[Adblock", "||", "@@")) for line in lines[:1000])
+            for line in lines:
+                line = line.strip().lower()
+                if adblock:
+                    self.compile_rule(line, data, block_rules, allow_rules)
+                else:
+                    self.compile_host(line, data)
+        # Each pattern goes under its least shared token, so no bucket gets
+        # long; patterns without a usable token go under "".
+        counts = collections.Counter()
+        for rules in (block_rules, allow_rules):
+            for tokens, rule in rules:
+                counts.update(tokens)
+        for key, rules in (("block_index", block_rules), ("allow_index", allow_rules)):
+            index = {}
+            for tokens, rule in rules:
+                token = min(tokens, key=counts.__getitem__) if tokens else ""
+                index.setdefault(token, []).append(rule)
+            data[key] = {token: "\n".join(rules) for token, rules in index.items()}
+        return data
+    
+    def compile_host(self, line, data):
+        fields = line.split("#", 1)[0].split()
+        if len(fields) >= 2 and fields[0] in HOSTS_ADDRESSES:
+            domains = fields[1:]
+        elif len(fields) == 1:
+            domains = fields
+        else:
+            return
+        for domain in domains:
+            if "." in domain and domain not in HOSTS_ADDRESSES:
+                data["blocked_domains"].add(domain.rstrip("."))
+    
+    def compile_rule(self, line, data, block_rules, allow_rules):
+        if not line or line.startswith(("!", "[")) or "##" in line or "#@#" in line or "#?#" in line:
+            return
+        exception = line.startswith("@@")
+        if exception:
+            line = line[2:]
+        pattern, _, options = line.partition("$")
+        if not pattern or (pattern.startswith("/") and pattern.endswith("/")) or " " in line or "\t" in line:
+            return
+        party = None
+        types = set()
+        excluded_types = set()
+        domains = set()
+        excluded_domains = set()
+        for option in filter(None, options.split(",")):
+            if option in ("third-party", "3p"):
+                party = True
+            elif option in ("~third-party", "1p", "first-party"):
+                party = False
+            elif option.startswith("domain="):
+                for domain in option[7:].split("|"):
+                    if domain.startswith("~"):
+                        excluded_domains.add(domain[1:])
+                    else:
+                        domains.add(domain)
+            elif option in FILTER_RESOURCE_TYPES:
+                types.add(option)
+            elif option.startswith("~") and option[1:] in FILTER_RESOURCE_TYPES:
+                excluded_types.add(option[1:])
+            elif option not in ("important", "match-case"):
+                return
+        host = pattern[2:-1] if pattern.startswith("||") and pattern.endswith("^") else None
+        if host and re.fullmatch(r"[a-z0-9.-]+", host) and not (types or excluded_types or domains or excluded_domains):
+            if exception:
+                if party is None:
+                    data["allowed_domains"].add(host)
+                    return
+            elif party is None:
+                data["blocked_domains"].add(host)
+                return
+            elif party:
+                data["third_party_domains"].add(host)
+                return
+        rule = "\t".join([filter_regex(pattern), "" if party is None else str(int(party)),
+                          ",".join(types), ",".join(excluded_types), "|".join(domains), "|".join(excluded_domains)])
+        (allow_rules if exception else block_rules).append((filter_tokens(pattern), rule))
+
+class RequestInterceptor(QtWebEngineCore.QWebEngineUrlRequestInterceptor):
+    """Blocks the subresource requests a page makes that match the content
+    filter. Each page has its own, since a request doesn't say which page
+    made it, so blocked counts that page's requests and no other's."""
+    blocked = QtCore.pyqtSignal()
+    
+    def __init__(self, content_filter, page):
+        super().__init__(page)
+        self.content_filter = content_filter
+        self.profile = page.profile()
+        self.enabled = True
+        info = QtWebEngineCore.QWebEngineUrlRequestInfo
+        self.main_frame = info.ResourceTypeMainFrame
+        self.type_names = {}
+        for name, resource_types in FILTER_RESOURCE_TYPES.items():
+            for resource_type in resource_types:
+                self.type_names[getattr(info, resource_type)] = name
+    
+    def interceptRequest(self, info):
+        matcher = self.content_filter.matcher
+        if not self.enabled or matcher is None:
+            return
+        resource_type = info.resourceType()
+        if resource_type == self.main_frame:
+            return
+        first_party_url = info.firstPartyUrl().toString()
+        if matcher.matches(info.requestUrl().toString(), first_party_url,
+                           self.type_names.get(resource_type, "other")):
+            info.block(True)
+            self.blocked.emit()
+
+class ProfileManager(QtCore.QObject):
+    """Creates the off-the-record profile each window browses with.
+    
+    Nothing such a profile loads is written to disk: the HTTP cache lives
+    in memory and cookies die with the window. Each profile's
+    downloadRequested is connected once, to its own window, instead of
+    once per view. Request interceptors are installed per page, by
+    intercept, and follow their profile's content blocking setting.
+    """
+    instance = None
+    
+    @classmethod
+    def shared(cls):
+        if cls.instance is None:
+            cls.instance = cls()
+        return cls.instance
+    
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.profiles = []
+        self.interceptors = []
+        self.content_blocking = {}
+    
+    def create_profile(self, window, cache_mb=0):
+        # A profile without a storage name is off the record.
+        profile = QtWebEngineWidgets.QWebEngineProfile(self)
+        profile.setHttpCacheType(QtWebEngineWidgets.QWebEngineProfile.MemoryHttpCache)
+        profile.setPersistentCookiesPolicy(QtWebEngineWidgets.QWebEngineProfile.NoPersistentCookies)
+        if hasattr(QtWebEngineWidgets.QWebEngineSettings, "DnsPrefetchEnabled"):
+            profile.settings().setAttribute(QtWebEngineWidgets.QWebEngineSettings.DnsPrefetchEnabled, True)
+        self.set_cache_size(profile, cache_mb)
+        profile.downloadRequested.connect(window.handle_download)
+        # Downloads made outside QtWebEngine send the profile's cookies.
+        network_manager = QtNetwork.QNetworkAccessManager(profile)
+        cookie_jar = QtNetwork.QNetworkCookieJar()
+        network_manager.setCookieJar(cookie_jar)
+        profile.cookieStore().cookieAdded.connect(cookie_jar.insertCookie)
+        profile.cookieStore().cookieRemoved.connect(cookie_jar.deleteCookie)
+        self.profiles.append(profile)
+        
+        # Pages must be gone before their profile is deleted. destroyed is
+        # emitted before the window's children (and so its views) are
+        # deleted, and the deferred delete runs after that.
+        window.destroyed.connect(profile.deleteLater)
+        profile.destroyed.connect(lambda: self.profiles.remove(profile))
+        profile.destroyed.connect(lambda: self.content_blocking.pop(profile, None))
+        return profile
     
-    def save_settings(self):
-        if self.parent_window:
-            self.parent_window.homepage = self.homepage_edit.text()
-            self.parent_window.zoom_level = self.zoom_spin.value()
-            self.parent_window.javascript_enabled = self.javascript_check.isChecked()
-            self.parent_window.images_enabled = self.images_check.isChecked()
-            self.parent_window.theme = self.theme_combo.currentText()
-            self.parent_window.apply_settings()
-        self.close()
+    def set_cache_size(self, profile, cache_mb):
+        # 0 lets QtWebEngine choose the size.
+        profile.setHttpCacheMaximumSize(cache_mb * 1024 * 1024)
+    
+    def network_manager(self, profile):
+        return profile.findChild(QtNetwork.QNetworkAccessManager)
+    
+    def intercept(self, page):
+        """Filter page's requests; returns the interceptor, whose blocked
+        signal fires for each request of page's that was blocked."""
+        interceptor = RequestInterceptor(ContentFilter.shared(), page)
+        interceptor.enabled = self.content_blocking.get(interceptor.profile, True)
+        page.setUrlRequestInterceptor(interceptor)
+        self.interceptors.append(interceptor)
+        interceptor.destroyed.connect(lambda: self.interceptors.remove(interceptor))
+        return interceptor
+    
+    def set_content_blocking(self, profile, enabled):
+        self.content_blocking[profile] = enabled
+        for interceptor in self.interceptors:
+            if interceptor.profile == profile:
+                interceptor.enabled = enabled
 
 class WebEngineView(QtWebEngineWidgets.QWebEngineView):
-    def __init__(self, parent=None):
+    def __init__(self, parent=None, profile=None):
         super().__init__(parent)
         self.parent_window = parent
-        profile = self.page().profile()
-        profile.downloadRequested.connect(self.handle_download)
+        self.recorded_url = None
+        # URL a pooled view was preloaded with.
+        self.warm_url = None
+        if profile is not None:
+            self.setPage(QtWebEngineWidgets.QWebEnginePage(profile, self))
+            interceptor = ProfileManager.shared().intercept(self.page())
+            if parent is not None:
+                interceptor.blocked.connect(lambda: parent.request_blocked(self))
     
     def createWindow(self, window_type):
         if self.parent_window:
-            return self.parent_window.create_new_tab()
+            return self.parent_window.create_popup_tab()
         return None
+
+def memory_pressure(threshold=0.1):
+    """True when less than threshold of physical memory is available.
     
-    def handle_download(self, download_item):
-        if self.parent_window:
-            self.parent_window.handle_download(download_item)
+    Only Linux reports this (through /proc/meminfo); elsewhere it's False.
+    """
+    try:
+        with open("/proc/meminfo", 'r') as f:
+            info = dict(line.split(":", 1) for line in f)
+        return int(info["MemAvailable"].split()[0]) < threshold * int(info["MemTotal"].split()[0])
+    except (OSError, KeyError, ValueError):
+        return False
 
-class MainWindow(QtWidgets.QMainWindow):
+class ViewPool(QtCore.QObject):
+    """Views built ahead of time so new tabs and popups open at once.
+    
+    The pool is refilled one view per zero-timeout tick, i.e. whenever the
+    event loop is otherwise idle. One pooled view is preloaded with the
+    homepage for Ctrl+T; the others have not navigated, so a tab or popup
+    taking one starts with an empty history.
+    """
+    def __init__(self, window, size=2):
+        super().__init__(window)
+        self.window = window
+        self.size = size
+        self.views = []
+        self.refill_timer = QtCore.QTimer(self)
+        self.refill_timer.setSingleShot(True)
+        self.refill_timer.setInterval(0)
+        self.refill_timer.timeout.connect(self.refill)
+    
+    def take(self, url=None):
+        """A pooled view already showing url, else a blank one, else None."""
+        candidates = [v for v in self.views if url and v.warm_url == url]
+        candidates += [v for v in self.views if v.warm_url is None]
+        if not candidates:
+            self.schedule_refill()
+            return None
+        view = candidates[0]
+        self.views.remove(view)
+        self.schedule_refill()
+        return view
+    
+    def schedule_refill(self):
+        if len(self.views) < self.size and not self.refill_timer.isActive():
+            self.refill_timer.start()
+    
+    def refill(self):
+        if len(self.views) >= self.size or memory_pressure():
+            return
+        view = self.window.build_view()
+        view.hide()
+        homepage = self.window.homepage
+        if homepage and not any(v.warm_url == homepage for v in self.views):
+            view.warm_url = homepage
+            view.setUrl(QtCore.QUrl(homepage))
+        self.views.append(view)
+        self.schedule_refill()
+    
+    def release(self):
+        self.refill_timer.stop()
+        for view in self.views:
+            view.deleteLater()
+        self.views = []
+    
+    def set_size(self, size):
+        """Resize the pool; it's also rebuilt, as settings may have changed."""
+        self.size = size
+        self.release()
+        self.schedule_refill()
+
+THEME_STYLESHEET = """
+    QMainWindow {
+        background: qlineargradient(x1:0, y1:0, x2:0, y2:1,
+                                   stop:0 %(window_top)s, stop:1 %(window_bottom)s);
+        border-radius: 8px;
+    }
+    QTabWidget::pane {
+        border: 1px solid %(pane_border)s;
+        border-radius: 4px;
+        background-color: %(pane)s;
+    }
+    QTabBar::tab {
+        padding: 10px 50px 10px 20px;
+        margin: 2px;
+        border-radius: 6px;
+        min-width: 100px;
+        font-size: 13px;
+        border: 1px solid %(tab_border)s;
+        background-color: %(tab)s;
+        color: %(tab_text)s;
+    }
+    QTabBar::tab:selected {
+        background-color: #2a9d8f;
+        color: white;
+        font-weight: bold;
+        border: none;
+    }
+    QTabBar::tab:!selected {
+        background-color: %(tab)s;
+    }
+    QTabBar::tab:hover {
+        background-color: %(tab_hover)s;
+        color: white;
+    }
+    QToolBar {
+        background: qlineargradient(x1:0, y1:0, x2:0, y2:1,
+                                   stop:0 %(bar_top)s, stop:1 %(bar_bottom)s);
+        border-bottom: 1px solid %(border)s;
+        padding: 8px;
+        spacing: 10px;
+    }
+    QToolBar QToolButton {
+        background-color: %(button)s;
+        border: 1px solid %(button_border)s;
+        border-radius: 6px;
+        padding: 8px;
+        color: %(button_text)s;
+        font-size: 14px;
+        font-weight: 500;
+    }
+    QToolBar QToolButton:hover {
+        background-color: %(button_hover)s;
+        border: 1px solid %(button_hover_border)s;
+        color: %(text)s;
+    }
+    QToolBar QToolButton:pressed {
+        background-color: #007bff;
+        color: white;
+        border: 1px solid #0056b3;
+    }
+    QLineEdit {
+        padding: 10px;
+        border: 1px solid %(border)s;
+        border-radius: 20px;
+        background-color: %(input)s;
+        color: %(text)s;
+        font-size: 14px;
+    }
+    QLineEdit:focus {
+        border: 1px solid #007bff;
+    }
+    QStatusBar {
+        background: qlineargradient(x1:0, y1:0, x2:0, y2:1,
+                                   stop:0 %(bar_top)s, stop:1 %(bar_bottom)s);
+        color: %(text)s;
+        border-top: 1px solid %(pane_border)s;
+        padding: 5px;
+    }
+    QProgressBar {
+        border: 1px solid %(border)s;
+        border-radius: 6px;
+        background-color: %(progress)s;
+        color: %(text)s;
+        text-align: center;
+        font-size: 12px;
+    }
+    QProgressBar::chunk {
+        background: qlineargradient(x1:0, y1:0, x2:1, y2:0,
+                                   stop:0 #007bff, stop:1 #00c4ff);
+        border-radius: 5px;
+    }
+    QMenuBar {
+        background: qlineargradient(x1:0, y1:0, x2:0, y2:1,
+                                   stop:0 %(bar_top)s, stop:1 %(bar_bottom)s);
+        color: %(text)s;
+        padding: 6px;
+    }
+    QMenuBar::item {
+        padding: 6px 12px;
+        border-radius: 4px;
+    }
+    QMenuBar::item:selected {
+        background-color: %(button_hover)s;
+    }
+    QMenu {
+        background-color: %(menu)s;
+        color: %(text)s;
+        border: 1px solid %(border)s;
+        border-radius: 6px;
+    }
+    QMenu::item {
+        padding: 6px 24px;
+    }
+    QMenu::item:selected {
+        background-color: #007bff;
+        color: white;
+    }
+    QDialog {
+        background-color: %(dialog)s;
+        border-radius: 8px;
+    }
+    QDialog QGroupBox {
+        font-weight: bold;
+        margin-top: 10px;
+    }
+    QDialog QPushButton {
+        padding: 8px 16px;
+        border-radius: 4px;
+        background-color: #007bff;
+        color: white;
+    }
+    QDialog QPushButton:hover {
+        background-color: #0056b3;
+    }
+    QDialog QPushButton:disabled {
+        background-color: %(button_hover)s;
+    }
+    QDialog QLineEdit, QDialog QSpinBox, QDialog QComboBox {
+        padding: 5px;
+        border: 1px solid %(border)s;
+        border-radius: 4px;
+        background-color: %(input)s;
+        color: %(text)s;
+    }
+    QDialog QTreeView, QDialog QListView {
+        background-color: %(input)s;
+        color: %(text)s;
+        border: 1px solid %(border)s;
+        border-radius: 4px;
+    }
+    QDialog QProgressBar {
+        border: 1px solid %(border)s;
+        border-radius: 4px;
+        text-align: center;
+    }
+    QDialog QProgressBar::chunk {
+        background-color: #007bff;
+        border-radius: 3px;
+    }
+"""
+
+# Colors for each theme: the stylesheet placeholders, the palette roles for
+# everything the stylesheet doesn't cover, and the painted tab close buttons.
+THEMES = {
+    "Light": {
+        "window_top": "#f5f7fa", "window_bottom": "#e2e6ea",
+        "pane": "white", "pane_border": "#dee2e6",
+        "tab": "#e0e4e8", "tab_border": "#adb5bd", "tab_text": "#333", "tab_hover": "#48b5a8",
+        "bar_top": "#f8f9fa", "bar_bottom": "#e9ecef", "border": "#dee2e6",
+        "button": "#e9ecef", "button_border": "#dee2e6", "button_text": "#212529",
+        "button_hover": "#d3d7db", "button_hover_border": "#adb5bd",
+        "input": "white", "text": "#212529", "progress": "#f1f3f5",
+        "menu": "#ffffff", "dialog": "#f5f7fa",
+        "close": "#e9ecef", "close_text": "#333",
+    },
+    "Dark": {
+        "window_top": "#2b2d31", "window_bottom": "#1f2124",
+        "pane": "#34363b", "pane_border": "#3f4147",
+        "tab": "#55575f", "tab_border": "#1f212d", "tab_text": "white", "tab_hover": "#677078",
+        "bar_top": "#1f212d", "bar_bottom": "#1f212d", "border": "#4a4c53",
+        "button": "#1f212d", "button_border": "#5c5e66", "button_text": "#d1d4d9",
+        "button_hover": "#5c5e66", "button_hover_border": "#6a6c74",
+        "input": "#3f4147", "text": "white", "progress": "#2b2d31",
+        "menu": "#1f212d", "dialog": "#2b2d31",
+        "close": "#3f4147", "close_text": "white",
+    },
+}
+DEFAULT_THEME = "Light"
+
+class ThemeManager(QtCore.QObject):
+    """Applies one theme to the whole application.
+    
+    Each theme is a QPalette plus THEME_STYLESHEET with its colors filled in,
+    set once on the QApplication so windows and dialogs don't carry
+    stylesheets of their own. Both are built the first time a theme is used
+    and kept; applying the theme that is already active does nothing.
+    """
+    instance = None
+    
+    @classmethod
+    def shared(cls):
+        if cls.instance is None:
+            cls.instance = cls()
+        return cls.instance
+    
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.name = DEFAULT_THEME
+        self.applied = None
+        self.compiled = {}
+    
+    def compile(self, name):
+        if name not in self.compiled:
+            colors = THEMES[name]
+            palette = QtGui.QPalette()
+            roles = [
+                (QtGui.QPalette.Window, colors["dialog"]),
+                (QtGui.QPalette.WindowText, colors["text"]),
+                (QtGui.QPalette.Base, colors["input"]),
+                (QtGui.QPalette.AlternateBase, colors["pane"]),
+                (QtGui.QPalette.Text, colors["text"]),
+                (QtGui.QPalette.Button, colors["button"]),
+                (QtGui.QPalette.ButtonText, colors["button_text"]),
+                (QtGui.QPalette.ToolTipBase, colors["menu"]),
+                (QtGui.QPalette.ToolTipText, colors["text"]),
+                (QtGui.QPalette.Highlight, "#007bff"),
+                (QtGui.QPalette.HighlightedText, "white"),
+            ]
+            for role, color in roles:
+                palette.setColor(role, QtGui.QColor(color))
+            self.compiled[name] = (palette, THEME_STYLESHEET % colors)
+        return self.compiled[name]
+    
+    def apply(self, name):
+        if name not in THEMES:
+            name = DEFAULT_THEME
+        self.name = name
+        if name == self.applied:
+            return
+        palette, stylesheet = self.compile(name)
+        app = QtWidgets.QApplication.instance()
+        app.setPalette(palette)
+        app.setStyleSheet(stylesheet)
+        self.applied = name
+    
+    def close_colors(self):
+        colors = THEMES[self.name]
+        return colors["close"], colors["close_text"]
+
+class TabBar(QtWidgets.QTabBar):
+    """Tab bar that paints each tab's close button itself.
+    
+    Tab button widgets make QTabBar lay out every tab again whenever one is
+    set, so a widget per tab turns opening many tabs quadratic. Painted
+    buttons keep adding a tab cheap with thousands of them open. The
+    stylesheet's right padding on QTabBar::tab leaves room for the button.
+    
+    Dimmed tabs (not loaded) are painted with grey text, since the
+    stylesheet's tab color wins over setTabTextColor.
+    """
+    close_size = 20
+    close_margin = 5
+    dim_color = QtGui.QColor("#868e96")
+    # Matches the font-size of QTabBar::tab in THEME_STYLESHEET.
+    dim_font_size = 13
+    
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.setMouseTracking(True)
+        self.hover_index = -1
+        self.pressed_index = -1
+        self.close_color = QtGui.QColor("#e9ecef")
+        self.close_text_color = QtGui.QColor("#333")
+        self.close_hover_color = QtGui.QColor("#ff4d4f")
+    
+    def set_close_colors(self, color, text_color):
+        self.close_color = QtGui.QColor(color)
+        self.close_text_color = QtGui.QColor(text_color)
+        self.update()
+    
+    def set_tab_dimmed(self, index, dimmed):
+        # Tab data, unlike the text color, doesn't relayout the tab bar.
+        self.setTabData(index, dimmed)
+        self.update()
+    
+    def close_rect(self, index):
+        rect = self.tabRect(index)
+        return QtCore.QRect(rect.right() - self.close_size - self.close_margin,
+                            rect.center().y() - self.close_size // 2 + 1,
+                            self.close_size, self.close_size)
+    
+    def close_index_at(self, pos):
+        i = self.tabAt(pos)
+        return i if i >= 0 and self.close_rect(i).contains(pos) else -1
+    
+    def paintEvent(self, event):
+        painter = QtWidgets.QStylePainter(self)
+        option = QtWidgets.QStyleOptionTab()
+        current = self.currentIndex()
+        # The current tab is painted last so it overlaps its neighbours.
+        for i in [i for i in range(self.count()) if i != current] + ([current] if current >= 0 else []):
+            if not self.tabRect(i).intersects(event.rect()):
+                continue
+            self.initStyleOption(option, i)
+            dimmed = self.tabData(i)
+            if dimmed:
+                text, option.text = option.text, ""
+            painter.drawControl(QtWidgets.QStyle.CE_TabBarTab, option)
+            if dimmed:
+                option.text = text
+                text_rect = self.style().subElementRect(QtWidgets.QStyle.SE_TabBarTabText, option, self)
+                font = QtGui.QFont(self.font())
+                font.setPixelSize(self.dim_font_size)
+                painter.setFont(font)
+                painter.setPen(self.dim_color)
+                painter.drawText(text_rect, QtCore.Qt.AlignCenter, text)
+                painter.setFont(self.font())
+            
+            rect = self.close_rect(i)
+            hovered = i == self.hover_index
+            painter.setRenderHint(QtGui.QPainter.Antialiasing)
+            painter.setPen(QtCore.Qt.NoPen)
+            painter.setBrush(self.close_hover_color if hovered else self.close_color)
+            painter.drawEllipse(rect)
+            painter.setPen(QtGui.QColor("white") if hovered else self.close_text_color)
+            painter.drawText(rect, QtCore.Qt.AlignCenter, "✖")
+    
+    def mouseMoveEvent(self, event):
+        i = self.close_index_at(event.pos())
+        if i != self.hover_index:
+            for index in (self.hover_index, i):
+                if 0 <= index < self.count():
+                    self.update(self.close_rect(index))
+            self.hover_index = i
+        super().mouseMoveEvent(event)
+    
+    def leaveEvent(self, event):
+        if 0 <= self.hover_index < self.count():
+            self.update(self.close_rect(self.hover_index))
+        self.hover_index = -1
+        super().leaveEvent(event)
+    
+    def mousePressEvent(self, event):
+        if event.button() == QtCore.Qt.LeftButton:
+            self.pressed_index = self.close_index_at(event.pos())
+            if self.pressed_index >= 0:
+                return
+        super().mousePressEvent(event)
+    
+    def mouseReleaseEvent(self, event):
+        if self.pressed_index >= 0:
+            i = self.pressed_index
+            self.pressed_index = -1
+            self.hover_index = -1
+            if self.close_index_at(event.pos()) == i:
+                self.tabCloseRequested.emit(i)
+            return
+        super().mouseReleaseEvent(event)
+
+class TabRegistry:
+    """A window's open tabs by their stable id.
+    
+    Also counts the tabs and views created for this window that have not
+    been destroyed yet, so anything leaked by closing tabs shows up.
+    """
     def __init__(self):
+        self.tabs = {}
+        self.live = collections.Counter()
+    
+    def __len__(self):
+        return len(self.tabs)
+    
+    def __iter__(self):
+        return iter(self.tabs.values())
+    
+    def get(self, tab_id):
+        return self.tabs.get(tab_id)
+    
+    def add(self, tab):
+        if tab.tab_id not in self.tabs:
+            self.track(tab, "tabs")
+        self.tabs[tab.tab_id] = tab
+    
+    def remove(self, tab):
+        self.tabs.pop(tab.tab_id, None)
+    
+    def track(self, obj, kind):
+        self.live[kind] += 1
+        obj.destroyed.connect(lambda: self.live.subtract([kind]))
+
+class BrowserTab(QtWidgets.QWidget):
+    """A tab's slot in the tab widget, whatever state its page is in.
+    
+    While active or frozen the tab holds a WebEngineView. A discarded tab
+    drops the view (and with it the renderer) and keeps only its URL, title
+    and serialized navigation history; browser() rebuilds the view from
+    those the next time the tab is shown.
+    """
+    lifecycle_supported = hasattr(QtWebEngineWidgets.QWebEnginePage, "setLifecycleState")
+    
+    def __init__(self, parent_window, url, title="New Tab", history_data=None, tab_id=None):
+        super().__init__()
+        self.parent_window = parent_window
+        self.tab_id = tab_id if tab_id is not None else SessionManager.shared().new_id()
+        self.url = url
+        self.title = title
+        self.history_data = history_data
+        self.view = None
+        self.state = "discarded"
+        # Load progress (0-100) while a page is loading, else None.
+        self.progress = None
+        # Requests the content filter blocked for the current page.
+        self.blocked_count = 0
+        # Set when the page changed since the session was last saved.
+        self.dirty = True
+        # Exempt tabs are never frozen or discarded automatically.
+        self.exempt = False
+        self.last_active = time.monotonic()
+        layout = QtWidgets.QVBoxLayout(self)
+        layout.setContentsMargins(0, 0, 0, 0)
+    
+    def browser(self):
+        """Return the live view, recreating it if the tab was discarded."""
+        if self.view is None:
+            self.view = self.parent_window.create_view(None if self.history_data else self.url)
+            self.view.urlChanged.connect(self.on_url_changed)
+            self.view.titleChanged.connect(self.on_title_changed)
+            self.view.loadProgress.connect(self.on_load_progress)
+            self.view.loadFinished.connect(self.on_load_finished)
+            self.layout().addWidget(self.view)
+            self.view.show()
+            if self.history_data:
+                self.restore_history()
+            elif self.view.warm_url is not None:
+                # Preloaded by the pool; pass on what its signals already said.
+                if self.view.title():
+                    self.view.titleChanged.emit(self.view.title())
+            elif self.url:
+                self.view.setUrl(QtCore.QUrl(self.url))
+            self.view.warm_url = None
+        elif self.state == "frozen":
+            self.view.page().setLifecycleState(QtWebEngineWidgets.QWebEnginePage.Active)
+        self.state = "active"
+        return self.view
+    
+    def on_url_changed(self, url):
+        url = url.toString()
+        if url.split("#")[0] != self.url.split("#")[0]:
+            self.blocked_count = 0
+        self.url = url
+        self.dirty = True
+        self.parent_window.tab_updated(self)
+    
+    def on_title_changed(self, title):
+        if title:
+            self.title = title
+        self.dirty = True
+        self.parent_window.record_visit(self, title)
+        self.parent_window.tab_updated(self)
+    
+    def on_load_progress(self, progress):
+        self.progress = progress if progress < 100 else None
+        self.parent_window.tab_updated(self)
+    
+    def on_load_finished(self, success):
+        self.progress = None
+        self.parent_window.tab_loaded(self, success)
+    
+    def session_record(self):
+        history = self.history_data
+        if self.view is not None:
+            try:
+                history = self.save_history()
+            except Exception as e:
+                print(f"Error saving tab history: {e}")
+        return {
+            "tab": self.tab_id,
+            "url": self.url,
+            "title": self.title,
+            "history": bytes(history.toBase64()).decode() if history else None,
+        }
+    
+    @classmethod
+    def from_session(cls, parent_window, record):
+        history = record.get("history")
+        history_data = QtCore.QByteArray.fromBase64(history.encode()) if history else None
+        return cls(parent_window, record["url"], record.get("title") or record["url"],
+                   history_data, tab_id=record["tab"])
+    
+    def touch(self):
+        self.last_active = time.monotonic()
+    
+    def idle_time(self):
+        return time.monotonic() - self.last_active
+    
+    def is_busy(self):
+        page = self.view.page() if self.view is not None else None
+        return page is not None and hasattr(page, "recentlyAudible") and page.recentlyAudible()
+    
+    def save_history(self):
+        data = QtCore.QByteArray()
+        stream = QtCore.QDataStream(data, QtCore.QIODevice.WriteOnly)
+        stream << self.view.history()
+        return data
+    
+    def restore_history(self):
+        stream = QtCore.QDataStream(self.history_data, QtCore.QIODevice.ReadOnly)
+        stream >> self.view.history()
+    
+    def freeze(self):
+        """Stop the page's timers and tasks but keep it in memory."""
+        if self.state != "active" or not self.lifecycle_supported:
+            return
+        self.view.page().setLifecycleState(QtWebEngineWidgets.QWebEnginePage.Frozen)
+        self.state = "frozen"
+    
+    def discard(self):
+        if self.view is None:
+            return
+        try:
+            self.history_data = self.save_history()
+        except Exception as e:
+            print(f"Error saving tab history: {e}")
+            self.history_data = None
+        self.release_view()
+        self.state = "discarded"
+    
+    def release_view(self):
+        # Deleting the view deletes its page, which ends the renderer.
+        self.view.setParent(None)
+        self.view.deleteLater()
+        self.view = None
+    
+    def teardown(self):
+        """Free the page and this tab once it has left the tab widget."""
+        if self.view is not None:
+            self.view.stop()
+            self.release_view()
+        self.state = "closed"
+        self.deleteLater()
+
+class MainWindow(QtWidgets.QMainWindow):
+    # Top-level windows have no Qt parent; this keeps them referenced so
+    # they are not garbage collected while open.
+    windows = []
+    
+    def __init__(self, session=None):
         super(MainWindow, self).__init__()
+        self.setAttribute(QtCore.Qt.WA_DeleteOnClose)
         self.setWindowTitle("Pyser - Advanced Python Browser")
-        
-        logo_path = "pyser_logo.ico"
-        if not os.path.exists(logo_path):
-            logo_path = "pyser_logo.png"
-        if os.path.exists(logo_path):
-            print(f"Loading logo from: {os.path.abspath(logo_path)}")
-            self.setWindowIcon(QtGui.QIcon(logo_path))
-        else:
-            print(f"Warning: Logo file '{logo_path}' not found. Using default icon.")
-        
-        self.bookmark_manager = BookmarkManager()
-        self.history_manager = HistoryManager()
-        self.download_manager = DownloadManager(self)
+        # The window uses the application icon set in main().
+        self.downloads_dialog = None
+        # HEAD replies for downloads SegmentedDownload might take over.
+        self.download_probes = {}
+        # Set while a batch this window started is being archived.
+        self.archiving = False
+        PageArchive.shared().finished.connect(self.archive_finished)
         
         self.homepage = 'https://duckduckgo.com'
         self.zoom_level = 100
         self.javascript_enabled = True
         self.images_enabled = True
-        self.theme = 'Light'
+        self.theme = ThemeManager.shared().name
+        self.history_retention_days = 0
+        self.history_archive_limit_mb = 0
+        self.tab_freeze_minutes = 5
+        self.tab_discard_minutes = 30
+        self.private_cache_mb = 64
+        
+        self.prerender_enabled = False
+        self.content_blocking_enabled = True
+        self.max_active_downloads = 3
+        self.download_limit_kb = 0
+        self.view_pool_size = 2
+        self.load_settings()
+        
+        self.profile = ProfileManager.shared().create_profile(self, self.private_cache_mb)
+        ProfileManager.shared().set_content_blocking(self.profile, self.content_blocking_enabled)
+        self.speculative_loader = SpeculativeLoader(self.profile, self)
+        self.speculative_loader.set_prerender_enabled(self.prerender_enabled)
+        DownloadScheduler.shared().set_limits(self.max_active_downloads, self.download_limit_kb * 1024)
+        self.view_pool = ViewPool(self, self.view_pool_size)
         
         self.setup_ui()
         self.apply_theme()
-        self.showMaximized()
         
-        self.create_new_tab(self.homepage, "New Tab")
+        session_manager = SessionManager.shared()
+        if session:
+            self.session_id = session["id"]
+            self.restore_session(session)
+        else:
+            self.session_id = session_manager.new_id()
+            self.showMaximized()
+            self.create_new_tab(self.homepage, "New Tab")
+        MainWindow.windows.append(self)
+        session_manager.register(self)
+        self.view_pool.schedule_refill()
         
-        self.status_timer = QtCore.QTimer()
+        self.status_timer = QtCore.QTimer(self)
         self.status_timer.timeout.connect(self.clear_status)
-
+        
+        self.lifecycle_timer = QtCore.QTimer(self)
+        self.lifecycle_timer.setInterval(30000)
+        self.lifecycle_timer.timeout.connect(self.update_tab_lifecycle)
+        self.lifecycle_timer.start()
+    
+    def closeEvent(self, event):
+        # Closing one of several windows drops it from the session; the last
+        # window's tabs are kept for the next start.
+        if self in MainWindow.windows:
+            MainWindow.windows.remove(self)
+        session_manager = SessionManager.shared()
+        if MainWindow.windows:
+            session_manager.close_window(self)
+        else:
+            session_manager.flush()
+            session_manager.unregister(self)
+        if SharedStorage.instance is not None:
+            SharedStorage.instance.flush()
+        super().closeEvent(event)
+    
+    # Storage and the downloads dialog are created on first use so they
+    # stay out of the way of the first paint.
+    @property
+    def storage(self):
+        return SharedStorage.shared()
+    
+    @property
+    def bookmark_manager(self):
+        return self.storage.bookmark_manager
+    
+    @property
+    def history_manager(self):
+        return self.storage.history_manager
+    
+    @property
+    def download_manager(self):
+        if self.downloads_dialog is None:
+            self.downloads_dialog = DownloadManager(self)
+        return self.downloads_dialog
+    
     def keyPressEvent(self, event):
         """Handle key press events, specifically Escape to exit full-screen."""
         if event.key() == QtCore.Qt.Key_Escape and self.isFullScreen():
@@ -498,123 +5074,26 @@ class MainWindow(QtWidgets.QMainWindow):
             event.ignore()
     
     def setup_ui(self):
-        self.setStyleSheet("""
-            QMainWindow {
-                background: qlineargradient(x1:0, y1:0, x2:0, y2:1, 
-                                           stop:0 #f5f7fa, stop:1 #e2e6ea);
-                border-radius: 8px;
-            }
-            QTabWidget::pane {
-                border: 1px solid #dee2e6;
-                border-radius: 4px;
-                background-color: white;
-            }
-            QTabBar::tab {
-                padding: 10px 20px;
-                margin: 2px;
-                border-radius: 6px;
-                min-width: 100px;
-                font-size: 13px;
-                border: 1px solid #adb5bd;
-                background-color: #e0e4e8;
-                color: #333;
-            }
-            QTabBar::tab:selected {
-                background-color: #2a9d8f;
-                color: white;
-                font-weight: bold;
-                border: none;
-            }
-            QTabBar::tab:!selected {
-                background-color: #e0e4e8;
-            }
-            QTabBar::tab:hover {
-                background-color: #48b5a8;
-                color: white;
-            }
-            QPushButton#tabCloseButton {
-                width: 20px;
-                height: 20px;
-                background: #e9ecef;
-                border: none;
-                border-radius: 10px;
-                font-size: 12px;
-                color: #333;
-                padding: 0px;
-                margin-right: 5px;
-            }
-            QPushButton#tabCloseButton:hover {
-                background: #ff4d4f;
-                color: white;
-            }
-            QToolBar {
-                background: qlineargradient(x1:0, y1:0, x2:0, y2:1, 
-                                           stop:0 #f8f9fa, stop:1 #e9ecef);
-                border-bottom: 1px solid #dee2e6;
-                padding: 8px;
-                spacing: 10px;
-            }
-            QToolBar QToolButton {
-                background-color: #e9ecef;
-                border: 1px solid #dee2e6;
-                border-radius: 6px;
-                padding: 8px;
-                font-size: 14px;
-                font-weight: 500;
-            }
-            QToolBar QToolButton:hover {
-                background-color: #d3d7db;
-                border: 1px solid #adb5bd;
-            }
-            QToolBar QToolButton:pressed {
-                background-color: #007bff;
-                color: white;
-                border: 1px solid #0056b3;
-            }
-            QLineEdit {
-                padding: 10px;
-                border: 1px solid #dee2e6;
-                border-radius: 20px;
-                background-color: white;
-                font-size: 14px;
-            }
-            QLineEdit:focus {
-                border: 1px solid #007bff;
-            }
-            QStatusBar {
-                background: qlineargradient(x1:0, y1:0, x2:0, y2:1, 
-                                           stop:0 #f8f9fa, stop:1 #e9ecef);
-                border-top: 1px solid #dee2e6;
-                padding: 5px;
-            }
-            QProgressBar {
-                border: 1px solid #dee2e6;
-                border-radius: 6px;
-                background-color: #f1f3f5;
-                text-align: center;
-                font-size: 12px;
-            }
-            QProgressBar::chunk {
-                background: qlineargradient(x1:0, y1:0, x2:1, y2:0, 
-                                           stop:0 #007bff, stop:1 #00c4ff);
-                border-radius: 5px;
-            }
-        """)
-        
         self.tabs = QtWidgets.QTabWidget()
+        self.tabs.setTabBar(TabBar())
         self.tabs.setDocumentMode(True)
         self.tabs.tabBarDoubleClicked.connect(self.tab_open_doubleclick)
         self.tabs.currentChanged.connect(self.current_tab_changed)
-        self.tabs.setTabsClosable(True)
-        self.tabs.tabCloseRequested.connect(self.close_current_tab)
+        self.tabs.tabBar().tabCloseRequested.connect(self.close_current_tab)
+        self.tabs.tabBar().setContextMenuPolicy(QtCore.Qt.CustomContextMenu)
+        self.tabs.tabBar().customContextMenuRequested.connect(self.show_tab_menu)
+        self.active_tab = None
+        self.tab_registry = TabRegistry()
         
-        # Ensure close buttons are set for existing tabs
-        tab_bar = self.tabs.tabBar()
-        for i in range(tab_bar.count()):
-            close_button = QtWidgets.QPushButton("✖")
-            close_button.setObjectName("tabCloseButton")
-            close_button.clicked.connect(lambda checked, index=i: self.close_current_tab(index))
-            tab_bar.setTabButton(i, tab_bar.RightSide, close_button)
+        # At most one repaint of the tab labels and chrome per frame.
+        self.updated_tabs = set()
+        self.update_timer = QtCore.QTimer(self)
+        self.update_timer.setSingleShot(True)
+        self.update_timer.setInterval(16)
+        self.update_timer.timeout.connect(self.flush_tab_updates)
+        # The current tab's URL as last put in the url bar; the bar is left
+        # alone otherwise, so typing there survives progress and title updates.
+        self.shown_url = None
         
         self.setCentralWidget(self.tabs)
         
@@ -629,183 +5108,16 @@ class MainWindow(QtWidgets.QMainWindow):
         self.create_navigation_toolbar()
     
     def apply_theme(self):
-        if self.theme == 'Dark':
-            dark_style = """
-                QMainWindow {
-                    background: qlineargradient(x1:0, y1:0, x2:0, y2:1, 
-                                               stop:0 #2b2d31, stop:1 #1f2124);
-                    border-radius: 8px;
-                }
-                QTabWidget::pane {
-                    border: 1px solid #3f4147;
-                    background-color: #34363b;
-                }
-                QTabBar::tab {
-                    background-color: #1f212d;
-                    color: white;
-                    padding: 10px 20px;
-                    margin: 2px;
-                    border-radius: 6px;
-                    min-width: 100px;
-                    font-size: 13px;
-                    border: 1px solid #1f212d;
-                }
-                QTabBar::tab:selected {
-                    background-color: #2a9d8f;
-                    color: white;
-                    font-weight: bold;
-                    border: none;
-                }
-                QTabBar::tab:!selected {
-                    background-color: #55575f;
-                }
-                QTabBar::tab:hover {
-                    background-color: #677078;
-                }
-                QPushButton#tabCloseButton {
-                    width: 20px;
-                    height: 20px;
-                    background: #3f4147;
-                    border: none;
-                    border-radius: 10px;
-                    font-size: 12px;
-                    color: white;
-                    padding: 0px;
-                    margin-right: 5px;
-                }
-                QPushButton#tabCloseButton:hover {
-                    background: #ff4d4f;
-                }
-                QToolBar {
-                    background: qlineargradient(x1:0, y1:0, x2:0, y2:1, 
-                                               stop:0 #1f212d, stop:1 #1f212d);
-                    border-bottom: 1px solid #4a4c53;
-                    padding: 8px;
-                    spacing: 10px;
-                }
-                QToolBar QToolButton {
-                    background-color: #1f212d;
-                    border: 1px solid #5c5e66;
-                    border-radius: 6px;
-                    padding: 8px;
-                    color: #d1d4d9;
-                    font-size: 14px;
-                    font-weight: 500;;
-                }
-                QToolBar QToolButton:hover {
-                    background-color: #5c5e66;
-                    border: 1px solid #6a6c74;
-                    color: #ffffff;
-                }
-                QToolBar QToolButton:pressed {
-                    background-color: #007bff;
-                    border: 1px solid #0056b3;
-                    color: #ffffff;
-                }
-                QLineEdit {
-                    background-color: #3f4147;
-                    color: white;
-                    border: 1px solid #4a4c53;
-                    border-radius: 20px;
-                    padding: 10px;
-                    font-size: 14px;
-                }
-                QLineEdit:focus {
-                    border: 1px solid #007bff;
-                }
-                QStatusBar {
-                    background:#1f212d;
-                    color: white;
-                    border-top: 1px solid #3f4147;
-                    padding: 5px;
-                }
-                QProgressBar {
-                    border: 1px solid #4a4c53;
-                    background-color: #2b2d31;
-                    color: white;
-                    border-radius: 6px;
-                    text-align: center;
-                    font-size: 12px;
-                }
-                QProgressBar::chunk {
-                    background: qlineargradient(x1:0, y1:0, x2:1, y2:0, 
-                                               stop:0 #007bff, stop:1 #00c4ff);
-                    border-radius: 5px;
-                }
-                QMenuBar {
-                    background: #1f212d);
-                    color: white;
-                    padding: 6px;
-                }
-                QMenuBar::item {
-                    padding: 6px 12px;
-                    border-radius: 4px;
-                }
-                QMenuBar::item:selected {
-                    background-color: #4a4c53;
-                }
-                QMenu {
-                    background-color: #1f212d;
-                    color: white;
-                    border: 1px solid #4a4c53;
-                    border-radius: 6px;
-                }
-                QMenu::item {
-                    padding: 6px 24px;
-                }
-                QMenu::item:selected {
-                    background-color: #007bff;
-                }
-            """
-            self.setStyleSheet(dark_style)
-            
-            # Reapply close buttons for dark theme
-            tab_bar = self.tabs.tabBar()
-            for i in range(tab_bar.count()):
-                close_button = QtWidgets.QPushButton("✖")
-                close_button.setObjectName("tabCloseButton")
-                close_button.clicked.connect(lambda checked, index=i: self.close_current_tab(index))
-                tab_bar.setTabButton(i, tab_bar.RightSide, close_button)
-        else:
-            self.setStyleSheet(self.styleSheet())
-            
-            # Reapply close buttons for light theme
-            tab_bar = self.tabs.tabBar()
-            for i in range(tab_bar.count()):
-                close_button = QtWidgets.QPushButton("✖")
-                close_button.setObjectName("tabCloseButton")
-                close_button.clicked.connect(lambda checked, index=i: self.close_current_tab(index))
-                tab_bar.setTabButton(i, tab_bar.RightSide, close_button)
+        theme_manager = ThemeManager.shared()
+        theme_manager.apply(self.theme)
+        # The theme belongs to the application, so every window follows it.
+        close_colors = theme_manager.close_colors()
+        for window in set(MainWindow.windows) | {self}:
+            window.theme = theme_manager.name
+            window.tabs.tabBar().set_close_colors(*close_colors)
     
     def create_menu_bar(self):
         menubar = self.menuBar()
-        menubar.setStyleSheet("""
-            QMenuBar {
-                background: qlineargradient(x1:0, y1:0, x2:0, y2:1, 
-                                           stop:0 #f8f9fa, stop:1 #e9ecef);
-                padding: 6px;
-            }
-            QMenuBar::item {
-                padding: 6px 12px;
-                border-radius: 4px;
-            }
-            QMenuBar::item:selected {
-                background-color: #d3d7db;
-            }
-            QMenu {
-                background-color: #ffffff;
-                border: 1px solid #dee2e6;
-                border-radius: 6px;
-            }
-            QMenu::item {
-                padding: 6px 24px;
-            }
-            QMenu::item:selected {
-                background-color: #007bff;
-                color: white;
-            }
-        """)
-        
         file_menu = menubar.addMenu("File")
         
         new_tab_action = QtWidgets.QAction("New Tab", self)
@@ -825,6 +5137,18 @@ class MainWindow(QtWidgets.QMainWindow):
         save_page_action.triggered.connect(self.save_page)
         file_menu.addAction(save_page_action)
         
+        archive_action = QtWidgets.QAction("Archive All Tabs", self)
+        archive_action.triggered.connect(self.archive_all_tabs)
+        file_menu.addAction(archive_action)
+        
+        open_archive_action = QtWidgets.QAction("Open Archived Page...", self)
+        open_archive_action.triggered.connect(self.open_archived_page)
+        file_menu.addAction(open_archive_action)
+        
+        import_action = QtWidgets.QAction("Import Browser Data...", self)
+        import_action.triggered.connect(self.import_browser_data)
+        file_menu.addAction(import_action)
+        
         file_menu.addSeparator()
         
         exit_action = QtWidgets.QAction("Exit", self)
@@ -924,38 +5248,68 @@ class MainWindow(QtWidgets.QMainWindow):
         self.url_bar.setMinimumWidth(500)
         navbar.addWidget(self.url_bar)
         
+        self.omnibox = Omnibox(self.url_bar, self)
+        self.omnibox.url_selected.connect(self.navigate_to_url)
+        self.omnibox.predictions_changed.connect(self.predict_navigation)
+        
         bookmark_btn = QtWidgets.QAction("⭐ Bookmark", self)
         bookmark_btn.triggered.connect(self.add_bookmark)
         navbar.addAction(bookmark_btn)
     
     def current_browser(self):
-        return self.tabs.currentWidget()
+        tab = self.tabs.currentWidget()
+        return tab.browser() if tab else None
+    
+    def build_view(self):
+        browser = WebEngineView(self, self.profile)
+        self.tab_registry.track(browser, "views")
+        self.apply_browser_settings(browser)
+        return browser
+    
+    def create_view(self, url=None):
+        return self.view_pool.take(url) or self.build_view()
     
     def create_new_tab(self, url=None, label="New Tab"):
         if url is None:
             url = self.homepage
         
-        browser = WebEngineView(self)
-        browser.setUrl(QtCore.QUrl(url))
-        
-        browser.urlChanged.connect(self.update_url)
-        browser.loadFinished.connect(self.on_load_finished)
-        browser.loadProgress.connect(self.on_load_progress)
-        browser.titleChanged.connect(self.update_title)
-        
-        i = self.tabs.addTab(browser, label)
+        tab = BrowserTab(self, url, label)
+        i = self.add_tab(tab)
         self.tabs.setCurrentIndex(i)
+        return tab.browser()
+    
+    def create_popup_tab(self):
+        # QtWebEngine loads the popup into the returned view itself.
+        return self.create_new_tab("", "New Tab")
+    
+    def tab_label(self, title):
+        return title[:20] + "..." if len(title) > 20 else title
+    
+    def add_tab(self, tab):
+        self.tab_registry.add(tab)
+        i = self.tabs.addTab(tab, self.tab_label(tab.title))
+        if tab.view is None:
+            self.tabs.tabBar().set_tab_dimmed(i, True)
+        return i
+    
+    def restore_session(self, session):
+        """Recreate saved tabs as placeholders; only the current one loads."""
+        self.tabs.blockSignals(True)
+        for record in session["tabs"]:
+            tab = BrowserTab.from_session(self, record)
+            tab.dirty = False
+            self.add_tab(tab)
+        self.tabs.blockSignals(False)
+        current = max(self.tabs.indexOf(self.tab_registry.get(session.get("current"))), 0)
+        self.tabs.setCurrentIndex(current)
+        self.current_tab_changed(current)
         
-        # Add custom close button
-        tab_bar = self.tabs.tabBar()
-        close_button = QtWidgets.QPushButton("✖")
-        close_button.setObjectName("tabCloseButton")
-        close_button.clicked.connect(lambda checked, index=i: self.close_current_tab(index))
-        tab_bar.setTabButton(i, tab_bar.RightSide, close_button)
-        
-        self.apply_browser_settings(browser)
-        
-        return browser
+        # Showing the window last lets the tab bar lay out all tabs once.
+        geometry = session.get("geometry")
+        if geometry and self.restoreGeometry(QtCore.QByteArray.fromBase64(geometry.encode())):
+            self.show()
+        else:
+            self.showMaximized()
     
     def apply_browser_settings(self, browser):
         settings = browser.settings()
@@ -963,13 +5317,68 @@ class MainWindow(QtWidgets.QMainWindow):
         settings.setAttribute(QtWebEngineWidgets.QWebEngineSettings.AutoLoadImages, self.images_enabled)
         browser.setZoomFactor(self.zoom_level / 100.0)
     
+    def load_settings(self):
+        settings = read_settings_file()
+        for name in SAVED_SETTINGS:
+            if name in settings:
+                setattr(self, name, settings[name])
+    
     def apply_settings(self):
         for i in range(self.tabs.count()):
-            browser = self.tabs.widget(i)
-            self.apply_browser_settings(browser)
+            browser = self.tabs.widget(i).view
+            if browser is not None:
+                self.apply_browser_settings(browser)
+        self.history_manager.set_retention(self.history_retention_days, self.history_archive_limit_mb)
+        ProfileManager.shared().set_cache_size(self.profile, self.private_cache_mb)
+        self.speculative_loader.set_prerender_enabled(self.prerender_enabled)
+        ProfileManager.shared().set_content_blocking(self.profile, self.content_blocking_enabled)
+        DownloadScheduler.shared().set_limits(self.max_active_downloads, self.download_limit_kb * 1024)
+        self.view_pool.set_size(self.view_pool_size)
         self.apply_theme()
     
+    def import_browser_data(self):
+        path, _ = QtWidgets.QFileDialog.getOpenFileName(
+            self, "Import Browser Data", os.path.expanduser("~"),
+            "Browser profile files (places.sqlite History Bookmarks);;All files (*)")
+        if not path:
+            return
+        
+        self.imported_bookmarks = 0
+        self.importer = BrowserImporter(path, self.history_manager, self)
+        self.import_progress = QtWidgets.QProgressDialog("Importing browser data...", "Cancel", 0, 0, self)
+        self.import_progress.setWindowTitle("Import")
+        self.import_progress.setMinimumDuration(0)
+        self.import_progress.canceled.connect(self.importer.cancel)
+        self.importer.progress.connect(self.update_import_progress)
+        self.importer.bookmarks_found.connect(self.import_bookmark_batch)
+        self.importer.failed.connect(lambda message: QtWidgets.QMessageBox.warning(self, "Import", message))
+        self.importer.finished.connect(self.import_finished)
+        self.import_progress.show()
+        self.importer.start()
+    
+    def update_import_progress(self, done, total):
+        self.import_progress.setMaximum(total)
+        self.import_progress.setValue(done)
+    
+    def import_bookmark_batch(self, bookmarks):
+        self.imported_bookmarks += self.bookmark_manager.import_bookmarks(bookmarks)
+    
+    def import_finished(self, imported_history):
+        self.history_manager.finish_import()
+        self.import_progress.close()
+        self.status_bar.showMessage(
+            f"Imported {imported_history} history entries and {self.imported_bookmarks} bookmarks", 5000)
+    
     def handle_download(self, download_item):
+        if download_item.savePageFormat() != QtWebEngineWidgets.QWebEngineDownloadItem.UnknownSaveFormat:
+            # Started by save_page or the archive, with the path already chosen.
+            if not PageArchive.shared().claim(download_item):
+                download_item.accept()
+                self.download_manager.add_download(download_item)
+                DownloadScheduler.shared().add(download_item)
+                self.status_bar.showMessage(f"Saving {os.path.basename(download_item.path())}", 5000)
+            return
+        
         suggested_path = download_item.path()
         save_path, _ = QtWidgets.QFileDialog.getSaveFileName(self, "Save File", suggested_path)
         if not save_path:
@@ -978,73 +5387,229 @@ class MainWindow(QtWidgets.QMainWindow):
         
         download_item.setPath(save_path)
         download_item.accept()
-        
-        self.download_manager.add_download(download_item)
+        if download_item.url().scheme() in ("http", "https"):
+            self.probe_download(download_item)
+        else:
+            self.download_manager.add_download(download_item)
+            DownloadScheduler.shared().add(download_item)
         self.download_manager.show()
         
-        self.status_bar.showMessage(f"Downloading {download_item.path().split('/')[-1]}", 5000)
+        self.status_bar.showMessage(f"Downloading {os.path.basename(save_path)}", 5000)
+    
+    def probe_download(self, download_item):
+        """Check whether SegmentedDownload can take over download_item.
+        
+        The engine keeps the download, which may have come from a POST or
+        need HTTP auth, unless a plain GET (as a HEAD) gets a file of the
+        same size and type from a server that takes ranges.
+        """
+        headers = {"User-Agent": self.profile.httpUserAgent()}
+        page = download_item.page() if hasattr(download_item, "page") else None
+        if page is not None and page.url().scheme() in ("http", "https"):
+            headers["Referer"] = page.url().toString()
+        request = QtNetwork.QNetworkRequest(download_item.url())
+        request.setAttribute(QtNetwork.QNetworkRequest.FollowRedirectsAttribute, True)
+        for name, value in headers.items():
+            request.setRawHeader(name.encode('latin-1'), value.encode('latin-1'))
+        reply = ProfileManager.shared().network_manager(self.profile).head(request)
+        # Held until it finishes, or the garbage collector can take the
+        # reply along with the lambda connected to it.
+        self.download_probes[reply] = (download_item, headers)
+        reply.finished.connect(lambda: self.download_probed(reply))
+    
+    def download_probed(self, reply):
+        download_item, headers = self.download_probes.pop(reply)
+        reply.deleteLater()
+        status = reply.attribute(QtNetwork.QNetworkRequest.HttpStatusCodeAttribute)
+        length = reply.header(QtNetwork.QNetworkRequest.ContentLengthHeader)
+        total = int(length) if length is not None else -1
+        mime_type = (reply.header(QtNetwork.QNetworkRequest.ContentTypeHeader) or "").split(";")[0].strip().lower()
+        hand_off = (
+            download_item.state() == QtWebEngineWidgets.QWebEngineDownloadItem.DownloadInProgress
+            and reply.error() == QtNetwork.QNetworkReply.NoError and status and 200 <= status < 300
+            and bytes(reply.rawHeader(b"Accept-Ranges")).strip().lower() == b"bytes"
+            # A single segment gains nothing over the engine.
+            and total >= 2 * SegmentedDownload.min_segment_size
+            and download_item.totalBytes() in (-1, 0, total)
+            and (not mime_type or not download_item.mimeType() or mime_type == download_item.mimeType().lower())
+        )
+        if not hand_off:
+            self.download_manager.add_download(download_item)
+            if not download_item.isFinished():
+                DownloadScheduler.shared().add(download_item)
+            return
+        # Fetched again by SegmentedDownload, which can use several
+        # connections and resume.
+        save_path = download_item.path()
+        download_item.cancel()
+        download = SegmentedDownload(ProfileManager.shared().network_manager(self.profile),
+                                     reply.url(), save_path, {"headers": headers}, self.download_manager.model)
+        self.download_manager.add_download(download)
+        DownloadScheduler.shared().add(download)
+    
+    def resume_downloads(self):
+        pending = read_pending_downloads()
+        for path, state in pending.items():
+            download = SegmentedDownload(ProfileManager.shared().network_manager(self.profile),
+                                         state["url"], path, state, self.download_manager.model)
+            self.download_manager.add_download(download)
+            DownloadScheduler.shared().add(download)
+        resumed = sum(1 for state in pending.values() if not state.get("paused"))
+        if resumed:
+            self.status_bar.showMessage(f"Resuming {resumed} downloads", 5000)
     
     def tab_open_doubleclick(self, i):
         if i == -1:
             self.create_new_tab()
     
     def current_tab_changed(self, i):
+        if self.active_tab is not None:
+            self.active_tab.touch()
         if i >= 0:
-            browser = self.tabs.widget(i)
-            if browser:
-                self.update_url(browser.url())
+            tab = self.tabs.widget(i)
+            if tab:
+                self.active_tab = tab
+                tab.touch()
+                self.tabs.tabBar().set_tab_dimmed(i, False)
+                tab.browser()
+                self.shown_url = None
+                self.update_chrome(tab)
+    
+    def update_tab_lifecycle(self):
+        """Freeze, then discard, background tabs that have sat idle too long."""
+        if memory_pressure():
+            self.view_pool.release()
+        for i in range(self.tabs.count()):
+            tab = self.tabs.widget(i)
+            if tab is self.tabs.currentWidget() or tab.exempt or tab.is_busy():
+                continue
+            idle_minutes = tab.idle_time() / 60
+            if self.tab_discard_minutes and idle_minutes >= self.tab_discard_minutes:
+                self.discard_tab(i)
+            elif self.tab_freeze_minutes and idle_minutes >= self.tab_freeze_minutes:
+                tab.freeze()
+    
+    def discard_tab(self, i):
+        tab = self.tabs.widget(i)
+        if tab is None or tab is self.tabs.currentWidget():
+            return
+        tab.discard()
+        self.tabs.tabBar().set_tab_dimmed(i, True)
+    
+    def show_tab_menu(self, pos):
+        i = self.tabs.tabBar().tabAt(pos)
+        tab = self.tabs.widget(i)
+        if tab is None:
+            return
+        menu = QtWidgets.QMenu(self)
+        keep_action = menu.addAction("Keep Tab Active")
+        keep_action.setCheckable(True)
+        keep_action.setChecked(tab.exempt)
+        keep_action.toggled.connect(lambda checked: setattr(tab, "exempt", checked))
+        discard_action = menu.addAction("Discard Tab")
+        discard_action.setEnabled(tab.view is not None and tab is not self.tabs.currentWidget())
+        discard_action.triggered.connect(lambda: self.discard_tab(self.tabs.indexOf(tab)))
+        menu.exec_(self.tabs.tabBar().mapToGlobal(pos))
     
     def close_current_tab(self, i):
-        if self.tabs.count() > 1:
-            self.tabs.removeTab(i)
-        else:
+        tab = self.tabs.widget(i)
+        if tab is None:
+            return
+        if self.tabs.count() == 1:
             self.create_new_tab()
-            self.tabs.removeTab(i)
+        self.tabs.removeTab(self.tabs.indexOf(tab))
+        self.tab_registry.remove(tab)
+        self.updated_tabs.discard(tab)
+        if self.active_tab is tab:
+            self.active_tab = None
+        tab.teardown()
     
     def navigate_home(self):
         self.current_browser().setUrl(QtCore.QUrl(self.homepage))
     
-    def navigate_web(self):
-        url = self.url_bar.text().strip()
-        if not url:
-            return
-        
-        if not url.startswith(('http://', 'https://')):
+    def typed_url(self, text):
+        url = text.strip()
+        if url and not url.startswith(('http://', 'https://')):
             if '.' in url and ' ' not in url:
                 url = f'https://{url}'
             else:
                 url = f'https://duckduckgo.com/?q={url.replace(" ", "+")}'
+        return url
+    
+    def navigate_web(self):
+        url = self.omnibox.resolve(self.url_bar.text()) or self.typed_url(self.url_bar.text())
+        if not url:
+            return
         
         self.navigate_to_url(url)
     
     def navigate_to_url(self, url):
+        self.speculative_loader.navigated(url)
         self.current_browser().setUrl(QtCore.QUrl(url))
     
-    def update_url(self, url):
-        self.url_bar.setText(url.toString())
+    def predict_navigation(self, text, urls, likely_url):
+        if not text.strip():
+            self.speculative_loader.cancel()
+            return
+        self.speculative_loader.predict(urls or [self.typed_url(text)], likely_url)
     
-    def update_title(self, title):
-        index = self.tabs.currentIndex()
-        if title:
-            self.tabs.setTabText(index, title[:20] + "..." if len(title) > 20 else title)
-            self.setWindowTitle(f"{title} - Pyser")
-        
-        current_url = self.current_browser().url().toString()
+    def record_visit(self, tab, title):
+        browser = tab.view
+        current_url = browser.url().toString()
         if current_url and not current_url.startswith('data:'):
-            self.history_manager.add_to_history(title or "Untitled", current_url)
+            # Title changes on the same page update the entry without counting
+            # as another visit.
+            new_visit = current_url != browser.recorded_url
+            browser.recorded_url = current_url
+            self.history_manager.add_to_history(title or "Untitled", current_url, new_visit)
     
-    def on_load_finished(self, success):
-        self.progress_bar.setVisible(False)
-        if success:
-            self.status_bar.showMessage("Page loaded successfully", 2000)
-        else:
-            self.status_bar.showMessage("Failed to load page", 3000)
+    def tab_updated(self, tab):
+        """Note a change to tab's page; the UI catches up on the next frame.
+        
+        Loading tabs can signal many times a frame. Only the tab's own label
+        is touched for background tabs; the url bar, title and progress bar
+        follow the current tab alone.
+        """
+        self.updated_tabs.add(tab)
+        if not self.update_timer.isActive():
+            self.update_timer.start()
     
-    def on_load_progress(self, progress):
-        self.progress_bar.setVisible(True)
-        self.progress_bar.setValue(progress)
-        if progress == 100:
-            self.progress_bar.setVisible(False)
+    def flush_tab_updates(self):
+        tabs, self.updated_tabs = self.updated_tabs, set()
+        current = self.tabs.currentWidget()
+        for tab in tabs:
+            i = self.tabs.indexOf(tab)
+            label = self.tab_label(tab.title)
+            if i >= 0 and self.tabs.tabText(i) != label:
+                self.tabs.setTabText(i, label)
+            if i >= 0 and tab.blocked_count:
+                self.tabs.setTabToolTip(i, f"{tab.title}\n{tab.blocked_count} requests blocked")
+        if current in tabs:
+            self.update_chrome(current)
+    
+    def update_chrome(self, tab):
+        """Show the current tab's URL, title and progress around the page."""
+        if tab.url != self.shown_url:
+            self.shown_url = tab.url
+            self.url_bar.setText(tab.url)
+        self.setWindowTitle(f"{tab.title} - Pyser")
+        self.progress_bar.setVisible(tab.progress is not None)
+        if tab.progress is not None:
+            self.progress_bar.setValue(tab.progress)
+    
+    def request_blocked(self, view):
+        for tab in self.tab_registry:
+            if tab.view is view:
+                tab.blocked_count += 1
+                self.tab_updated(tab)
+    
+    def tab_loaded(self, tab, success):
+        self.tab_updated(tab)
+        if tab is self.tabs.currentWidget():
+            if success:
+                self.status_bar.showMessage("Page loaded successfully", 2000)
+            else:
+                self.status_bar.showMessage("Failed to load page", 3000)
     
     def add_bookmark(self):
         current_url = self.current_browser().url().toString()
@@ -1077,7 +5642,53 @@ class MainWindow(QtWidgets.QMainWindow):
         new_window.show()
     
     def save_page(self):
-        self.status_bar.showMessage("Save functionality not implemented yet", 3000)
+        browser = self.current_browser()
+        formats = collections.OrderedDict([
+            ("Web Page, Single File (*.mhtml)", QtWebEngineWidgets.QWebEngineDownloadItem.MimeHtmlSaveFormat),
+            ("Web Page, Complete (*.html)", QtWebEngineWidgets.QWebEngineDownloadItem.CompleteHtmlSaveFormat),
+            ("Web Page, HTML Only (*.html)", QtWebEngineWidgets.QWebEngineDownloadItem.SingleHtmlSaveFormat),
+        ])
+        name = re.sub(r'[\\/:*?"<>|]', "_", browser.title() or "page")
+        path, chosen = QtWidgets.QFileDialog.getSaveFileName(self, "Save Page", name, ";;".join(formats))
+        if not path:
+            return
+        save_format = formats.get(chosen, QtWebEngineWidgets.QWebEngineDownloadItem.MimeHtmlSaveFormat)
+        if not os.path.splitext(path)[1]:
+            path += ".mhtml" if save_format == QtWebEngineWidgets.QWebEngineDownloadItem.MimeHtmlSaveFormat else ".html"
+        browser.page().save(path, save_format)
+    
+    def archive_all_tabs(self):
+        # Discarded tabs have no page to save.
+        views = [self.tabs.widget(i).browser() for i in range(self.tabs.count())
+                 if self.tabs.widget(i).view is not None and self.tabs.widget(i).url]
+        if not views:
+            self.status_bar.showMessage("No loaded tabs to archive", 3000)
+            return
+        self.archiving = True
+        count = PageArchive.shared().archive(views)
+        self.status_bar.showMessage(f"Archiving {count} tabs...")
+    
+    def archive_finished(self, pages, page_bytes, written_bytes):
+        if not self.archiving:
+            return
+        self.archiving = False
+        self.status_bar.showMessage(
+            f"Archived {pages} tabs: {format_size(page_bytes)}, of which {format_size(written_bytes)} was new", 5000)
+    
+    def open_archived_page(self):
+        manifest_file, _ = QtWidgets.QFileDialog.getOpenFileName(
+            self, "Open Archived Page", os.path.abspath(os.path.join(ARCHIVE_DIR, "pages")),
+            "Archived pages (*.json)")
+        if not manifest_file:
+            return
+        path = os.path.join(tempfile.gettempdir(), os.path.splitext(os.path.basename(manifest_file))[0] + ".mhtml")
+        try:
+            PageArchive.shared().export(manifest_file, path)
+        except Exception as e:
+            print(f"Error opening archived page: {e}")
+            self.status_bar.showMessage("Could not open the archived page", 3000)
+            return
+        self.create_new_tab(QtCore.QUrl.fromLocalFile(path).toString())
     
     def zoom_in(self):
         self.zoom_level = min(300, self.zoom_level + 10)
@@ -1106,22 +5717,137 @@ class MainWindow(QtWidgets.QMainWindow):
     def clear_status(self):
         self.status_bar.clearMessage()
 
+ICON_SOURCES = ("pyser_logo.ico", "pyser_logo.png")
+ICON_CACHE_DIR = "icon_cache"
+ICON_SIZES = (16, 32, 48, 64, 128, 256)
+
+def icon_source():
+    for path in ICON_SOURCES:
+        if os.path.exists(path):
+            return path
+    return None
+
+def cached_icon_files(source):
+    name = os.path.splitext(os.path.basename(source))[0]
+    return [(size, os.path.join(ICON_CACHE_DIR, f"{name}-{size}.png")) for size in ICON_SIZES]
+
+def load_app_icon():
+    """The logo from its pre-scaled copies, or None until they are built."""
+    source = icon_source()
+    if source is None:
+        print("Warning: Logo file not found. Using default icon.")
+        return None
+    files = cached_icon_files(source)
+    source_mtime = os.path.getmtime(source)
+    if not all(os.path.exists(path) and os.path.getmtime(path) >= source_mtime for _, path in files):
+        return None
+    icon = QtGui.QIcon()
+    for size, path in files:
+        icon.addFile(path, QtCore.QSize(size, size))
+    return icon
+
+def build_icon_cache():
+    """Decode and scale the full-size logo once, for later startups."""
+    source = icon_source()
+    image = QtGui.QImage(source) if source else QtGui.QImage()
+    if image.isNull():
+        return None
+    try:
+        os.makedirs(ICON_CACHE_DIR, exist_ok=True)
+        for size, path in cached_icon_files(source):
+            image.scaled(size, size, QtCore.Qt.KeepAspectRatio, QtCore.Qt.SmoothTransformation).save(path)
+    except Exception as e:
+        print(f"Error caching icons: {e}")
+        return QtGui.QIcon(source)
+    return load_app_icon()
+
+class StartupProfile(QtCore.QObject):
+    """Times the phases of startup up to the first page load.
+    
+    painted is emitted on the first paint of the watched window. With a
+    path, the phase durations are written there as JSON as each one ends.
+    """
+    painted = QtCore.pyqtSignal()
+    
+    def __init__(self, started, path=None, parent=None):
+        super().__init__(parent)
+        self.path = path
+        self.marks = [("start", started)]
+    
+    def mark(self, phase):
+        if any(name == phase for name, _ in self.marks):
+            return
+        self.marks.append((phase, time.perf_counter()))
+        if self.path:
+            self.write()
+    
+    def write(self):
+        phases = collections.OrderedDict(
+            (name, round((end - start) * 1000, 1))
+            for (_, start), (name, end) in zip(self.marks, self.marks[1:]))
+        data = {"phases_ms": phases, "total_ms": round((self.marks[-1][1] - self.marks[0][1]) * 1000, 1)}
+        try:
+            with open(self.path, 'w') as f:
+                json.dump(data, f, indent=2)
+        except Exception as e:
+            print(f"Error writing startup profile: {e}")
+    
+    def watch(self, window):
+        window.installEventFilter(self)
+        browser = window.current_browser()
+        if browser is not None:
+            browser.loadFinished.connect(lambda ok: self.mark("first_load"))
+    
+    def eventFilter(self, obj, event):
+        if event.type() == QtCore.QEvent.Paint:
+            obj.removeEventFilter(self)
+            self.mark("first_paint")
+            self.painted.emit()
+        return False
+
+def finish_startup():
+    """Work kept out of the first paint: bookmarks and history, the
+    content filter, unfinished downloads, and the pre-scaled icons on a
+    first run."""
+    if load_app_icon() is None:
+        icon = build_icon_cache()
+        if icon is not None:
+            QtWidgets.QApplication.instance().setWindowIcon(icon)
+    SharedStorage.shared()
+    ContentFilter.shared().load_in_background()
+    if MainWindow.windows:
+        MainWindow.windows[0].resume_downloads()
+
 def main():
+    profile_path = None
+    for arg in sys.argv:
+        if arg == "--profile-startup":
+            profile_path = "startup_profile.json"
+        elif arg.startswith("--profile-startup="):
+            profile_path = arg.split("=", 1)[1]
+    startup = StartupProfile(IMPORT_STARTED, profile_path)
+    startup.mark("import")
+    
+    apply_performance_preset(read_settings_file().get("performance_preset", DEFAULT_PERFORMANCE_PRESET))
     app = QtWidgets.QApplication(sys.argv)
     app.setApplicationName('Pyser')
     app.setApplicationVersion('2.0')
     
-    logo_path = "pyser_logo.ico"
-    if not os.path.exists(logo_path):
-        logo_path = "pyser_logo.png"
-    if os.path.exists(logo_path):
-        print(f"Setting application icon from: {os.path.abspath(logo_path)}")
-        app.setWindowIcon(QtGui.QIcon(logo_path))
-    else:
-        print(f"Warning: Application icon file '{logo_path}' not found. Using default icon.")
+    icon = load_app_icon()
+    if icon is not None:
+        app.setWindowIcon(icon)
+    startup.mark("qapplication")
+    
+    sessions = SessionManager.shared().saved_windows()
+    for session in sessions:
+        MainWindow(session)
+    if not sessions:
+        window = MainWindow()
+        window.show()
+    startup.mark("window")
     
-    window = MainWindow()
-    window.show()
+    startup.watch(MainWindow.windows[0])
+    startup.painted.connect(lambda: QtCore.QTimer.singleShot(0, finish_startup))
     
     sys.exit(app.exec_())
 
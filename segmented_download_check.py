@@ -0,0 +1,137 @@
+"""Run SegmentedDownload against a local HTTP server and check the results.
+
+    python segmented_download_check.py
+
+Covers a parallel download over Range requests, pausing and resuming
+one, and a server without Range support. Exits non-zero on any failure.
+"""
+import http.server
+import os
+import re
+import shutil
+import sys
+import tempfile
+import threading
+import time
+from PyQt5 import QtCore, QtNetwork, QtWidgets
+
+import main
+
+FILE_SIZE = 6 * 1024 * 1024
+TIMEOUT = 30
+
+class RangeHandler(http.server.BaseHTTPRequestHandler):
+    data = b""
+    ranges = True
+    # Ranges asked for, to check the download was split and resumed.
+    requested = []
+    
+    def log_message(self, *args):
+        pass
+    
+    def send_body_headers(self):
+        match = re.match(r"bytes=(\d+)-(\d*)$", self.headers.get("Range", ""))
+        if match and self.ranges:
+            start = int(match.group(1))
+            end = int(match.group(2)) if match.group(2) else len(self.data) - 1
+            type(self).requested.append(start)
+            body = self.data[start:end + 1]
+            self.send_response(206)
+            self.send_header("Content-Range", f"bytes {start}-{end}/{len(self.data)}")
+        else:
+            body = self.data
+            self.send_response(200)
+        if self.ranges:
+            self.send_header("Accept-Ranges", "bytes")
+        self.send_header("ETag", '"check"')
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        return body
+    
+    def do_HEAD(self):
+        self.send_body_headers()
+    
+    def do_GET(self):
+        body = self.send_body_headers()
+        try:
+            for i in range(0, len(body), 64 * 1024):
+                self.wfile.write(body[i:i + 64 * 1024])
+                # Slow enough that a pause lands mid-download.
+                time.sleep(0.005)
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+
+def serve(ranges):
+    handler = type("Handler", (RangeHandler,), {"data": os.urandom(FILE_SIZE), "ranges": ranges, "requested": []})
+    server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, handler
+
+def wait(app, done):
+    deadline = time.monotonic() + TIMEOUT
+    while not done() and time.monotonic() < deadline:
+        app.processEvents(QtCore.QEventLoop.AllEvents, 20)
+    return done()
+
+def download(app, network_manager, handler, url, path, pause_at=None):
+    item = main.SegmentedDownload(network_manager, url, path)
+    finished = []
+    item.finished.connect(lambda: finished.append(item.state()))
+    item.start()
+    if pause_at is not None:
+        wait(app, lambda: item.received() >= pause_at or finished)
+        item.pause()
+        paused_at = item.received()
+        item.resume()
+        if paused_at >= FILE_SIZE:
+            return "paused too late to check resuming"
+    if not wait(app, lambda: finished):
+        return "did not finish"
+    if finished[0] != main.QtWebEngineWidgets.QWebEngineDownloadItem.DownloadCompleted:
+        return f"ended in state {finished[0]}"
+    with open(path, 'rb') as f:
+        if f.read() != handler.data:
+            return "file differs from the server's"
+    return None
+
+def run():
+    app = QtWidgets.QApplication(sys.argv)
+    network_manager = QtNetwork.QNetworkAccessManager()
+    directory = tempfile.mkdtemp()
+    cwd = os.getcwd()
+    # PENDING_DOWNLOADS_FILE is written to the working directory.
+    os.chdir(directory)
+    failures = []
+    try:
+        server, handler = serve(ranges=True)
+        url = f"http://127.0.0.1:{server.server_port}/file.bin"
+        error = download(app, network_manager, handler, url, "parallel.bin")
+        if error is None and len(set(handler.requested)) < 2:
+            error = "was not split into ranges"
+        if error:
+            failures.append(f"parallel download {error}")
+        
+        handler.requested = []
+        error = download(app, network_manager, handler, url, "resumed.bin", pause_at=FILE_SIZE // 2)
+        if error is None and not any(start % (FILE_SIZE // main.SegmentedDownload.max_connections)
+                                     for start in handler.requested):
+            error = "started over instead of resuming"
+        if error:
+            failures.append(f"paused download {error}")
+        
+        server, handler = serve(ranges=False)
+        error = download(app, network_manager, handler, f"http://127.0.0.1:{server.server_port}/file.bin", "plain.bin")
+        if error:
+            failures.append(f"download without ranges {error}")
+    finally:
+        os.chdir(cwd)
+        shutil.rmtree(directory, ignore_errors=True)
+    
+    print(f"Segmented download check: {3 - len(failures)} of 3 passed")
+    for failure in failures:
+        print(f"FAIL: {failure}")
+    return 1 if failures else 0
+
+if __name__ == "__main__":
+    sys.exit(run())
@@ -0,0 +1,125 @@
+"""Open and close tabs in a loop and check that nothing outlives them.
+
+    python tab_leak_check.py [cycles]
+
+Fails if any tab or view, or any renderer process, is still alive once
+the tabs are closed, or if the browser process grew by more than
+MAX_GROWTH_MB. Renderer processes are found through /proc, so that part
+of the check only runs on Linux.
+"""
+import os
+import shutil
+import sys
+import tempfile
+import time
+from PyQt5 import QtCore, QtWidgets
+
+import main
+
+MAX_GROWTH_MB = 64
+SETTLE_SECONDS = 10
+
+def renderer_pids():
+    """Renderer processes descended from this one; None without /proc."""
+    if not os.path.isdir("/proc/self"):
+        return None
+    parents = {}
+    for name in os.listdir("/proc"):
+        if not name.isdigit():
+            continue
+        try:
+            with open(f"/proc/{name}/stat") as f:
+                # The command name is in parentheses and may hold spaces.
+                fields = f.read().rsplit(")", 1)[1].split()
+            parents[int(name)] = int(fields[1])
+        except (OSError, IndexError, ValueError):
+            continue
+    renderers = set()
+    for pid in parents:
+        ancestor = parents.get(pid)
+        while ancestor and ancestor != os.getpid():
+            ancestor = parents.get(ancestor)
+        if not ancestor:
+            continue
+        try:
+            with open(f"/proc/{pid}/cmdline", 'rb') as f:
+                if b"--type=renderer" in f.read():
+                    renderers.add(pid)
+        except OSError:
+            continue
+    return renderers
+
+def rss_mb():
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / (1024 * 1024)
+    except (OSError, ValueError):
+        return 0.0
+
+def settle(app, seconds, done):
+    """Run the event loop until done() is true or seconds pass."""
+    deadline = time.monotonic() + seconds
+    while True:
+        app.sendPostedEvents(None, QtCore.QEvent.DeferredDelete)
+        app.processEvents(QtCore.QEventLoop.AllEvents, 50)
+        if done() or time.monotonic() > deadline:
+            return
+
+def run(cycles=200):
+    app = QtWidgets.QApplication(sys.argv)
+    directory = tempfile.mkdtemp()
+    cwd = os.getcwd()
+    # The browser keeps history, the session and settings in the working
+    # directory; keep the check's visits out of the real ones.
+    os.chdir(directory)
+    try:
+        result = check(app, cycles)
+        # Let the history writer finish before its files go.
+        main.SharedStorage.shared().flush()
+        return result
+    finally:
+        os.chdir(cwd)
+        shutil.rmtree(directory, ignore_errors=True)
+
+def check(app, cycles):
+    window = main.MainWindow()
+    # Pooled views are created and kept on purpose; leave them out.
+    window.view_pool.set_size(0)
+    window.view_pool.release()
+    settle(app, 2, lambda: False)
+    live = window.tab_registry.live
+    baseline = {kind: live[kind] for kind in ("tabs", "views")}
+    baseline_renderers = renderer_pids()
+    baseline_rss = rss_mb()
+    
+    for _ in range(cycles):
+        window.create_new_tab("about:blank", "Leak check")
+        window.close_current_tab(window.tabs.currentIndex())
+        app.sendPostedEvents(None, QtCore.QEvent.DeferredDelete)
+    
+    def torn_down():
+        renderers = renderer_pids()
+        return (all(live[kind] <= count for kind, count in baseline.items())
+                and (renderers is None or renderers <= baseline_renderers))
+    settle(app, SETTLE_SECONDS, torn_down)
+    
+    failures = []
+    for kind, count in baseline.items():
+        if live[kind] > count:
+            failures.append(f"{live[kind] - count} {kind} left after closing")
+    renderers = renderer_pids()
+    if renderers is not None and not renderers <= baseline_renderers:
+        failures.append(f"{len(renderers - baseline_renderers)} renderer processes left after closing")
+    growth = rss_mb() - baseline_rss
+    if growth > MAX_GROWTH_MB:
+        failures.append(f"browser process grew by {growth:.0f} MB")
+    
+    print(f"Tab leak check: {cycles} tabs opened and closed, "
+          f"{'renderers not checked' if renderers is None else f'{len(renderers)} renderers running'}, "
+          f"browser process grew by {growth:.1f} MB")
+    for failure in failures:
+        print(f"FAIL: {failure}")
+    return 1 if failures else 0
+
+if __name__ == "__main__":
+    sys.exit(run(int(sys.argv[1]) if len(sys.argv) > 1 else 200))